@@ -14,9 +14,11 @@
 
 import json
 import logging
+import time
 
 import zmq
 
+from cloudburst.shared.backoff import jittered_delays
 from cloudburst.shared.function import CloudburstFunction
 from cloudburst.shared.future import CloudburstFuture
 from cloudburst.shared.proto.cloudburst_pb2 import (
@@ -38,13 +40,20 @@ from cloudburst.shared.utils import (
     DEFAULT_CLIENT_NAME,
     FUNC_CALL_PORT,
     FUNC_CREATE_PORT,
-    LIST_PORT
+    LIST_PORT,
+    OVERLOADED
 )
 from cloudburst.shared.kvs_client import AnnaKvsClient, KvsClient
 from cloudburst.shared.utils import OUTPUT_KEY_EXEC_LATENCY
 
 serializer = Serializer()
 
+# How many times, and with what backoff, we retry a DAG call that the
+# scheduler shed because the system was overloaded.
+OVERLOAD_RETRIES = 5
+OVERLOAD_INITIAL_DELAY = 0.01
+OVERLOAD_MAX_DELAY = 1.0
+
 
 class CloudburstConnection():
     def __init__(self, func_addr, ip, tid=0, local=False):
@@ -216,7 +225,8 @@ class CloudburstConnection():
 
     def call_dag(self, dname, arg_map, direct_response=False, async_response=False,
                  consistency=NORMAL, output_key=None, client_id=None,
-                 dry_run=False, continuation=None, exec_latency=False):
+                 dry_run=False, continuation=None, exec_latency=False,
+                 overload_retries=OVERLOAD_RETRIES):
         '''
         Issues a new request to execute the DAG. Returns a CloudburstFuture that
 
@@ -230,6 +240,8 @@ class CloudburstConnection():
         output_key: The KVS key in which to store the result of thie DAG.
         client_id: An optional ID associated with an individual client across
         requests; this is used for causal metadata.
+        overload_retries: How many times to retry, backing off in between, if
+        the scheduler sheds the call because the system is overloaded.
         '''
         dc = DagCall()
         dc.name = dname
@@ -270,10 +282,21 @@ class CloudburstConnection():
         if dry_run:
             return dc
 
-        self.dag_call_sock.send(dc.SerializeToString())
+        serialized = dc.SerializeToString()
+        delays = jittered_delays(OVERLOAD_INITIAL_DELAY, OVERLOAD_MAX_DELAY)
 
         r = GenericResponse()
-        r.ParseFromString(self.dag_call_sock.recv())
+        for attempt in range(overload_retries + 1):
+            self.dag_call_sock.send(serialized)
+            r.ParseFromString(self.dag_call_sock.recv())
+
+            if r.success or r.error != OVERLOADED:
+                break
+
+            if attempt < overload_retries:
+                logging.info('Cloudburst is overloaded; retrying DAG %s.' %
+                             (dname))
+                time.sleep(next(delays))
 
         if r.success:
             if direct_response:
@@ -0,0 +1,160 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+DEFAULT_MAX_BATCH_SIZE = 20
+
+# The default end-to-end latency target (in seconds) for a batched request,
+# covering both the time it waits for a batch to fill and the batch's runtime.
+DEFAULT_LATENCY_SLO = 0.1
+
+# How much weight the most recent observation gets in our moving averages.
+EWMA_WEIGHT = 0.2
+
+
+class AdaptiveBatcher():
+    '''
+    Collects ready requests for a batching-enabled function and decides when
+    to run them as one batch. The batcher tracks the request arrival rate and
+    fits batch runtime as a linear function of batch size. From those, it picks
+    the largest batch whose expected fill time plus runtime stays within the
+    latency SLO. A batch is released once it reaches that size or once its
+    oldest request has waited as long as the plan allows, whichever comes
+    first. With no history, every request is run on its own right away.
+    '''
+
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                 latency_slo=DEFAULT_LATENCY_SLO):
+        self.max_batch_size = max_batch_size
+        self.latency_slo = latency_slo
+
+        # The requests waiting to run: (key, triggers, schedule, arrival)
+        # tuples, oldest first.
+        self.pending = []
+        self.oldest_arrival = None
+
+        # A moving average of the time between request arrivals.
+        self.interarrival = None
+        self.last_arrival = None
+
+        # Exponentially weighted sums for a least-squares fit of batch runtime
+        # against batch size: weight, x, y, x^2, and xy.
+        self.fit = [0.0, 0.0, 0.0, 0.0, 0.0]
+
+        self.target_size = 1
+        self.max_wait = 0.0
+
+    def add(self, key, triggers, schedule, now=None):
+        if now is None:
+            now = time.time()
+
+        if self.last_arrival is not None:
+            gap = now - self.last_arrival
+            if self.interarrival is None:
+                self.interarrival = gap
+            else:
+                self.interarrival = (EWMA_WEIGHT * gap + (1 - EWMA_WEIGHT) *
+                                     self.interarrival)
+        self.last_arrival = now
+
+        if len(self.pending) == 0:
+            self.oldest_arrival = now
+            self._plan()
+
+        self.pending.append((key, triggers, schedule, now))
+
+    def deadline(self):
+        '''
+        The time by which the current batch must be released, or None if no
+        requests are waiting.
+        '''
+        if len(self.pending) == 0:
+            return None
+
+        return self.oldest_arrival + self.max_wait
+
+    def ready(self, now=None):
+        if len(self.pending) == 0:
+            return False
+
+        if now is None:
+            now = time.time()
+
+        return len(self.pending) >= self.target_size or now >= self.deadline()
+
+    def take(self):
+        '''
+        Removes up to max_batch_size waiting requests and returns their keys,
+        trigger sets, and schedules as three parallel lists.
+        '''
+        batch = self.pending[:self.max_batch_size]
+        self.pending = self.pending[self.max_batch_size:]
+
+        # The requests left over have been waiting since they arrived, not
+        # since this batch was taken.
+        if len(self.pending) > 0:
+            self.oldest_arrival = self.pending[0][3]
+            self._plan()
+
+        keys = [request[0] for request in batch]
+        trigger_sets = [request[1] for request in batch]
+        schedules = [request[2] for request in batch]
+
+        return keys, trigger_sets, schedules
+
+    def record(self, size, elapsed):
+        '''
+        Feeds back how long a batch of size requests took to run.
+        '''
+        decay = 1 - EWMA_WEIGHT
+        self.fit = [value * decay for value in self.fit]
+
+        self.fit[0] += 1
+        self.fit[1] += size
+        self.fit[2] += elapsed
+        self.fit[3] += size * size
+        self.fit[4] += size * elapsed
+
+    def estimate(self, size):
+        '''
+        The expected runtime of a batch of the given size.
+        '''
+        weight, sx, sy, sxx, sxy = self.fit
+        if weight == 0:
+            return 0.0
+
+        denominator = weight * sxx - sx * sx
+        if denominator <= 1e-9 * weight * sxx:
+            # We have only seen one batch size, so we assume the runtime is
+            # proportional to the batch size.
+            return sy / sx * size
+
+        slope = max((weight * sxy - sx * sy) / denominator, 0.0)
+        intercept = (sy - slope * sx) / weight
+        return max(intercept + slope * size, 0.0)
+
+    def _plan(self):
+        self.target_size = 1
+        self.max_wait = 0.0
+
+        if not self.interarrival or self.fit[0] == 0:
+            return
+
+        for size in range(self.max_batch_size, 1, -1):
+            fill_time = (size - 1) * self.interarrival
+            if fill_time + self.estimate(size) <= self.latency_slo:
+                self.target_size = size
+                self.max_wait = fill_time
+                return
@@ -0,0 +1,465 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+# The default memory budget for an executor's reference cache: 256 MB.
+DEFAULT_CACHE_CAPACITY = 256 * 1024 * 1024
+
+DEFAULT_CACHE_POLICY = 'lru'
+
+# How long (in seconds) a cached entry is used before it is revalidated
+# against the KVS. Writes made through other executors do not invalidate our
+# entries, so this bounds how stale a cached value can be. A TTL of 0 means
+# entries never expire.
+DEFAULT_CACHE_TTL = 1.0
+
+# The longest a lookup waits for an in-flight prefetch of the same key before
+# giving up and reading the key itself.
+PENDING_WAIT_TIMEOUT = 1.0
+
+
+def estimate_size(value):
+    '''
+    A best-effort estimate of how many bytes a deserialized value holds. NumPy
+    arrays and Pandas DataFrames report their buffer sizes; everything else
+    falls back to sys.getsizeof, walking one level into containers.
+    '''
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    if hasattr(value, 'memory_usage'):  # A Pandas DataFrame or Series.
+        try:
+            return int(value.memory_usage(deep=True).sum())
+        except Exception:
+            pass
+
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(map(sys.getsizeof, value))
+    elif isinstance(value, dict):
+        size += sum(map(sys.getsizeof, value.keys()))
+        size += sum(map(sys.getsizeof, value.values()))
+
+    return size
+
+
+class BaseEvictionPolicy():
+    '''
+    An abstract class for the reference cache's eviction policy. The policy
+    only tracks keys (and their sizes); the cache owns the values.
+    '''
+
+    def __init__(self, capacity):
+        raise NotImplementedError
+
+    def insert(self, key, size):
+        '''
+        Record that key has been added to the cache.
+        '''
+        raise NotImplementedError
+
+    def access(self, key):
+        '''
+        Record a cache hit on key.
+        '''
+        raise NotImplementedError
+
+    def remove(self, key):
+        '''
+        Forget about key because it was explicitly removed from the cache.
+        '''
+        raise NotImplementedError
+
+    def victim(self):
+        '''
+        Pick the next key to evict and stop tracking it. Returns None if the
+        policy is not tracking any keys.
+        '''
+        raise NotImplementedError
+
+
+class LruEvictionPolicy(BaseEvictionPolicy):
+    def __init__(self, capacity):
+        self.order = OrderedDict()
+
+    def insert(self, key, size):
+        self.order[key] = size
+
+    def access(self, key):
+        self.order.move_to_end(key)
+
+    def remove(self, key):
+        self.order.pop(key, None)
+
+    def victim(self):
+        if len(self.order) == 0:
+            return None
+
+        return self.order.popitem(last=False)[0]
+
+
+class LfuEvictionPolicy(BaseEvictionPolicy):
+    '''
+    Evicts the least frequently used key, breaking ties by recency. Keys are
+    kept in per-frequency buckets, so every operation is O(1) apart from
+    finding the lowest non-empty bucket after it empties.
+    '''
+
+    def __init__(self, capacity):
+        self.frequencies = {}
+        self.buckets = {}
+        self.min_frequency = 0
+
+    def insert(self, key, size):
+        self.frequencies[key] = 1
+        self._bucket(1)[key] = None
+        self.min_frequency = 1
+
+    def access(self, key):
+        frequency = self.frequencies[key]
+        self._discard(key, frequency)
+
+        self.frequencies[key] = frequency + 1
+        self._bucket(frequency + 1)[key] = None
+
+        if frequency == self.min_frequency and frequency not in self.buckets:
+            self.min_frequency = frequency + 1
+
+    def remove(self, key):
+        if key in self.frequencies:
+            self._discard(key, self.frequencies.pop(key))
+
+    def victim(self):
+        if len(self.frequencies) == 0:
+            return None
+
+        if self.min_frequency not in self.buckets:
+            self.min_frequency = min(self.buckets)
+
+        key, _ = self.buckets[self.min_frequency].popitem(last=False)
+        if len(self.buckets[self.min_frequency]) == 0:
+            del self.buckets[self.min_frequency]
+
+        del self.frequencies[key]
+        return key
+
+    def _bucket(self, frequency):
+        if frequency not in self.buckets:
+            self.buckets[frequency] = OrderedDict()
+
+        return self.buckets[frequency]
+
+    def _discard(self, key, frequency):
+        bucket = self.buckets[frequency]
+        del bucket[key]
+
+        if len(bucket) == 0:
+            del self.buckets[frequency]
+
+
+class ArcEvictionPolicy(BaseEvictionPolicy):
+    '''
+    Adaptive Replacement Cache, weighted by entry size. Entries seen once live
+    in t1 and entries seen more than once live in t2. Evicted keys are
+    remembered in the ghost lists b1 and b2, and hits on a ghost shift the
+    byte target for t1 towards recency or frequency.
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+
+        # The target number of bytes for t1.
+        self.target = 0
+
+        self.t1 = OrderedDict()
+        self.t2 = OrderedDict()
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+
+        self.t1_size = 0
+        self.b1_size = 0
+        self.b2_size = 0
+
+    def insert(self, key, size):
+        if key in self.b1:
+            delta = max(self.b2_size / max(self.b1_size, 1), 1) * size
+            self.target = min(self.capacity, self.target + delta)
+
+            self.b1_size -= self.b1.pop(key)
+            self.t2[key] = size
+        elif key in self.b2:
+            delta = max(self.b1_size / max(self.b2_size, 1), 1) * size
+            self.target = max(0, self.target - delta)
+
+            self.b2_size -= self.b2.pop(key)
+            self.t2[key] = size
+        else:
+            self.t1[key] = size
+            self.t1_size += size
+
+    def access(self, key):
+        if key in self.t1:
+            size = self.t1.pop(key)
+            self.t1_size -= size
+            self.t2[key] = size
+        else:
+            self.t2.move_to_end(key)
+
+    def remove(self, key):
+        if key in self.t1:
+            self.t1_size -= self.t1.pop(key)
+        else:
+            self.t2.pop(key, None)
+
+    def victim(self):
+        if len(self.t1) > 0 and (self.t1_size > self.target or
+                                 len(self.t2) == 0):
+            key, size = self.t1.popitem(last=False)
+            self.t1_size -= size
+
+            self.b1[key] = size
+            self.b1_size += size
+        elif len(self.t2) > 0:
+            key, size = self.t2.popitem(last=False)
+
+            self.b2[key] = size
+            self.b2_size += size
+        else:
+            return None
+
+        # The ghost lists only hold keys, but we still bound them by the bytes
+        # they represent so they cannot grow without limit.
+        while self.b1_size > self.capacity:
+            self.b1_size -= self.b1.popitem(last=False)[1]
+        while self.b2_size > self.capacity:
+            self.b2_size -= self.b2.popitem(last=False)[1]
+
+        return key
+
+
+EVICTION_POLICIES = {
+    'lru': LruEvictionPolicy,
+    'lfu': LfuEvictionPolicy,
+    'arc': ArcEvictionPolicy
+}
+
+
+class ReferenceCache():
+    '''
+    A cache of deserialized KVS values used when resolving references, with a
+    fixed memory budget in bytes. Entries are evicted at insert time according
+    to a pluggable eviction policy (see EVICTION_POLICIES). Values larger than
+    the whole budget are never cached. This is safe to share between the poll
+    loop and worker threads.
+
+    Each entry remembers the version (the LWW timestamp) it was read at. Once
+    an entry is older than the TTL, get() treats it as a miss; if the caller
+    then reads the same version back from the KVS, revalidate() renews the
+    entry without deserializing the value again. Writes made through this
+    executor invalidate the written keys immediately.
+    '''
+
+    def __init__(self, capacity=DEFAULT_CACHE_CAPACITY,
+                 policy=DEFAULT_CACHE_POLICY, ttl=DEFAULT_CACHE_TTL):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError('Invalid cache eviction policy: %s.' % (policy))
+
+        self.capacity = capacity
+        self.policy = EVICTION_POLICIES[policy](capacity)
+
+        self.ttl = ttl
+
+        self.values = {}
+        self.sizes = {}
+        self.versions = {}
+        self.read_times = {}
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self.invalidations = 0
+
+        # Keys that are currently being prefetched, mapped to an event that is
+        # set once the prefetch finishes.
+        self.pending = {}
+
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        # If this key is being prefetched, it is cheaper to wait for that read
+        # to land than to issue a second one.
+        event = self.pending.get(key)
+        if event is not None:
+            event.wait(PENDING_WAIT_TIMEOUT)
+
+        with self.lock:
+            if key in self.values and not self._expired(key):
+                self.hits += 1
+                self.policy.access(key)
+                return self.values[key]
+
+            self.misses += 1
+            return default
+
+    def revalidate(self, key, version, default=None):
+        '''
+        Called after a miss once the caller has read version of key from the
+        KVS. If the cached entry is at that same version, it is renewed and its
+        value is returned so the caller can skip deserialization. Otherwise,
+        the stale entry is dropped and default is returned.
+        '''
+        with self.lock:
+            if key not in self.values:
+                return default
+
+            if version is not None and self.versions[key] == version:
+                self.revalidations += 1
+                self.read_times[key] = time.time()
+                self.policy.access(key)
+                return self.values[key]
+
+            self.policy.remove(key)
+            self._drop(key)
+            return default
+
+    def put(self, key, value, size=None, version=None):
+        '''
+        Caches value at key, evicting other entries if necessary. size is the
+        number of bytes to charge for this entry; it is estimated from the
+        value if not provided. version is the KVS version the value was read
+        at, if known. Returns False if the value was too large to cache.
+        '''
+        if size is None:
+            size = estimate_size(value)
+
+        with self.lock:
+            if key in self.values:
+                self.policy.remove(key)
+                self._drop(key)
+
+            if size > self.capacity:
+                return False
+
+            while self.size + size > self.capacity:
+                victim = self.policy.victim()
+                if victim is None:
+                    break
+
+                self._drop(victim)
+                self.evictions += 1
+
+            self.values[key] = value
+            self.sizes[key] = size
+            self.versions[key] = version
+            self.read_times[key] = time.time()
+            self.size += size
+            self.policy.insert(key, size)
+
+            return True
+
+    def reserve(self, key):
+        '''
+        Marks key as being prefetched. Returns False if the key is already
+        cached or already being prefetched, in which case the caller should
+        not fetch it.
+        '''
+        with self.lock:
+            if (key in self.values and not self._expired(key)) or \
+                    key in self.pending:
+                return False
+
+            self.pending[key] = threading.Event()
+            return True
+
+    def release(self, key):
+        '''
+        Marks a prefetch of key as finished, whether or not it succeeded, and
+        wakes up any lookups waiting on it.
+        '''
+        with self.lock:
+            event = self.pending.pop(key, None)
+
+        if event is not None:
+            event.set()
+
+    def invalidate(self, keys):
+        '''
+        Drops keys (a single key or a list of keys) because they were just
+        written, so that the next read goes to the KVS.
+        '''
+        if type(keys) != list:
+            keys = [keys]
+
+        with self.lock:
+            for key in keys:
+                if key in self.values:
+                    self.policy.remove(key)
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def report(self, stats):
+        '''
+        Fills in a CacheStatistics protobuf with the current state of the
+        cache and resets the hit, miss, and eviction counters.
+        '''
+        with self.lock:
+            stats.hits = self.hits
+            stats.misses = self.misses
+            stats.evictions = self.evictions
+            stats.size_bytes = self.size
+            stats.capacity_bytes = self.capacity
+            stats.entries = len(self.values)
+            stats.revalidations = self.revalidations
+            stats.invalidations = self.invalidations
+
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.revalidations = 0
+            self.invalidations = 0
+
+    def clear(self):
+        '''
+        Drops every cached value, e.g. when the executor is reset for a new
+        function. Prefetches that are in flight are left to finish.
+        '''
+        with self.lock:
+            for key in list(self.values):
+                self.policy.remove(key)
+                self._drop(key)
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def _expired(self, key):
+        return self.ttl and time.time() - self.read_times[key] > self.ttl
+
+    def _drop(self, key):
+        del self.values[key]
+        del self.versions[key]
+        del self.read_times[key]
+        self.size -= self.sizes.pop(key)
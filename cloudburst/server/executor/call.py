@@ -12,11 +12,13 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import copy
 import logging
 import time
 
 from anna.lattices import (
     Lattice,
+    LWWPairLattice,
     MapLattice,
     MultiKeyCausalLattice,
     SetLattice,
@@ -25,6 +27,15 @@ from anna.lattices import (
 )
 
 from cloudburst.server.executor import utils
+from cloudburst.server.executor.dag_plan import get_plan
+from cloudburst.server.executor.object_store import (
+    load_shared_object,
+    SharedObjectHandle
+)
+from cloudburst.server.executor.spill import (
+    load_spilled_result,
+    SpilledResult
+)
 import cloudburst.server.utils as sutils
 from cloudburst.shared.proto.cloudburst_pb2 import (
     Continuation,
@@ -34,17 +45,47 @@ from cloudburst.shared.proto.cloudburst_pb2 import (
     EXECUTION_ERROR, FUNC_NOT_FOUND,  # Cloudburst's error types
     MULTIEXEC # Cloudburst's execution types
 )
+from cloudburst.shared.backoff import all_present, wait_for
+from cloudburst.shared.histogram import LatencyHistogram
 from cloudburst.shared.reference import CloudburstReference
 from cloudburst.shared.serializer import Serializer
 from cloudburst.shared.utils import OUTPUT_KEY_EXEC_LATENCY
 
 serializer = Serializer()
 
+# A sentinel to tell cache misses apart from cached None values.
+_MISSING = object()
+
+# Serialized results larger than this (in bytes) are spilled to the KVS once
+# and passed to remote downstream functions by handle, rather than being
+# copied into the trigger for every outgoing connection.
+INLINE_RESULT_LIMIT = 1024 * 1024
+
+
+class LocalTrigger():
+    '''
+    A trigger for a DAG function pinned on the same executor thread as its
+    upstream function. It carries the upstream results as Python objects, so
+    they are never serialized and never go through ZMQ.
+    '''
+
+    def __init__(self, sid, source, target_function, values):
+        self.id = sid
+        self.source = source
+        self.target_function = target_function
+        self.values = values
+
 
 def exec_function(exec_socket, kvs, user_states_kvs, user_library, cache, function_cache):
     call = FunctionCall()
     call.ParseFromString(exec_socket.recv())
 
+    exec_function_call(call, kvs, user_states_kvs, user_library, cache,
+                       function_cache)
+
+
+def exec_function_call(call, kvs, user_states_kvs, user_library, cache,
+                       function_cache):
     fargs = [serializer.load(arg) for arg in call.arguments.values]
 
     if call.name in function_cache:
@@ -80,6 +121,7 @@ def exec_function(exec_socket, kvs, user_states_kvs, user_library, cache, functi
     if call.consistency == NORMAL:
         result = serializer.dump_lattice(result)
         succeed = kvs.put(call.response_key, result)
+        cache.invalidate(call.response_key)
     else:
         result = serializer.dump_lattice(result, MultiKeyCausalLattice,
                                          causal_dependencies=dependencies)
@@ -121,12 +163,12 @@ def _exec_func_normal(user_states_kvs, func, args, user_lib, cache, arbiter=None
 
 
 def _exec_func_causal(user_states_kvs, func, args, user_lib, schedule=None,
-                      key_version_locations={}, dependencies={}):
+                      key_version_locations={}, dependencies={}, plan=None):
     refs = list(filter(lambda a: isinstance(a, CloudburstReference), args))
 
     if refs:
         refs = _resolve_ref_causal(refs, user_states_kvs, schedule, key_version_locations,
-                                   dependencies)
+                                   dependencies, plan)
 
     return _run_function(func, refs, args, user_lib)
 
@@ -161,7 +203,14 @@ def _run_function(func, refs, args, user_lib, arbiter=None):
         return func(*func_args)
 
 
-def _resolve_ref_normal(refs, user_states_kvs, cache):
+def prefetch_refs(refs, user_states_kvs, cache):
+    return _resolve_ref_normal(refs, user_states_kvs, cache, prefetch=True)
+
+
+def _resolve_ref_normal(refs, user_states_kvs, cache, prefetch=False):
+    # When prefetching, the caller has already reserved these keys in the
+    # cache, and we do not wait for keys that do not exist yet; whatever is
+    # already in the KVS ends up in the cache.
     kv_pairs = {}
 
     refs_by_kvs_name = _group_refs_by_kvs_name(refs)
@@ -171,22 +220,38 @@ def _resolve_ref_normal(refs, user_states_kvs, cache):
 
         for ref in refs:
             deserialize_map[ref.key] = ref.deserialize
-            if ref.key in cache:
-                kv_pairs[ref.key] = cache[ref.key]
+            cached = _MISSING if prefetch else cache.get(ref.key, _MISSING)
+            if cached is not _MISSING:
+                kv_pairs[ref.key] = cached
             else:
                 keys.add(ref.key)
 
         keys = list(keys)
 
         if len(keys) != 0:
-            returned_kv_pairs = user_states_kvs.get_list(keys, kvs_name)
+            def fetch():
+                return user_states_kvs.get_list(keys, kvs_name)
 
-            # When chaining function executions, we must wait, so we check to see
-            # if certain values have not been resolved yet.
-            while None in returned_kv_pairs.values():
-                returned_kv_pairs = user_states_kvs.get(keys, kvs_name)
+            if prefetch:
+                returned_kv_pairs = fetch()
+            else:
+                # When chaining function executions, we must wait, so we keep
+                # retrying (with backoff) until all values have been resolved.
+                returned_kv_pairs = wait_for(fetch, all_present)
 
             for key in keys:
+                if returned_kv_pairs[key] is None:
+                    continue
+
+                # If we had an expired copy of this key cached and the KVS
+                # still has the same version, we can reuse the deserialized
+                # value.
+                version = _lattice_version(returned_kv_pairs[key])
+                cached = cache.revalidate(key, version, _MISSING)
+                if cached is not _MISSING:
+                    kv_pairs[key] = cached
+                    continue
+
                 # Because references might be repeated, we check to make sure that
                 # we haven't already deserialized this ref.
                 if deserialize_map[key] and isinstance(returned_kv_pairs[key],
@@ -195,11 +260,30 @@ def _resolve_ref_normal(refs, user_states_kvs, cache):
                 else:
                     kv_pairs[key] = returned_kv_pairs[key].reveal()
 
-                # Cache the deserialized payload for future use
-                cache[key] = kv_pairs[key]
+                # Cache the deserialized payload for future use. We charge the
+                # cache for the serialized payload size when we know it.
+                cache.put(key, kv_pairs[key],
+                          _payload_size(returned_kv_pairs[key]), version)
 
     return kv_pairs
 
+def _lattice_version(lattice):
+    # Only LWW lattices carry a single version we can compare cheaply.
+    if isinstance(lattice, LWWPairLattice):
+        return lattice.ts
+
+    return None
+
+
+def _payload_size(lattice):
+    if isinstance(lattice, Lattice):
+        payload = lattice.reveal()
+        if isinstance(payload, bytes):
+            return len(payload)
+
+    return None
+
+
 def _group_refs_by_kvs_name(refs):
     refs_by_kvs_name = {}
     for ref in refs:
@@ -209,9 +293,9 @@ def _group_refs_by_kvs_name(refs):
     return refs_by_kvs_name
 
 def _resolve_ref_causal(refs, user_states_kvs, schedule, key_version_locations,
-                        dependencies):
+                        dependencies, plan=None):
     if schedule:
-        future_read_set = _compute_children_read_set(schedule)
+        future_read_set = _compute_children_read_set(schedule, plan)
         client_id = schedule.client_id
         consistency = schedule.consistency
     else:
@@ -220,14 +304,12 @@ def _resolve_ref_causal(refs, user_states_kvs, schedule, key_version_locations,
         consistency = MULTI
 
     keys = [ref.key for ref in refs]
-    (address, versions), kv_pairs = user_states_kvs.causal_get(keys, future_read_set,
-                                                   key_version_locations,
-                                                   consistency, client_id)
-
-    while None in kv_pairs.values():
-        (address, versions), kv_pairs = user_states_kvs.causal_get(keys, future_read_set,
-                                                       key_version_locations,
-                                                       consistency, client_id)
+    (address, versions), kv_pairs = wait_for(
+        lambda: user_states_kvs.causal_get(keys, future_read_set,
+                                           key_version_locations, consistency,
+                                           client_id),
+        lambda response: all_present(response[1]))
+
     if address is not None:
         if address not in key_version_locations:
             key_version_locations[address] = versions
@@ -260,19 +342,29 @@ def _resolve_ref_causal(refs, user_states_kvs, schedule, key_version_locations,
 
 
 def exec_dag_function(pusher_cache, kvs, user_states_kvs, trigger_sets, function, schedules,
-                      user_library, dag_runtimes, cache, schedulers, batching, arbiter=None):
+                      user_library, dag_runtimes, cache, schedulers, batching, arbiter=None,
+                      object_store=None, self_address=None, local_triggers=None,
+                      plans=None, spilled=None):
+    # The executor looks up each schedule's plan when the schedule arrives;
+    # otherwise, the schedules carry their DAGs' full definitions.
+    if plans is None:
+        plans = [_get_plan(schedule) for schedule in schedules]
+
     if arbiter:
         arbiter.exec_start()
     if schedules[0].consistency == NORMAL:
         finished, successes = _exec_dag_function_normal(pusher_cache, kvs, user_states_kvs,
                                                         trigger_sets, function,
-                                                        schedules,
+                                                        schedules, plans,
                                                         user_library, cache,
-                                                        schedulers, batching, arbiter)
+                                                        schedulers, batching, arbiter,
+                                                        object_store, self_address,
+                                                        local_triggers, spilled)
     else:
         finished, successes = _exec_dag_function_causal(pusher_cache, kvs,
                                                         trigger_sets, function,
-                                                        schedules, user_library)
+                                                        schedules, plans,
+                                                        user_library)
 
     # If finished is true, that means that this executor finished the DAG
     # request. We will report the end-to-end latency for this DAG if so.
@@ -281,10 +373,10 @@ def exec_dag_function(pusher_cache, kvs, user_states_kvs, trigger_sets, function
             if success:
                 dname = schedule.dag.name
                 if dname not in dag_runtimes:
-                    dag_runtimes[dname] = []
+                    dag_runtimes[dname] = LatencyHistogram()
 
                 runtime = time.time() - schedule.start_time
-                dag_runtimes[schedule.dag.name].append(runtime)
+                dag_runtimes[schedule.dag.name].add(runtime)
 
     return successes
 
@@ -302,9 +394,83 @@ def _construct_trigger(sid, fname, result):
     return trigger
 
 
+def _load_trigger_args(trigger, kvs):
+    if isinstance(trigger, LocalTrigger):
+        return list(trigger.values)
+
+    args = [serializer.load(arg) for arg in trigger.arguments.values]
+
+    # Arrays passed through the node's object store arrive as handles, and so
+    # do large results that were spilled to the KVS.
+    for idx, arg in enumerate(args):
+        if isinstance(arg, SharedObjectHandle):
+            args[idx] = load_shared_object(arg)
+        elif isinstance(arg, SpilledResult):
+            args[idx] = load_spilled_result(kvs, arg)
+
+    return args
+
+
+def _construct_triggers(kvs, schedule, fname, result, sinks, object_store,
+                        spilled=None):
+    '''
+    Builds the trigger for each downstream function in sinks. Large arrays
+    headed to executors on this node are written to the node's object store
+    once and passed by handle. Everything else is serialized once; results
+    over INLINE_RESULT_LIMIT are then spilled to the KVS and sent as a
+    handle, if we can, and smaller ones are sent inline.
+    '''
+    if type(result) != tuple:
+        result = (result,)
+
+    local_sinks = []
+    if object_store:
+        local_sinks = [sink for sink in sinks if
+                       object_store.is_local(schedule.locations[sink])]
+
+    values = []
+    for idx, value in enumerate(result):
+        handles = {}
+        if len(local_sinks) > 0 and object_store.accepts(value):
+            handles = object_store.put(value, local_sinks)
+
+        inline = None
+        if len(handles) < len(sinks):
+            inline = serializer.dump(value, None, False)
+
+            if spilled and inline.ByteSize() > INLINE_RESULT_LIMIT:
+                key = '%s:%s:%d' % (schedule.id, fname, idx)
+                handle = spilled.put(kvs, key, inline)
+
+                # If the write failed, the consumers still get the result
+                # inline.
+                if handle:
+                    inline = serializer.dump(handle, None, False)
+
+        values.append((inline, handles))
+
+    triggers = {}
+    for sink in sinks:
+        trigger = DagTrigger()
+        trigger.id = schedule.id
+        trigger.source = fname
+        trigger.target_function = sink
+
+        for inline, handles in values:
+            if sink in handles:
+                inline = serializer.dump(handles[sink], None, False)
+            trigger.arguments.values.append(inline)
+
+        triggers[sink] = trigger
+
+    return triggers
+
+
 def _exec_dag_function_normal(pusher_cache, kvs, user_states_kvs, trigger_sets, function,
-                              schedules, user_lib, cache, schedulers,
-                              batching, arbiter=None):
+                              schedules, plans, user_lib, cache, schedulers,
+                              batching, arbiter=None, object_store=None,
+                              self_address=None, local_triggers=None,
+                              spilled=None):
     fname = schedules[0].target_function
 
     # We construct farg_sets to have a request by request set of arguments.
@@ -312,12 +478,12 @@ def _exec_dag_function_normal(pusher_cache, kvs, user_states_kvs, trigger_sets,
     # invocation.
     farg_sets = []
     for schedule, trigger_set in zip(schedules, trigger_sets):
-        fargs = list(schedule.arguments[fname].values)
+        fargs = [serializer.load(arg) for arg in
+                 schedule.arguments[fname].values]
 
         for trigger in trigger_set:
-            fargs += list(trigger.arguments.values)
+            fargs += _load_trigger_args(trigger, kvs)
 
-        fargs = [serializer.load(arg) for arg in fargs]
         farg_sets.append(fargs)
 
     if batching:
@@ -334,11 +500,8 @@ def _exec_dag_function_normal(pusher_cache, kvs, user_states_kvs, trigger_sets,
     successes = []
     is_sink = True
 
-    for schedule, result in zip(schedules, result_list):
-        this_ref = None
-        for ref in schedule.dag.functions:
-            if ref.name == fname:
-                this_ref = ref # There must be a match.
+    for schedule, plan, result in zip(schedules, plans, result_list):
+        this_ref = plan.functions[fname]
 
         if this_ref.type == MULTIEXEC:
             if serializer.dump(result) in this_ref.invalid_results:
@@ -346,15 +509,33 @@ def _exec_dag_function_normal(pusher_cache, kvs, user_states_kvs, trigger_sets,
                 continue
 
         successes.append(True)
-        new_trigger = _construct_trigger(schedule.id, fname, result)
-        for conn in schedule.dag.connections:
-            if conn.source == fname:
-                is_sink = False
-                new_trigger.target_function = conn.sink
+        sinks = plan.successors[fname]
+        if len(sinks) > 0:
+            is_sink = False
 
-                dest_ip = schedule.locations[conn.sink]
-                sckt = pusher_cache.get(sutils.get_dag_trigger_address(dest_ip))
-                sckt.send(new_trigger.SerializeToString())
+        # Downstream functions pinned on this very executor thread are handed
+        # their results directly rather than through a serialized trigger.
+        self_sinks = []
+        if local_triggers is not None:
+            self_sinks = [sink for sink in sinks
+                          if schedule.locations[sink] == self_address]
+        sinks = [sink for sink in sinks if sink not in self_sinks]
+
+        triggers = _construct_triggers(kvs, schedule, fname, result, sinks,
+                                       object_store, spilled)
+        for sink in sinks:
+            dest_ip = schedule.locations[sink]
+            sckt = pusher_cache.get(sutils.get_dag_trigger_address(dest_ip))
+            sckt.send(triggers[sink].SerializeToString())
+
+        values = result if type(result) == tuple else (result,)
+        for idx, sink in enumerate(self_sinks):
+            # Every additional local consumer gets its own copy, so that one
+            # function modifying its input cannot affect another.
+            if idx > 0:
+                values = copy.deepcopy(values)
+            local_triggers.append(LocalTrigger(schedule.id, fname, sink,
+                                               values))
 
     if is_sink:
         if arbiter:
@@ -403,6 +584,7 @@ def _exec_dag_function_normal(pusher_cache, kvs, user_states_kvs, trigger_sets,
                     keys.append(output_key)
                     lattices.append(lattice)
             kvs.put(keys, lattices)
+            cache.invalidate(keys)
 
     return is_sink, successes
 
@@ -410,8 +592,9 @@ def _exec_dag_function_normal(pusher_cache, kvs, user_states_kvs, trigger_sets,
 # Causal mode does not currently support batching, so there should only ever be
 # one trigger set and oone schedule.
 def _exec_dag_function_causal(pusher_cache, user_states_kvs, triggers, function, schedule,
-                              user_lib):
+                              plans, user_lib):
     schedule = schedule[0]
+    plan = plans[0]
     triggers = triggers[0]
 
     fname = schedule.target_function
@@ -446,12 +629,9 @@ def _exec_dag_function_causal(pusher_cache, user_states_kvs, triggers, function,
     fargs = [serializer.load(arg) for arg in fargs]
 
     result = _exec_func_causal(user_states_kvs, function, fargs, user_lib, schedule,
-                               key_version_locations, dependencies)
+                               key_version_locations, dependencies, plan)
 
-    this_ref = None
-    for ref in schedule.dag.functions:
-        if ref.name == fname:
-            this_ref = ref # There must be a match.
+    this_ref = plan.functions[fname]
 
     success = True
     if this_ref.type == MULTIEXEC:
@@ -472,15 +652,13 @@ def _exec_dag_function_causal(pusher_cache, user_states_kvs, triggers, function,
         dep.key = key
         dependencies[key].serialize(dep.vector_clock)
 
-    is_sink = True
-    for conn in schedule.dag.connections:
-        if conn.source == fname:
-            is_sink = False
-            new_trigger.target_function = conn.sink
+    is_sink = fname in plan.sinks
+    for sink in plan.successors[fname]:
+        new_trigger.target_function = sink
 
-            dest_ip = schedule.locations[conn.sink]
-            sckt = pusher_cache.get(sutils.get_dag_trigger_address(dest_ip))
-            sckt.send(new_trigger.SerializeToString())
+        dest_ip = schedule.locations[sink]
+        sckt = pusher_cache.get(sutils.get_dag_trigger_address(dest_ip))
+        sckt.send(new_trigger.SerializeToString())
 
     if is_sink:
         logging.info('DAG %s (ID %s) completed in causal mode; result at %s.' %
@@ -506,11 +684,10 @@ def _exec_dag_function_causal(pusher_cache, user_states_kvs, triggers, function,
         lattice = MultiKeyCausalLattice(vector_clock, dependencies,
                                         SetLattice({result}))
 
-        succeed = user_states_kvs.causal_put(schedule.output_key,
-                                 lattice, schedule.client_id)
-        while not succeed:
-            succeed = user_states_kvs.causal_put(schedule.output_key,
-                                     lattice, schedule.client_id)
+        wait_for(lambda: user_states_kvs.causal_put(schedule.output_key,
+                                                    lattice,
+                                                    schedule.client_id),
+                 bool)
 
         # Issues requests to all upstream caches for this particular request
         # and asks them to garbage collect pinned versions stored for the
@@ -523,19 +700,16 @@ def _exec_dag_function_causal(pusher_cache, user_states_kvs, triggers, function,
     return is_sink, [success]
 
 
-def _compute_children_read_set(schedule):
+def _get_plan(schedule):
+    return get_plan(schedule.dag)
+
+
+def _compute_children_read_set(schedule, plan=None):
+    if plan is None:
+        plan = _get_plan(schedule)
+
     future_read_set = set()
-    fname = schedule.target_function
-    children = set()
-    delta = {fname}
-
-    while len(delta) > 0:
-        new_delta = set()
-        for conn in schedule.dag.connections:
-            if conn.source in delta:
-                children.add(conn.sink)
-                new_delta.add(conn.sink)
-        delta = new_delta
+    children = plan.descendants[schedule.target_function]
 
     for child in children:
         refs = list(filter(lambda arg: type(arg) == CloudburstReference,
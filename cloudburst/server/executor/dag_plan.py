@@ -0,0 +1,171 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from collections import OrderedDict
+import threading
+
+import cloudburst.server.utils as sutils
+
+# The number of compiled DAG plans each executor process keeps around.
+PLAN_CACHE_SIZE = 128
+
+# The number of Dag objects whose versions each executor process remembers.
+# Each entry keeps its schedule alive, so this only needs to cover the
+# schedules that are in flight at once.
+VERSION_CACHE_SIZE = 64
+
+
+class DagPlan():
+    '''
+    A DAG's structure, compiled once into lookup tables so that handling a
+    schedule or trigger never has to scan the DAG's functions or connections.
+    '''
+
+    def __init__(self, dag, version=None):
+        self.name = dag.name
+
+        # The version of the DAG this plan was compiled from (see
+        # cloudburst.server.utils.get_dag_version).
+        self.version = version
+
+        # A map from each function's name to its FunctionRef.
+        self.functions = {}
+
+        # The functions each function sends its results to, and the functions
+        # it receives triggers from, in the order of the DAG's connections.
+        self.successors = {}
+        self.predecessors = {}
+
+        for ref in dag.functions:
+            self.functions[ref.name] = ref
+            self.successors[ref.name] = []
+            self.predecessors[ref.name] = []
+
+        for conn in dag.connections:
+            self.successors[conn.source].append(conn.sink)
+            self.predecessors[conn.sink].append(conn.source)
+
+        self.sinks = set([fname for fname in self.functions if
+                          len(self.successors[fname]) == 0])
+
+        # Every function downstream of each function, directly or not.
+        self.descendants = {}
+        for fname in self.functions:
+            self.descendants[fname] = self._find_descendants(fname)
+
+    def trigger_count(self, fname):
+        '''
+        The number of triggers fname waits for; source functions are
+        triggered once, by the scheduler.
+        '''
+        return max(len(self.predecessors[fname]), 1)
+
+    def _find_descendants(self, fname):
+        descendants = set()
+        delta = [fname]
+
+        while len(delta) > 0:
+            new_delta = []
+            for source in delta:
+                for sink in self.successors[source]:
+                    if sink not in descendants:
+                        descendants.add(sink)
+                        new_delta.append(sink)
+            delta = new_delta
+
+        return frozenset(descendants)
+
+
+class DagPlanCache():
+    '''
+    A bounded, thread-safe cache of compiled DAG plans, keyed by DAG name and
+    version, so a DAG that is deleted and registered again under the same
+    name gets a new plan. The caller supplies the version -- compact
+    schedules carry it, and full schedules have it computed once, when they
+    arrive -- so a lookup never has to look at the rest of the DAG.
+    '''
+
+    def __init__(self, capacity=PLAN_CACHE_SIZE):
+        self.capacity = capacity
+        self.plans = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, dag, version):
+        key = (dag.name, version)
+
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is not None:
+                self.plans.move_to_end(key)
+                return plan
+
+        plan = DagPlan(dag, version)
+
+        with self.lock:
+            self.plans[key] = plan
+            if len(self.plans) > self.capacity:
+                self.plans.popitem(last=False)
+
+        return plan
+
+
+class DagVersionCache():
+    '''
+    A bounded, thread-safe cache of the versions of the DAGs in full
+    schedules, which do not carry their DAG's version. It is keyed by the Dag
+    object itself, so each schedule's DAG is hashed once, when it arrives,
+    however many times its plan is looked up afterwards.
+    '''
+
+    def __init__(self, capacity=VERSION_CACHE_SIZE,
+                 digest=sutils.get_dag_version):
+        self.capacity = capacity
+        self.digest = digest
+        self.versions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, dag):
+        # We hold on to the Dag object along with its version, so that its id
+        # cannot be reused while it is in the cache.
+        key = (dag.name, id(dag))
+
+        with self.lock:
+            cached = self.versions.get(key)
+            if cached is not None and cached[0] is dag:
+                self.versions.move_to_end(key)
+                return cached[1]
+
+        version = self.digest(dag)
+
+        with self.lock:
+            self.versions[key] = (dag, version)
+            if len(self.versions) > self.capacity:
+                self.versions.popitem(last=False)
+
+        return version
+
+
+_plans = DagPlanCache()
+_versions = DagVersionCache()
+
+
+def get_dag_version(dag):
+    return _versions.get(dag)
+
+
+def get_plan(dag, version=None):
+    if version is None:
+        version = get_dag_version(dag)
+
+    return _plans.get(dag, version)
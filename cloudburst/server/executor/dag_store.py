@@ -0,0 +1,222 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import time
+
+from cloudburst.server import utils as sutils
+from cloudburst.server.executor.dag_plan import get_dag_version, get_plan
+from cloudburst.shared.backoff import jittered_delays
+from cloudburst.shared.proto.cloudburst_pb2 import (
+    Dag,
+    DagSchedule,
+    NORMAL  # Cloudburst's consistency modes
+)
+from cloudburst.shared.proto.internal_pb2 import CompactDagSchedule
+
+# How many seconds we hold a compact schedule whose DAG version is not in the
+# KVS yet before we give up on it.
+DEFAULT_PENDING_TIMEOUT = 60
+
+
+class DagStore():
+    '''
+    The DAG definitions this executor thread has seen, by name and version.
+    Schedulers send compact schedules that only name a DAG; the first time we
+    see a DAG version, we read its definition from the KVS, where the
+    scheduler persisted it when the DAG was registered.
+
+    The KVS may not have a DAG version yet when its first schedules arrive,
+    since the write is only eventually visible. We hold those schedules and
+    read the DAG again, backing off, from retry until it shows up or the
+    schedules have waited for pending_timeout seconds.
+    '''
+
+    def __init__(self, kvs, pending_timeout=DEFAULT_PENDING_TIMEOUT):
+        self.kvs = kvs
+        self.pending_timeout = pending_timeout
+
+        # A map from each DAG's name to its version, definition and compiled
+        # plan. We only keep the latest version we have seen of each DAG.
+        self.dags = {}
+
+        # A map from each (name, version) we are waiting on to the retry
+        # delays, the time of the next read, and the held compact schedules
+        # with the time at which we give up on each of them.
+        self.pending = {}
+
+    def get(self, name, version, log_missing=True):
+        '''
+        Returns the definition of the given version of a DAG and its plan, or
+        None if the KVS does not (yet) have that version.
+        '''
+        if name in self.dags and self.dags[name][0] == version:
+            return self.dags[name][1:]
+
+        payload = self.kvs.get(name)
+        if payload is None or payload.get(name) is None:
+            if log_missing:
+                logging.error('DAG %s not found in the KVS.' % (name))
+            return None
+
+        dag = Dag()
+        dag.ParseFromString(payload[name].reveal())
+
+        if sutils.get_dag_version(dag) != version:
+            # The KVS may not yet have the latest definition of a DAG that was
+            # just registered again.
+            if log_missing:
+                logging.error('DAG %s in the KVS does not match version %s.'
+                              % (name, version))
+            return None
+
+        self.dags[name] = (version, dag, get_plan(dag, version))
+        return self.dags[name][1:]
+
+    def expand(self, compact, now=None):
+        '''
+        Converts a CompactDagSchedule into the DagSchedule the rest of the
+        executor works with, and returns it along with its DAG's plan. If we
+        cannot find its DAG, holds the compact schedule until retry finds it
+        and returns None.
+        '''
+        key = (compact.dag_name, compact.dag_version)
+        now = now if now else time.time()
+
+        # Don't let a schedule overtake the ones already waiting on its DAG.
+        entry = None
+        if key not in self.pending:
+            entry = self.get(*key)
+
+        if entry is None:
+            if key not in self.pending:
+                logging.info('Holding schedules for DAG %s until version %s '
+                             'is in the KVS.' % key)
+                delays = jittered_delays()
+                self.pending[key] = [delays, now + next(delays), []]
+
+            self.pending[key][2].append((compact, now + self.pending_timeout))
+            return None
+
+        return self._expand(compact, *entry)
+
+    def retry(self, now=None):
+        '''
+        Reads the DAGs that held schedules are waiting on again, if it is time
+        to, and returns a list of (compact, schedule, plan) for each schedule
+        whose DAG has arrived. Drops the schedules that have waited too long.
+        '''
+        now = now if now else time.time()
+        expanded = []
+
+        for key in list(self.pending.keys()):
+            delays, next_retry, held = self.pending[key]
+            if now < next_retry:
+                continue
+
+            entry = self.get(*key, log_missing=False)
+            if entry is not None:
+                del self.pending[key]
+                for compact, _ in held:
+                    expanded.append((compact,) + self._expand(compact,
+                                                              *entry))
+                continue
+
+            for compact, deadline in held:
+                if deadline <= now:
+                    logging.error('Dropping schedule %s: DAG %s version %s '
+                                  'never arrived in the KVS.' %
+                                  ((compact.id,) + key))
+
+            held = [(compact, deadline) for compact, deadline in held if
+                    deadline > now]
+            if len(held) == 0:
+                del self.pending[key]
+            else:
+                self.pending[key] = [delays, now + next(delays), held]
+
+        return expanded
+
+    def deadline(self):
+        '''
+        The earliest time at which retry has something to do, or None if we
+        are not holding any schedules.
+        '''
+        if len(self.pending) == 0:
+            return None
+
+        return min([next_retry for _, next_retry, _ in self.pending.values()])
+
+    def _expand(self, compact, dag, plan):
+        fname = compact.target_function
+
+        schedule = DagSchedule()
+        schedule.id = compact.id
+        # Everything but the DAG's name is in its plan, which we share across
+        # schedules rather than copying the whole DAG into each of them.
+        schedule.dag.name = dag.name
+        schedule.target_function = fname
+        schedule.start_time = compact.start_time
+        schedule.consistency = NORMAL
+        schedule.arguments[fname].MergeFromString(compact.arguments)
+
+        for sink, location in compact.locations.items():
+            schedule.locations[sink] = location
+
+        triggers = plan.predecessors[fname]
+        if len(triggers) == 0:
+            triggers = ['BEGIN']
+        schedule.triggers.extend(triggers)
+
+        if compact.response_address:
+            schedule.response_address = compact.response_address
+        if compact.output_key:
+            schedule.output_key = compact.output_key
+        if compact.client_id:
+            schedule.client_id = compact.client_id
+        if compact.continuation:
+            schedule.continuation.MergeFromString(compact.continuation)
+
+        return schedule, plan
+
+
+def to_compact(schedule, version=None):
+    '''
+    The inverse of DagStore.expand: converts a DagSchedule with NORMAL
+    consistency into a CompactDagSchedule for its target function. version
+    is the version of the schedule's DAG, if the caller already knows it.
+    '''
+    if version is None:
+        version = get_dag_version(schedule.dag)
+
+    fname = schedule.target_function
+
+    compact = CompactDagSchedule()
+    compact.id = schedule.id
+    compact.dag_name = schedule.dag.name
+    compact.dag_version = version
+    compact.target_function = fname
+    compact.arguments = schedule.arguments[fname].SerializeToString()
+    compact.start_time = schedule.start_time
+    compact.response_address = schedule.response_address
+    compact.output_key = schedule.output_key
+    compact.client_id = schedule.client_id
+
+    for sink, location in schedule.locations.items():
+        compact.locations[sink] = location
+
+    if schedule.HasField('continuation'):
+        compact.continuation = schedule.continuation.SerializeToString()
+
+    return compact
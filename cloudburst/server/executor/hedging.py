@@ -0,0 +1,198 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import heapq
+import logging
+import random
+import time
+
+from cloudburst.server import utils as sutils
+from cloudburst.server.executor.call import LocalTrigger
+from cloudburst.server.executor.dag_plan import get_plan
+from cloudburst.server.executor.dag_store import to_compact
+from cloudburst.server.executor.object_store import SharedObjectHandle
+from cloudburst.shared.proto.cloudburst_pb2 import (
+    DagTrigger,
+    NORMAL,  # Cloudburst's consistency modes
+    MULTIEXEC  # Cloudburst's execution types
+)
+from cloudburst.shared.proto.internal_pb2 import HedgeRequest
+from cloudburst.shared.serializer import Serializer
+
+serializer = Serializer()
+
+# We only hedge a function once it has run at least this many times in a
+# reporting period, so that its runtime quantile means something.
+MIN_HEDGE_SAMPLES = 20
+
+# Arrays passed through the node's object store are only readable on this
+# node, so requests whose triggers carry them are never hedged.
+_HANDLE_MARKER = SharedObjectHandle.__name__.encode()
+
+
+class Hedger():
+    '''
+    Starts backup copies of requests that are running late. Each hedged
+    function has a threshold: the configured quantile of its runtimes over
+    the executor's last reporting period. When a request has been running
+    for longer than that, we ask a scheduler to start a backup copy of it on
+    another replica of the function, and whichever copy finishes first
+    triggers the downstream functions; they ignore the other's triggers.
+
+    Sinks are not hedged (the client would get two results), nor are
+    MULTIEXEC functions or requests with causal consistency. Because the poll
+    loop only notices late requests while a worker pool runs them, hedging
+    requires worker threads.
+    '''
+
+    def __init__(self, schedulers, pusher_cache, origin):
+        self.schedulers = schedulers
+        self.pusher_cache = pusher_cache
+        self.origin = origin
+
+        # A map from each hedged function to its configured quantile, and
+        # from each of them to its current threshold in seconds.
+        self.quantiles = {}
+        self.thresholds = {}
+
+        # The requests we are running as backup copies for another executor.
+        self.backups = set()
+
+        # A map from each request being watched to its schedule and triggers,
+        # and a heap of their deadlines.
+        self.running = {}
+        self.deadlines = []
+
+    def configure(self, fname, quantile):
+        self.quantiles[fname] = quantile
+
+    def remove(self, fname):
+        self.quantiles.pop(fname, None)
+        self.thresholds.pop(fname, None)
+
+    def update(self, fname, runtimes):
+        '''
+        Called with a function's runtime histogram at the end of each
+        reporting period.
+        '''
+        if fname in self.quantiles and len(runtimes) >= MIN_HEDGE_SAMPLES:
+            self.thresholds[fname] = runtimes.quantile(self.quantiles[fname])
+
+    def mark_backup(self, key):
+        self.backups.add(key)
+
+    def watch(self, key, schedule, triggers, plan=None, now=None):
+        '''
+        Called when a request starts running, with the plan of its DAG;
+        returns True if we will hedge it should it run late.
+        '''
+        fname = schedule.target_function
+        if fname not in self.thresholds or key in self.backups:
+            return False
+
+        if schedule.consistency != NORMAL:
+            return False
+
+        if plan is None:
+            plan = get_plan(schedule.dag)
+
+        if fname in plan.sinks or plan.functions[fname].type == MULTIEXEC:
+            return False
+
+        serialized = []
+        for trigger in triggers:
+            if isinstance(trigger, LocalTrigger):
+                # The function may modify these values while it runs, so we
+                # serialize them now.
+                trigger = _to_dag_trigger(trigger)
+            elif any([_HANDLE_MARKER in arg.body for arg in
+                      trigger.arguments.values]):
+                return False
+
+            serialized.append(trigger)
+
+        if now is None:
+            now = time.time()
+
+        deadline = now + self.thresholds[fname]
+        self.running[key] = (schedule, plan, serialized)
+        heapq.heappush(self.deadlines, (deadline, key))
+
+        return True
+
+    def done(self, key):
+        self.running.pop(key, None)
+        self.backups.discard(key)
+
+    def deadline(self):
+        '''
+        The earliest time at which a request we are watching will be late, or
+        None if we are not watching any.
+        '''
+        while len(self.deadlines) > 0 and \
+                self.deadlines[0][1] not in self.running:
+            heapq.heappop(self.deadlines)
+
+        if len(self.deadlines) == 0:
+            return None
+
+        return self.deadlines[0][0]
+
+    def check(self, now=None):
+        '''
+        Starts a backup copy of every request that is now late, and returns
+        how many were started. Each request is hedged at most once.
+        '''
+        if now is None:
+            now = time.time()
+
+        hedged = 0
+        while len(self.deadlines) > 0 and self.deadlines[0][0] <= now:
+            _, key = heapq.heappop(self.deadlines)
+            if key not in self.running:
+                continue
+
+            schedule, plan, triggers = self.running.pop(key)
+            self._send(schedule, plan, triggers)
+            hedged += 1
+
+        return hedged
+
+    def _send(self, schedule, plan, triggers):
+        logging.info('Request %s of function %s is running late; starting a '
+                     'backup copy.' % (schedule.id, schedule.target_function))
+
+        compact = to_compact(schedule, plan.version)
+        compact.hedged = True
+
+        request = HedgeRequest()
+        request.origin = self.origin
+        request.schedule = compact.SerializeToString()
+        request.triggers.extend([trigger.SerializeToString() for trigger in
+                                 triggers])
+
+        sched = random.choice(self.schedulers)
+        sckt = self.pusher_cache.get(sutils.get_hedge_address(sched))
+        sckt.send(request.SerializeToString())
+
+
+def _to_dag_trigger(local):
+    trigger = DagTrigger()
+    trigger.id = local.id
+    trigger.source = local.source
+    trigger.target_function = local.target_function
+    trigger.arguments.values.extend([serializer.dump(value, None, False) for
+                                     value in local.values])
+
+    return trigger
@@ -0,0 +1,131 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import mmap
+import os
+import time
+import uuid
+
+import numpy as np
+
+# A tmpfs directory, so that objects never leave memory.
+DEFAULT_STORE_DIR = '/dev/shm/cloudburst'
+
+# Arrays smaller than this (in bytes) are cheaper to send inline.
+DEFAULT_SIZE_THRESHOLD = 64 * 1024
+
+# Objects that nobody has picked up after this many seconds are assumed to
+# belong to a failed request and are removed.
+ORPHAN_TTL = 60
+
+
+class SharedObjectHandle():
+    '''
+    Stands in for a numpy array in a DAG trigger sent to an executor on the
+    same node. The array's bytes live in a file in the node's object store.
+    '''
+
+    def __init__(self, path, dtype, shape):
+        self.path = path
+        self.dtype = dtype
+        self.shape = shape
+
+
+class NodeObjectStore():
+    '''
+    A store for intermediate results that are passed between executors on the
+    same node. Rather than serializing a large array into a DagTrigger, the
+    producer writes it once to a file in a tmpfs directory and sends a handle;
+    the consumer maps the file and wraps the mapping in an array without
+    copying it.
+
+    Each consumer gets its own hard link to the object and removes that link
+    when it maps the object, so the memory is freed by the kernel once every
+    consumer has picked the object up and dropped its array. The mappings are
+    copy-on-write, so a function that modifies its input does not affect the
+    other consumers.
+    '''
+
+    def __init__(self, ip, directory=DEFAULT_STORE_DIR,
+                 threshold=DEFAULT_SIZE_THRESHOLD):
+        self.ip = ip
+        self.directory = directory
+        self.threshold = threshold
+
+        os.makedirs(directory, exist_ok=True)
+
+    def is_local(self, location):
+        '''
+        Whether an executor location (an ip:tid string from a DagSchedule) is
+        on this node.
+        '''
+        return location.split(':')[0] == self.ip
+
+    def accepts(self, value):
+        return isinstance(value, np.ndarray) and not value.dtype.hasobject \
+            and value.nbytes >= self.threshold
+
+    def put(self, value, consumers):
+        '''
+        Writes an array to the store and returns a map from each consumer's
+        function name to the handle it should be sent.
+        '''
+        path = os.path.join(self.directory, str(uuid.uuid4()))
+
+        with open(path, 'wb') as f:
+            f.write(np.ascontiguousarray(value).data)
+
+        handles = {}
+        for consumer in consumers:
+            link = path + '.' + consumer
+            os.link(path, link)
+            handles[consumer] = SharedObjectHandle(link, value.dtype.str,
+                                                   value.shape)
+
+        # Only the consumers' links keep the object alive from here on.
+        os.unlink(path)
+
+        return handles
+
+    def sweep(self):
+        '''
+        Removes objects that have not been picked up within ORPHAN_TTL
+        seconds, for example because their consumer failed.
+        '''
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.stat(path).st_mtime > ORPHAN_TTL:
+                    os.unlink(path)
+                    logging.info('Removed orphaned object %s.' % (path))
+            except FileNotFoundError:
+                pass  # Another executor on this node removed it first.
+
+
+def load_shared_object(handle):
+    '''
+    Maps the array behind a handle produced by another executor on this node
+    and removes the handle's link, since each link is read exactly once.
+    '''
+    fd = os.open(handle.path, os.O_RDONLY)
+    try:
+        buf = mmap.mmap(fd, 0, access=mmap.ACCESS_COPY)
+    finally:
+        os.close(fd)
+        os.unlink(handle.path)
+
+    return np.frombuffer(buf, dtype=np.dtype(handle.dtype)).reshape(
+        handle.shape)
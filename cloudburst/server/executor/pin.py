@@ -17,12 +17,21 @@ import sys
 
 import cloudburst.server.utils as sutils
 from cloudburst.server.executor import utils
+from cloudburst.server.executor.batching import (
+    AdaptiveBatcher,
+    DEFAULT_LATENCY_SLO,
+    DEFAULT_MAX_BATCH_SIZE
+)
+from cloudburst.shared.proto.cloudburst_pb2 import GenericResponse
 from cloudburst.shared.proto.internal_pb2 import PinFunction
 from cloudburst.shared.arbiter import Arbiter
+from cloudburst.shared.backoff import wait_for
+from cloudburst.shared.histogram import LatencyHistogram
 
 
 def pin(pin_socket, pusher_cache, kvs, status, function_cache, runtimes,
-        exec_counts, user_library, local, batching, arbiter):
+        exec_counts, user_library, local, batching, arbiter, batchers=None,
+        hedger=None):
     serialized = pin_socket.recv()
     pin_msg = PinFunction()
     pin_msg.ParseFromString(serialized)
@@ -34,16 +43,13 @@ def pin(pin_socket, pusher_cache, kvs, status, function_cache, runtimes,
     # mode.
     if not local:
         if (len(function_cache) > 0 and name not in function_cache):
-            sutils.error.SerializeToString()
-            sckt.send(sutils.error.SerializeToString())
+            sckt.send(_pin_response(pin_msg, False))
             return batching
 
-    func = utils.retrieve_function(pin_msg.name, kvs, user_library)
-
     # The function must exist -- because otherwise the DAG couldn't be
     # registered -- so we keep trying to retrieve it.
-    while not func:
-        func = utils.retrieve_function(name, kvs, user_library)
+    func = wait_for(lambda: utils.retrieve_function(name, kvs, user_library),
+                    bool)
     
     print(f'func of type:{type(func)}')
     arbiter.bind_func(func, name)
@@ -55,7 +61,7 @@ def pin(pin_socket, pusher_cache, kvs, status, function_cache, runtimes,
         status.functions.append(name)
 
     # Add metadata tracking for the newly pinned functions.
-    runtimes[name] = []
+    runtimes[name] = LatencyHistogram()
     exec_counts[name] = 0
     logging.info('Adding function %s to my local pinned functions.' % (name))
 
@@ -66,22 +72,54 @@ def pin(pin_socket, pusher_cache, kvs, status, function_cache, runtimes,
                            + ' is not allowed -- you can only use batching in'
                            + ' cluster mode or in local mode with one function.')
 
-    sckt.send(sutils.ok_resp)
+    # Each batching-enabled function gets its own batcher, which decides how
+    # long to hold requests back to build up a batch.
+    if pin_msg.batching and batchers is not None and name not in batchers:
+        max_batch_size = pin_msg.max_batch_size or DEFAULT_MAX_BATCH_SIZE
+        latency_slo = pin_msg.latency_slo or DEFAULT_LATENCY_SLO
+        batchers[name] = AdaptiveBatcher(max_batch_size, latency_slo)
+
+    if pin_msg.hedge_quantile and hedger is not None:
+        hedger.configure(name, pin_msg.hedge_quantile)
+
+    sckt.send(_pin_response(pin_msg, True))
 
     return pin_msg.batching
 
 
-def unpin(unpin_socket, status, function_cache, runtimes, exec_counts):
+def _pin_response(pin_msg, success):
+    # The scheduler may have many pins outstanding, so we tell it which one
+    # we are answering.
+    response = GenericResponse()
+    response.success = success
+    response.response_id = pin_msg.request_id
+
+    return response.SerializeToString()
+
+
+def unpin(unpin_socket, status, function_cache, runtimes, exec_counts,
+          warm=False):
+    '''
+    Unpins a function. By default, the executor restarts in order to clear
+    the context of the previous function. If warm is set, we instead stop
+    advertising the function and return its name; the caller releases the
+    function's state in place once its outstanding requests are done.
+    '''
     name = unpin_socket.recv_string()
     if name not in function_cache:
         logging.info('Received an unpin request for an unknown function: %s.' %
                      (name))
-        return
+        return None
 
     logging.info('Removing function %s from my local pinned functions.' %
                  (name))
 
-    # We restart the container after unpinning the function in order to clear
-    # the context of the previous function. Exiting with code 0 means that we
-    # will get restarted by the wrapper script.
-    sys.exit(0)
+    if not warm:
+        # Exiting with code 0 means that we will get restarted by the wrapper
+        # script.
+        sys.exit(0)
+
+    if name in status.functions:
+        status.functions.remove(name)
+
+    return name
@@ -0,0 +1,105 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import queue
+import threading
+
+from cloudburst.server.executor.call import prefetch_refs
+from cloudburst.server.executor.workers import (
+    create_kvs_clients,
+    get_worker_id,
+    WORKER_ID_STRIDE
+)
+from cloudburst.shared.serializer import get_references
+
+# The prefetcher takes the last worker ID slot of its executor thread, which
+# the worker pool leaves free (see MAX_WORKERS).
+PREFETCHER_INDEX = WORKER_ID_STRIDE - 1
+
+# The most argument lists that can wait to be prefetched. Prefetching is only
+# an optimization, since each function resolves its own references anyway, so
+# once the prefetcher falls this far behind we drop new work instead.
+MAX_PENDING_PREFETCHES = 1024
+
+
+class ReferencePrefetcher():
+    '''
+    Reads the KVS references in a DAG function's arguments as soon as its
+    schedule arrives, so that the reads overlap with upstream functions in the
+    DAG rather than starting once every trigger is in. Prefetched values land
+    in the executor's reference cache, where the function's own resolution
+    finds them; a resolution that races with an in-flight prefetch waits for
+    it instead of reading the key twice.
+
+    Prefetches run on a single background thread with its own KVS clients. The
+    poll loop only hands over the serialized arguments, so even deserializing
+    them happens off of the poll loop. Only arguments that can contain
+    references are deserialized at all.
+    '''
+
+    def __init__(self, context, thread_id, user_states, local, cache):
+        self.cache = cache
+        self.requests = queue.Queue(maxsize=MAX_PENDING_PREFETCHES)
+
+        self.client, self.states_client = create_kvs_clients(
+            context, get_worker_id(thread_id, PREFETCHER_INDEX), user_states,
+            local)
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def prefetch(self, args):
+        '''
+        Enqueues a prefetch for the references in args, a list of serialized
+        Value protobufs. This never blocks: if too many prefetches are already
+        waiting, this one is dropped.
+        '''
+        if len(args) == 0:
+            return
+
+        try:
+            self.requests.put_nowait(list(args))
+        except queue.Full:
+            logging.info('Prefetch queue is full; dropping a prefetch.')
+
+    def _run(self):
+        while True:
+            args = self.requests.get()
+
+            # A malformed argument must not stop the prefetcher, so we skip
+            # it; the function itself will report the error.
+            refs = []
+            for arg in args:
+                try:
+                    refs.extend(get_references([arg]))
+                except Exception as e:
+                    logging.info('Skipping an argument that could not be '
+                                 'prefetched: %s' % (str(e)))
+
+            # Skip anything that is already cached or being fetched, and mark
+            # the rest as pending so that lookups wait for us.
+            refs = [ref for ref in refs if self.cache.reserve(ref.key)]
+            if len(refs) == 0:
+                continue
+
+            try:
+                prefetch_refs(refs, self.states_client, self.cache)
+            except Exception as e:
+                logging.exception('Unexpected error %s while prefetching.' %
+                                  (str(e)))
+            finally:
+                for ref in refs:
+                    self.cache.release(ref.key)
+
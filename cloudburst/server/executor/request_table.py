@@ -0,0 +1,232 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import time
+
+# How long (in seconds) a request may wait for its schedule or triggers before
+# we give up on it.
+DEFAULT_REQUEST_TIMEOUT = 60
+
+# How long (in seconds) we remember finished requests, so that repeated
+# triggers for them are ignored.
+FINISHED_TTL = 10
+
+WHEEL_RESOLUTION = 0.1
+WHEEL_SLOTS = 1024
+
+
+class TimingWheel():
+    '''
+    A hashed timing wheel: deadlines are rounded up to ticks of resolution
+    seconds and hashed into a fixed ring of slots. Scheduling and cancelling
+    are O(1), and advancing the wheel only looks at the slots for the ticks
+    that have passed, so expiring entries never requires a scan of everything
+    that is being tracked. Deadlines more than one rotation away simply stay
+    in their slot until their tick comes around.
+    '''
+
+    def __init__(self, resolution=WHEEL_RESOLUTION, num_slots=WHEEL_SLOTS,
+                 now=None):
+        if now is None:
+            now = time.time()
+
+        self.resolution = resolution
+        self.slots = [set() for _ in range(num_slots)]
+
+        # A map from each key to the tick at which it expires.
+        self.ticks = {}
+        self.current_tick = self._tick(now)
+
+    def __contains__(self, key):
+        return key in self.ticks
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def schedule(self, key, deadline):
+        '''
+        Sets (or resets) the deadline for key.
+        '''
+        self.cancel(key)
+
+        tick = max(self._tick(deadline), self.current_tick + 1)
+        self.ticks[key] = tick
+        self.slots[tick % len(self.slots)].add(key)
+
+    def cancel(self, key):
+        tick = self.ticks.pop(key, None)
+        if tick is not None:
+            self.slots[tick % len(self.slots)].discard(key)
+
+    def advance(self, now=None):
+        '''
+        Moves the wheel forward to now and returns the keys whose deadlines
+        have passed.
+        '''
+        if now is None:
+            now = time.time()
+
+        target = self._tick(now)
+        expired = []
+
+        # If we have fallen more than a rotation behind, each slot only needs
+        # to be visited once.
+        start = max(self.current_tick + 1, target - len(self.slots) + 1)
+        for tick in range(start, target + 1):
+            slot = self.slots[tick % len(self.slots)]
+            for key in [key for key in slot if self.ticks[key] <= target]:
+                slot.discard(key)
+                del self.ticks[key]
+                expired.append(key)
+
+        self.current_tick = max(self.current_tick, target)
+        return expired
+
+    def _tick(self, t):
+        return int(t // self.resolution)
+
+
+class RequestTable():
+    '''
+    The executor's per-request state for DAG functions: the schedules we have
+    received (by function, then request ID), the triggers we have received
+    for each (request ID, function) key, and the requests we have recently
+    finished.
+
+    Every key gets a deadline when we first hear about it. Handing a request
+    off for execution clears its deadline; finishing it gives it a short one,
+    after which we forget it. A request whose deadline passes while it is
+    still waiting on its schedule or triggers -- for example because an
+    upstream function failed or a MULTIEXEC function rejected every result --
+    is dropped and counted as abandoned.
+    '''
+
+    def __init__(self, timeout=DEFAULT_REQUEST_TIMEOUT,
+                 finished_ttl=FINISHED_TTL):
+        self.timeout = timeout
+        self.finished_ttl = finished_ttl
+
+        self.queue = {}
+        self.received_triggers = {}
+
+        # A map from each (request ID, function) key whose schedule we hold to
+        # the compiled plan of the schedule's DAG, which we look up once, when
+        # the schedule arrives.
+        self.plans = {}
+        self.receive_times = {}
+        self.finished_executions = {}
+
+        # A map from each running request to the functions whose triggers it
+        # was started with.
+        self.running = {}
+
+        self.wheel = TimingWheel()
+        self.abandoned = 0
+
+    def track(self, key, now=None):
+        '''
+        Called whenever a schedule or trigger arrives for key. Starts the
+        request's deadline the first time we see it.
+        '''
+        if key in self.receive_times:
+            return
+
+        if now is None:
+            now = time.time()
+
+        self.receive_times[key] = now
+        self.wheel.schedule(key, now + self.timeout)
+
+    def dispatch(self, key, sources=()):
+        '''
+        Called when a request is handed off for execution with triggers from
+        sources; it cannot be abandoned while it runs.
+        '''
+        self.wheel.cancel(key)
+        self.running[key] = set(sources)
+
+    def is_duplicate(self, key, source):
+        '''
+        Whether a trigger from source for key is one we have already acted on:
+        either the request has finished, or it is running with a trigger from
+        the same source (e.g., the slower of an upstream function's two
+        hedged copies).
+        '''
+        return key in self.finished_executions or \
+            source in self.running.get(key, ())
+
+    def finish(self, key, success, now=None):
+        if now is None:
+            now = time.time()
+
+        self.receive_times.pop(key, None)
+        self.running.pop(key, None)
+
+        if success:
+            sid, fname = key
+            if fname in self.queue:
+                self.queue[fname].pop(sid, None)
+            self.plans.pop(key, None)
+
+            self.finished_executions[key] = now
+            self.wheel.schedule(key, now + self.finished_ttl)
+        else:
+            # The schedule stays queued (a MULTIEXEC function may still get a
+            # valid result from a later trigger), but only until the timeout.
+            self.receive_times[key] = now
+            self.wheel.schedule(key, now + self.timeout)
+
+    def expire(self, now=None):
+        '''
+        Drops the state of every request whose deadline has passed, and
+        returns the number of them that were abandoned.
+        '''
+        abandoned = 0
+        for key in self.wheel.advance(now):
+            if self.finished_executions.pop(key, None) is not None:
+                continue
+
+            sid, fname = key
+            pending = False
+            if fname in self.queue and sid in self.queue[fname]:
+                del self.queue[fname][sid]
+                pending = True
+            self.plans.pop(key, None)
+            if key in self.received_triggers:
+                del self.received_triggers[key]
+                pending = True
+            self.receive_times.pop(key, None)
+
+            if pending:
+                logging.info('Abandoning request %s for function %s.' %
+                             (sid, fname))
+                abandoned += 1
+
+        self.abandoned += abandoned
+        return abandoned
+
+    def load(self):
+        '''
+        Returns the number of requests whose schedules we hold that are not
+        yet running, and the number that are running.
+        '''
+        queued = sum([len(schedules) for schedules in self.queue.values()])
+        in_flight = len(self.running)
+
+        return max(queued - in_flight, 0), in_flight
+
+    def report(self, stats):
+        stats.abandoned_requests = self.abandoned
+        self.abandoned = 0
@@ -17,35 +17,80 @@ import os
 import sys
 import time
 
+# When this process started loading the executor, which is what we measure
+# startup time from unless we were forked from a zygote.
+LAUNCH_TIME = time.time()
+
 from anna.client import AnnaTcpClient
 from anna.zmq_util import SocketCache
 import zmq
 
 from cloudburst.server import utils as sutils
 from cloudburst.server.executor import utils
-from cloudburst.server.executor.call import exec_function, exec_dag_function
+from cloudburst.server.executor.cache import (
+    DEFAULT_CACHE_CAPACITY,
+    DEFAULT_CACHE_POLICY,
+    DEFAULT_CACHE_TTL,
+    ReferenceCache
+)
+from cloudburst.server.executor.call import (
+    exec_dag_function,
+    exec_function,
+    exec_function_call
+)
+from cloudburst.server.executor.dag_plan import get_plan
+from cloudburst.server.executor.dag_store import DagStore
+from cloudburst.server.executor.hedging import Hedger
+from cloudburst.server.executor.object_store import (
+    DEFAULT_SIZE_THRESHOLD,
+    NodeObjectStore
+)
 from cloudburst.server.executor.pin import pin, unpin
+from cloudburst.server.executor.prefetch import ReferencePrefetcher
+from cloudburst.server.executor.request_table import (
+    DEFAULT_REQUEST_TIMEOUT,
+    RequestTable
+)
+from cloudburst.server.executor.spill import SpilledResults
+from cloudburst.server.executor.status import (
+    STATUS_PUSH_INTERVAL,
+    StatusReporter
+)
 from cloudburst.server.executor.user_library import CloudburstUserLibrary, KvsUserLibrary
 from cloudburst.server.executor.utils import get_states_kvs
+from cloudburst.server.executor.workers import ExecutorWorkerPool
 from cloudburst.shared.anna_ipc_client import AnnaIpcClient
+from cloudburst.shared.histogram import (
+    DEFAULT_LEGACY_SAMPLES,
+    LatencyHistogram
+)
 from cloudburst.shared.kvs_client import RedisKvsClient, ShredderKvsClient
 from cloudburst.shared.proto.cloudburst_pb2 import (
     DagSchedule,
     DagTrigger,
+    FunctionCall,
+    NORMAL,  # Cloudburst's consistency modes
     MULTIEXEC # Cloudburst's execution types
 )
 from cloudburst.shared.proto.internal_pb2 import (
     CPU, GPU, # Cloudburst's executor types
+    CompactDagSchedule,
     ExecutorStatistics,
     ThreadStatus,
 )
 from cloudburst.shared.arbiter import Arbiter
 
 REPORT_THRESH = 5
-BATCH_SIZE_MAX = 20
 
 
-def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
+def executor(ip, mgmt_ip, user_states, schedulers, thread_id, num_workers=0,
+             cache_capacity=DEFAULT_CACHE_CAPACITY,
+             cache_policy=DEFAULT_CACHE_POLICY, cache_ttl=DEFAULT_CACHE_TTL,
+             prefetch=True, object_store_dir=None,
+             object_store_threshold=DEFAULT_SIZE_THRESHOLD,
+             request_timeout=DEFAULT_REQUEST_TIMEOUT, warm_unpin=True,
+             legacy_samples=DEFAULT_LEGACY_SAMPLES,
+             status_interval=STATUS_PUSH_INTERVAL, launch_time=None):
     logging.basicConfig(filename='log_executor.txt', level=logging.INFO,
                         format='%(asctime)s %(message)s')
 
@@ -74,6 +119,10 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
     dag_queue_socket.bind(sutils.BIND_ADDR_TEMPLATE % (sutils.DAG_QUEUE_PORT
                                                        + thread_id))
 
+    compact_queue_socket = context.socket(zmq.PULL)
+    compact_queue_socket.bind(sutils.BIND_ADDR_TEMPLATE %
+                              (sutils.COMPACT_DAG_QUEUE_PORT + thread_id))
+
     dag_exec_socket = context.socket(zmq.PULL)
     dag_exec_socket.bind(sutils.BIND_ADDR_TEMPLATE % (sutils.DAG_EXEC_PORT
                                                       + thread_id))
@@ -84,14 +133,47 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
 
     pusher_cache = SocketCache(context, zmq.PUSH)
 
+    # A cache of KVS keys and their corresponding deserialized payloads,
+    # bounded by a memory budget in bytes.
+    cache = ReferenceCache(cache_capacity, cache_policy, cache_ttl)
+
     poller = zmq.Poller()
     poller.register(pin_socket, zmq.POLLIN)
     poller.register(unpin_socket, zmq.POLLIN)
     poller.register(exec_socket, zmq.POLLIN)
     poller.register(dag_queue_socket, zmq.POLLIN)
+    poller.register(compact_queue_socket, zmq.POLLIN)
     poller.register(dag_exec_socket, zmq.POLLIN)
     poller.register(self_depart_socket, zmq.POLLIN)
 
+    # If worker threads are enabled, function invocations are run on a bounded
+    # pool while this loop keeps accepting schedules, triggers, and pins.
+    # Otherwise, everything runs inline on this thread.
+    pool = None
+    if num_workers > 0:
+        pool = ExecutorWorkerPool(num_workers, context, ip, thread_id,
+                                  user_states, not mgmt_ip, cache)
+        poller.register(pool.completion_socket, zmq.POLLIN)
+
+    # Reads the references in a DAG function's arguments as soon as its
+    # schedule arrives, rather than once all of its triggers are in.
+    prefetcher = None
+    if prefetch:
+        prefetcher = ReferencePrefetcher(context, thread_id, user_states,
+                                         not mgmt_ip, cache)
+
+    # Large arrays sent to DAG functions on this node are passed through the
+    # node's shared-memory object store rather than inline in triggers.
+    object_store = None
+    if object_store_dir:
+        object_store = NodeObjectStore(ip, object_store_dir,
+                                       object_store_threshold)
+
+    # Results too large to send inline are spilled to the KVS, and freed once
+    # their consumers have had as long to read them as any request waits for
+    # its triggers.
+    spilled = SpilledResults(request_timeout)
+
     # If the management IP is set to None, that means that we are running in
     # local mode, so we use a regular AnnaTcpClient rather than an IPC client.
     if mgmt_ip:
@@ -106,21 +188,34 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
 
     # user_library = CloudburstUserLibrary(context, pusher_cache, ip, thread_id,
     #                                   client)
-    user_library = KvsUserLibrary(context, pusher_cache, ip, thread_id, states_client)
+    user_library = KvsUserLibrary(context, pusher_cache, ip, thread_id, states_client,
+                                  cache=cache)
 
     status = ThreadStatus()
     status.ip = ip
     status.tid = thread_id
     status.running = True
     status.type = exec_type
-    utils.push_status(schedulers, pusher_cache, status)
+
+    reporter = StatusReporter(schedulers, pusher_cache, status,
+                              status_interval)
+    reporter.push()
 
     departing = False
 
+    # Tracks the state of every DAG request we are working on, and drops
+    # requests that have waited too long for their schedule or triggers.
+    requests = RequestTable(request_timeout)
+
     # Maintains a request queue for each function pinned on this executor. Each
     # function will have a set of request IDs mapped to it, and this map stores
     # a schedule for each request ID.
-    queue = {}
+    queue = requests.queue
+
+    # The DAGs named by the compact schedules we receive, read from the KVS
+    # the first time we see each one. Schedules whose DAG is not in the KVS
+    # yet wait for it as long as any other request waits for its triggers.
+    dag_store = DagStore(client, request_timeout)
 
     # Tracks the actual function objects that are pinned to this executor.
     function_cache = {}
@@ -131,11 +226,7 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
     # If multiple triggers are necessary for a function, track the triggers as
     # we receive them. This is also used if a trigger arrives before its
     # corresponding schedule.
-    received_triggers = {}
-
-    # Tracks when we received a function request, so we can report end-to-end
-    # latency for the whole executio.
-    receive_times = {}
+    received_triggers = requests.received_triggers
 
     # Tracks the number of requests we are finishing for each function pinned
     # here.
@@ -145,18 +236,15 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
     # sink function.
     dag_runtimes = {}
 
-    # A map with KVS keys and their corresponding deserialized payloads.
-    cache = {}
-
-    # A map which tracks the most recent DAGs for which we have finished our
-    # work.
-    finished_executions = {}
-
     # The set of pinned functions and whether they support batching. NOTE: This
     # is only a set for local mode -- in cluster mode, there will only be one
     # pinned function per executor.
     batching = False
 
+    # A map from each pinned batching-enabled function to the batcher that
+    # holds its ready requests until a batch should run.
+    batchers = {}
+
     # Internal metadata to track thread utilization.
     report_start = time.time()
     event_occupancy = {'pin': 0.0,
@@ -166,15 +254,320 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
                        'dag_exec': 0.0}
     total_occupancy = 0.0
 
+    # Triggers for functions pinned on this thread skip ZMQ entirely; we
+    # recognize them by the location the scheduler assigned.
+    self_address = ip + ':' + str(thread_id)
+
+    # Starts backup copies of late requests of hedged functions on other
+    # replicas. The poll loop can only see that a request is late while a
+    # worker runs it, so this requires a worker pool.
+    hedger = None
+    if pool:
+        hedger = Hedger(schedulers, pusher_cache, self_address)
+
+    def release_function(fname):
+        # Drops everything we hold for a function that was unpinned in place,
+        # once none of its requests are left. When no functions remain, the
+        # rest of the thread's state is reset so the next pin starts clean.
+        if len(queue.get(fname, {})) > 0:
+            return False
+
+        queue.pop(fname, None)
+        function_cache.pop(fname, None)
+        runtimes.pop(fname, None)
+        exec_counts.pop(fname, None)
+        batchers.pop(fname, None)
+        if hedger:
+            hedger.remove(fname)
+
+        if len(function_cache) == 0:
+            arbiter.reset()
+            cache.clear()
+            user_library.close()
+
+        logging.info('Released function %s.' % (fname))
+        return True
+
+    def deliver_local_triggers(triggers):
+        # Triggers emitted by a function for its successors on this thread:
+        # we record them exactly as if they had arrived on dag_exec_socket,
+        # and run any successor that is now ready right away.
+        for trigger in triggers:
+            fname = trigger.target_function
+            key = (trigger.id, fname)
+            if requests.is_duplicate(key, trigger.source):
+                continue
+
+            if key not in received_triggers:
+                received_triggers[key] = {}
+            received_triggers[key][trigger.source] = trigger
+            requests.track(key)
+
+            # The schedule has not arrived yet, so the dag_queue handler will
+            # pick this trigger up.
+            if fname not in queue or trigger.id not in queue[fname]:
+                continue
+
+            schedule = queue[fname][trigger.id]
+            fref = requests.plans[key].functions[fname]
+
+            if fref.type == MULTIEXEC:
+                trigger_set = [trigger]
+            elif len(received_triggers[key]) == len(schedule.triggers):
+                trigger_set = list(received_triggers[key].values())
+            else:
+                continue
+
+            del received_triggers[key]
+            run_dag_function(fname, [key], [trigger_set], [schedule],
+                             time.time())
+
+    def receive_schedule(schedule, work_start, plan=None):
+        fname = schedule.target_function
+
+        # Schedules that do not come with their plan carry their DAG's full
+        # definition, so we look the plan up by its version.
+        if plan is None:
+            plan = get_plan(schedule.dag)
+
+        logging.info('Received a schedule for DAG %s (%s), function %s.' %
+                     (schedule.dag.name, schedule.id, fname))
+
+        if fname not in queue:
+            queue[fname] = {}
+
+        queue[fname][schedule.id] = schedule
+        requests.plans[(schedule.id, fname)] = plan
+        requests.track((schedule.id, fname))
+
+        # In case we receive the trigger before we receive the schedule, we
+        # can trigger from this operation as well.
+        trkey = (schedule.id, fname)
+
+        # Check to see what type of execution this function is.
+        fref = plan.functions[fname]
+
+        ready = (trkey in received_triggers and
+                 ((len(received_triggers[trkey]) == len(schedule.triggers))
+                  or (fref.type == MULTIEXEC)))
+
+        # If we are still waiting on upstream functions, start reading
+        # this function's references in the meantime.
+        if not ready and prefetcher and schedule.consistency == NORMAL:
+            prefetcher.prefetch(schedule.arguments[fname].values)
+
+        if ready:
+
+            triggers = list(received_triggers[trkey].values())
+
+            if fname not in function_cache:
+                logging.error('%s not in function cache', fname)
+                utils.generate_error_response(schedule, client, fname)
+                return
+
+            # We don't support actual batching for when we receive a
+            # schedule before a trigger, so everything is just a batch of
+            # size 1 if anything (unless the function has a batcher).
+            del received_triggers[trkey]
+            run_dag_function(fname, [trkey], [triggers], [schedule],
+                             work_start)
+
+    def receive_compact(compact, schedule, plan, work_start):
+        if compact.hedged and hedger:
+            hedger.mark_backup((compact.id, compact.target_function))
+
+        receive_schedule(schedule, work_start, plan)
+
+    def run_dag_function(fname, keys, trigger_sets, schedules, work_start):
+        # Requests that have all of their triggers are no longer at risk of
+        # being abandoned.
+        for key, triggers in zip(keys, trigger_sets):
+            requests.dispatch(key, [trigger.source for trigger in triggers])
+
+        # Batching-enabled functions hand the requests to their batcher, which
+        # releases them once a full batch is ready or the oldest request has
+        # waited as long as the function's latency SLO allows.
+        if fname in batchers:
+            for key, triggers, schedule in zip(keys, trigger_sets, schedules):
+                batchers[fname].add(key, triggers, schedule)
+        else:
+            dispatch_dag_function(fname, keys, trigger_sets, schedules,
+                                  work_start)
+
+    def dispatch_dag_function(fname, keys, trigger_sets, schedules,
+                              work_start):
+        function = function_cache[fname]
+        batched = batching
+        batcher = batchers.get(fname)
+        plans = [requests.plans[key] for key in keys]
+
+        def complete(successes):
+            _complete_dag_execution(fname, keys, successes, work_start,
+                                    requests, runtimes, exec_counts)
+
+            if hedger:
+                for key in keys:
+                    hedger.done(key)
+
+        if not pool:
+            start = time.time()
+            local_triggers = []
+            successes = exec_dag_function(pusher_cache, client, states_client,
+                                          trigger_sets, function, schedules,
+                                          user_library, dag_runtimes, cache,
+                                          schedulers, batched, arbiter,
+                                          object_store, self_address,
+                                          local_triggers, plans, spilled)
+            user_library.close()
+
+            if batcher:
+                batcher.record(len(keys), time.time() - start)
+            complete(successes)
+            deliver_local_triggers(local_triggers)
+            return
+
+        def work(resources):
+            start = time.time()
+
+            # Workers track DAG runtimes locally, and we merge them into the
+            # executor's metadata once we are back on the poll loop.
+            local_runtimes = {}
+            local_triggers = []
+            successes = exec_dag_function(resources.pusher_cache,
+                                          resources.client,
+                                          resources.states_client,
+                                          trigger_sets, function, schedules,
+                                          resources.user_library,
+                                          local_runtimes, cache, schedulers,
+                                          batched, arbiter, object_store,
+                                          self_address, local_triggers, plans,
+                                          spilled)
+            resources.user_library.close()
+
+            return (successes, local_runtimes, local_triggers,
+                    time.time() - start)
+
+        if hedger:
+            for key, triggers, schedule, plan in zip(keys, trigger_sets,
+                                                     schedules, plans):
+                hedger.watch(key, schedule, triggers, plan)
+
+        def done(result):
+            nonlocal total_occupancy
+
+            if result is None:  # The worker raised an unexpected error.
+                complete([False] * len(keys))
+                return
+
+            successes, local_runtimes, local_triggers, elapsed = result
+            if batcher:
+                batcher.record(len(keys), elapsed)
+
+            for dname in local_runtimes:
+                if dname not in dag_runtimes:
+                    dag_runtimes[dname] = LatencyHistogram()
+                dag_runtimes[dname].merge(local_runtimes[dname])
+
+            # Worker time is spread over the whole pool when we compute this
+            # thread's utilization.
+            event_occupancy['dag_exec'] += elapsed / pool.num_workers
+            total_occupancy += elapsed / pool.num_workers
+
+            complete(successes)
+            deliver_local_triggers(local_triggers)
+
+        pool.submit(work, done)
+
+    # How long it took from launching this executor until it was ready for
+    # work; we report this once, with our first statistics.
+    if launch_time is None:
+        launch_time = LAUNCH_TIME
+    startup_time = time.time() - launch_time
+    logging.info('Executor thread %d started in %.6f seconds.' %
+                 (thread_id, startup_time))
+
     while True:
-        socks = dict(poller.poll(timeout=1000))
+        # Wake up in time to release any batch whose wait window closes before
+        # the usual poll timeout.
+        timeout = 1000
+        now = time.time()
+        for batcher in batchers.values():
+            deadline = batcher.deadline()
+            if deadline is not None:
+                if batcher.ready(now):
+                    deadline = now
+                timeout = min(timeout, max(deadline - now, 0) * 1000)
+
+        # Likewise, wake up in time to hedge a request that is running late.
+        if hedger:
+            deadline = hedger.deadline()
+            if deadline is not None:
+                timeout = min(timeout, max(deadline - now, 0) * 1000)
+
+        # Likewise, wake up in time to look for the DAGs that held compact
+        # schedules are waiting on.
+        deadline = dag_store.deadline()
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - now, 0) * 1000)
+
+        # Tell the schedulers about any change in our load, and wake up in
+        # time to send one that had to be held back.
+        reporter.report_load(*requests.load(), now=now)
+        deadline = reporter.load_deadline()
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - now, 0) * 1000)
+
+        socks = dict(poller.poll(timeout=timeout))
+        reporter.tick()
+
+        if pool and pool.completion_socket in socks:
+            pool.drain()
+
+        # Functions on worker threads cannot receive messages, so we return
+        # whatever is sent to this thread to its senders rather than leave
+        # them blocked once the inbox fills up.
+        if pool:
+            rejected = user_library.reject()
+            if rejected > 0:
+                logging.warning('Returned %d messages sent to this thread: '
+                                'functions on worker threads cannot receive '
+                                'messages.' % (rejected))
+
+        # Forget requests that finished a while ago, and give up on ones that
+        # have waited too long for their schedule or triggers.
+        requests.expire()
+        spilled.expire(client)
+
+        if hedger:
+            hedger.check()
+
+        for compact, schedule, plan in dag_store.retry():
+            receive_compact(compact, schedule, plan, time.time())
+
+        for fname, batcher in batchers.items():
+            if batcher.ready():
+                work_start = time.time()
+                keys, trigger_sets, schedules = batcher.take()
+                dispatch_dag_function(fname, keys, trigger_sets, schedules,
+                                      work_start)
+
+                elapsed = time.time() - work_start
+                event_occupancy['dag_exec'] += elapsed
+                total_occupancy += elapsed
+
+        # Stop dequeueing new work while every worker is busy, so that
+        # requests wait in the ZMQ queues rather than in the pool.
+        if pool:
+            flags = 0 if pool.full() else zmq.POLLIN
+            poller.modify(exec_socket, flags)
+            poller.modify(dag_exec_socket, flags)
 
         if pin_socket in socks and socks[pin_socket] == zmq.POLLIN:
             work_start = time.time()
             batching = pin(pin_socket, pusher_cache, client, status,
                            function_cache, runtimes, exec_counts, user_library,
-                           local, batching, arbiter)
-            utils.push_status(schedulers, pusher_cache, status)
+                           local, batching, arbiter, batchers, hedger)
+            reporter.push()
 
             elapsed = time.time() - work_start
             event_occupancy['pin'] += elapsed
@@ -182,9 +575,14 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
 
         if unpin_socket in socks and socks[unpin_socket] == zmq.POLLIN:
             work_start = time.time()
-            unpin(unpin_socket, status, function_cache, runtimes,
-                  exec_counts)
-            utils.push_status(schedulers, pusher_cache, status)
+            fname = unpin(unpin_socket, status, function_cache, runtimes,
+                          exec_counts, warm_unpin)
+            reporter.push()
+
+            # Requests that were already queued for the function still run;
+            # otherwise, we can release it right away.
+            if fname:
+                release_function(fname)
 
             elapsed = time.time() - work_start
             event_occupancy['unpin'] += elapsed
@@ -192,11 +590,22 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
 
         if exec_socket in socks and socks[exec_socket] == zmq.POLLIN:
             work_start = time.time()
-            exec_function(exec_socket, client, states_client, user_library, cache,
-                          function_cache)
-            user_library.close()
-
-            utils.push_status(schedulers, pusher_cache, status)
+            if pool:
+                call = FunctionCall()
+                call.ParseFromString(exec_socket.recv())
+
+                def work(resources, call=call):
+                    exec_function_call(call, resources.client,
+                                       resources.states_client,
+                                       resources.user_library, cache,
+                                       function_cache)
+                    resources.user_library.close()
+
+                pool.submit(work, lambda _: None)
+            else:
+                exec_function(exec_socket, client, states_client, user_library,
+                              cache, function_cache)
+                user_library.close()
 
             elapsed = time.time() - work_start
             event_occupancy['func_exec'] += elapsed
@@ -221,60 +630,33 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
                         raise e # Unexpected error.
 
                 schedule.ParseFromString(msg)
-                fname = schedule.target_function
+                receive_schedule(schedule, work_start)
 
-                logging.info('Received a schedule for DAG %s (%s), function %s.' %
-                             (schedule.dag.name, schedule.id, fname))
-
-                if fname not in queue:
-                    queue[fname] = {}
-
-                queue[fname][schedule.id] = schedule
-
-                if (schedule.id, fname) not in receive_times:
-                    receive_times[(schedule.id, fname)] = time.time()
-
-                # In case we receive the trigger before we receive the schedule, we
-                # can trigger from this operation as well.
-                trkey = (schedule.id, fname)
-                fref = None
-
-                # Check to see what type of execution this function is.
-                for ref in schedule.dag.functions:
-                    if ref.name == fname:
-                        fref = ref
-
-                if (trkey in received_triggers and
-                        ((len(received_triggers[trkey]) == len(schedule.triggers))
-                         or (fref.type == MULTIEXEC))):
-
-                    triggers = list(received_triggers[trkey].values())
-
-                    if fname not in function_cache:
-                        logging.error('%s not in function cache', fname)
-                        utils.generate_error_response(schedule, client, fname)
-                        continue
+            elapsed = time.time() - work_start
+            event_occupancy['dag_queue'] += elapsed
+            total_occupancy += elapsed
 
-                    # We don't support actual batching for when we receive a
-                    # schedule before a trigger, so everything is just a batch of
-                    # size 1 if anything.
-                    success = exec_dag_function(pusher_cache, client, states_client,
-                                                [triggers], function_cache[fname],
-                                                [schedule], user_library,
-                                                dag_runtimes, cache, schedulers,
-                                                batching, arbiter)[0]
-                    user_library.close()
+        if compact_queue_socket in socks and \
+                socks[compact_queue_socket] == zmq.POLLIN:
+            work_start = time.time()
 
-                    del received_triggers[trkey]
-                    if success:
-                        del queue[fname][schedule.id]
+            while True:
+                compact = CompactDagSchedule()
+                try:
+                    msg = compact_queue_socket.recv(zmq.DONTWAIT)
+                except zmq.ZMQError as e:
+                    if e.errno == zmq.EAGAIN:
+                        break # There are no more messages.
+                    else:
+                        raise e # Unexpected error.
 
-                        fend = time.time()
-                        fstart = receive_times[(schedule.id, fname)]
-                        runtimes[fname].append(fend - work_start)
-                        exec_counts[fname] += 1
+                compact.ParseFromString(msg)
 
-                        finished_executions[(schedule.id, fname)] = time.time()
+                # If we don't have its DAG yet, the store holds on to the
+                # schedule until the DAG shows up in the KVS.
+                expanded = dag_store.expand(compact)
+                if expanded is not None:
+                    receive_compact(compact, *expanded, work_start)
 
             elapsed = time.time() - work_start
             event_occupancy['dag_queue'] += elapsed
@@ -283,10 +665,11 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
         if dag_exec_socket in socks and socks[dag_exec_socket] == zmq.POLLIN:
             work_start = time.time()
 
-            # How many messages to dequeue -- BATCH_SIZE_MAX or 1 depending on
-            # the function configuration.
-            if batching:
-                count = BATCH_SIZE_MAX
+            # How many messages to dequeue -- the largest batch size or 1
+            # depending on the function configuration.
+            if batchers:
+                count = max([batcher.max_batch_size for batcher in
+                             batchers.values()])
             else:
                 count = 1
 
@@ -305,24 +688,23 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
 
                 trigger.ParseFromString(msg)
 
+                fname = trigger.target_function
+                key = (trigger.id, fname)
+
                 # We have received a repeated trigger for a function that has
-                # already finished executing.
-                if trigger.id in finished_executions:
+                # already finished executing, or that is running with a
+                # trigger from the same source.
+                if requests.is_duplicate(key, trigger.source):
                     continue
 
-                fname = trigger.target_function
                 logging.info('Received a trigger for schedule %s, function %s.' %
                              (trigger.id, fname))
-
-                key = (trigger.id, fname)
                 trigger_keys.add(key)
                 if key not in received_triggers:
                     received_triggers[key] = {}
 
-                if (trigger.id, fname) not in receive_times:
-                    receive_times[(trigger.id, fname)] = time.time()
-
                 received_triggers[key][trigger.source] = trigger
+                requests.track(key)
 
             # Only execute the functions for which we have received a schedule.
             # Everything else will wait.
@@ -333,18 +715,16 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
             if len(trigger_keys) == 0:
                 continue
 
-            fref = None
-            schedule = queue[fname][list(trigger_keys)[0][0]] # Pick a random schedule to check.
+            key = list(trigger_keys)[0] # Pick a random schedule to check.
+            schedule = queue[fname][key[0]]
             # Check to see what type of execution this function is.
-            for ref in schedule.dag.functions:
-                if ref.name == fname:
-                    fref = ref
-                    break
+            fref = requests.plans[key].functions[fname]
 
             # Compile a list of all the trigger sets for which we have
             # enough triggers.
             trigger_sets = []
             schedules = []
+            ready_keys = []
             for key in trigger_keys:
                 if (len(received_triggers[key]) == len(schedule.triggers)) or \
                         fref.type == MULTIEXEC:
@@ -362,34 +742,17 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
                     trigger_sets.append(triggers)
                     schedule = queue[fname][key[0]]
                     schedules.append(schedule)
-
+                    ready_keys.append(key)
 
             # Pass all of the trigger_sets into exec_dag_function at once.
             # We also include the batching variaible to make sure we know
             # whether to pass lists into the fn or not.
             if len(trigger_sets) > 0:
-                successes = exec_dag_function(pusher_cache, client,
-                                              states_client, trigger_sets,
-                                              function_cache[fname],
-                                              schedules, user_library,
-                                              dag_runtimes, cache,
-                                              schedulers, batching, arbiter)
-                user_library.close()
-                del received_triggers[key]
-
-                for key, success in zip(trigger_keys, successes):
-                    if success:
-                        del queue[fname][key[0]] # key[0] is trigger.id.
-
-                        fend = time.time()
-                        fstart = receive_times[key]
-
-                        average_time = (fend - work_start) / len(trigger_keys)
-
-                        runtimes[fname].append(average_time)
-                        exec_counts[fname] += 1
+                for key in ready_keys:
+                    del received_triggers[key]
 
-                        finished_executions[(schedule.id, fname)] = time.time()
+                run_dag_function(fname, ready_keys, trigger_sets, schedules,
+                                 work_start)
 
             elapsed = time.time() - work_start
             event_occupancy['dag_exec'] += elapsed
@@ -405,24 +768,25 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
 
             status.ClearField('functions')
             status.running = False
-            utils.push_status(schedulers, pusher_cache, status)
+            reporter.push()
 
             departing = True
 
         # periodically report function occupancy
         report_end = time.time()
         if report_end - report_start > REPORT_THRESH:
-            if len(cache) > 100:
-                extra_keys = list(cache.keys())[:len(cache) - 100]
-                for key in extra_keys:
-                    del cache[key]
-
             utilization = total_occupancy / (report_end - report_start)
-            status.utilization = utilization
 
-            # Periodically report my status to schedulers with the utilization
-            # set.
-            utils.push_status(schedulers, pusher_cache, status)
+            # Tell the schedulers how long each of our functions took to run,
+            # so they can size the functions' replica counts.
+            status.mean_runtimes.clear()
+            for fname in runtimes:
+                if exec_counts[fname] > 0:
+                    status.mean_runtimes[fname] = runtimes[fname].mean()
+
+            # Periodically report my status to schedulers with the smoothed
+            # utilization set.
+            reporter.report_utilization(utilization)
 
             logging.info('Total thread occupancy: %.6f' % (utilization))
 
@@ -437,7 +801,15 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
                     fstats = stats.functions.add()
                     fstats.name = fname
                     fstats.call_count = exec_counts[fname]
-                    fstats.runtime.extend(runtimes[fname])
+                    runtimes[fname].to_proto(fstats.runtime_histogram)
+
+                    # Older management servers still read the raw runtimes,
+                    # so we send them a bounded sample.
+                    fstats.runtime.extend(
+                        runtimes[fname].values(legacy_samples))
+
+                if hedger:
+                    hedger.update(fname, runtimes[fname])
 
                 runtimes[fname].clear()
                 exec_counts[fname] = 0
@@ -446,10 +818,22 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
                 dstats = stats.dags.add()
                 dstats.name = dname
 
-                dstats.runtimes.extend(dag_runtimes[dname])
+                dag_runtimes[dname].to_proto(dstats.runtime_histogram)
+                dstats.runtimes.extend(
+                    dag_runtimes[dname].values(legacy_samples))
 
                 dag_runtimes[dname].clear()
 
+            cache.report(stats.cache)
+            requests.report(stats)
+
+            if startup_time is not None:
+                stats.startup_time = startup_time
+                startup_time = None
+
+            if object_store:
+                object_store.sweep()
+
             # If we are running in cluster mode, mgmt_ip will be set, and we
             # will report our status and statistics to it. Otherwise, we will
             # write to the local conf file
@@ -463,34 +847,19 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
             else:
                 logging.info(stats)
 
-            status.ClearField('utilization')
             report_start = time.time()
             total_occupancy = 0.0
 
             # Periodically clear any old functions we have cached that we are
             # no longer accepting requests for.
-            del_list = []
-            for fname in queue:
-                if len(queue[fname]) == 0 and fname not in status.functions:
-                    del_list.append(fname)
-                    del function_cache[fname]
-                    del runtimes[fname]
-                    del exec_counts[fname]
-
-            for fname in del_list:
-                del queue[fname]
-
-            del_list = []
-            for tid in finished_executions:
-                if (time.time() - finished_executions[tid]) > 10:
-                    del_list.append(tid)
-
-            for tid in del_list:
-                del finished_executions[tid]
+            for fname in set(queue) | set(function_cache):
+                if fname not in status.functions:
+                    release_function(fname)
 
             # If we are departing and have cleared our queues, let the
             # management server know, and exit the process.
-            if departing and len(queue) == 0:
+            if departing and len(queue) == 0 and (not pool or
+                                                  pool.in_flight == 0):
                 sckt = pusher_cache.get(utils.get_depart_done_addr(mgmt_ip))
                 sckt.send_string(ip)
 
@@ -499,14 +868,49 @@ def executor(ip, mgmt_ip, user_states, schedulers, thread_id):
                 sys.exit(1)
 
 
+def _complete_dag_execution(fname, keys, successes, work_start, requests,
+                            runtimes, exec_counts):
+    for key, success in zip(keys, successes):
+        requests.finish(key, success)
+
+        if success:
+            fend = time.time()
+            average_time = (fend - work_start) / len(keys)
+
+            runtimes[fname].add(average_time)
+            exec_counts[fname] += 1
+
+
+def run(conf, thread_id=None, launch_time=None):
+    '''
+    Starts an executor thread with the settings in conf. thread_id overrides
+    the configured thread ID.
+    '''
+    exec_conf = conf['executor']
+    if thread_id is None:
+        thread_id = int(exec_conf['thread_id'])
+
+    executor(conf['ip'], conf['mgmt_ip'], conf['user_states'], exec_conf['scheduler_ips'],
+             thread_id, int(exec_conf.get('worker_threads', 0)),
+             int(exec_conf.get('cache_capacity', DEFAULT_CACHE_CAPACITY)),
+             exec_conf.get('cache_policy', DEFAULT_CACHE_POLICY),
+             float(exec_conf.get('cache_ttl', DEFAULT_CACHE_TTL)),
+             bool(exec_conf.get('prefetch_references', True)),
+             exec_conf.get('object_store_dir'),
+             int(exec_conf.get('object_store_threshold',
+                               DEFAULT_SIZE_THRESHOLD)),
+             float(exec_conf.get('request_timeout', DEFAULT_REQUEST_TIMEOUT)),
+             bool(exec_conf.get('warm_unpin', True)),
+             int(exec_conf.get('legacy_stats_samples',
+                               DEFAULT_LEGACY_SAMPLES)),
+             float(exec_conf.get('status_interval', STATUS_PUSH_INTERVAL)),
+             launch_time)
+
+
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         conf_file = sys.argv[1]
     else:
         conf_file = 'conf/cloudburst-config.yml'
 
-    conf = sutils.load_conf(conf_file)
-    exec_conf = conf['executor']
-
-    executor(conf['ip'], conf['mgmt_ip'], conf['user_states'], exec_conf['scheduler_ips'],
-             int(exec_conf['thread_id']))
+    run(sutils.load_conf(conf_file))
@@ -0,0 +1,121 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from collections import deque
+import logging
+import time
+
+from anna.lattices import LWWPairLattice
+
+import cloudburst.server.utils as sutils
+from cloudburst.shared.backoff import wait_for
+from cloudburst.shared.proto.cloudburst_pb2 import Value
+from cloudburst.shared.serializer import Serializer
+
+serializer = Serializer()
+
+# How many seconds a spilled result stays readable. Consumers that have not
+# read it by then have given up on their request anyway.
+DEFAULT_SPILL_TTL = 60
+
+
+class SpilledResult():
+    '''
+    Stands in for a DAG function's result in a trigger sent to an executor on
+    another node, when the result is too large to send inline. The result
+    itself was written to the KVS under key, for this trigger's consumers
+    only.
+    '''
+
+    def __init__(self, key):
+        self.key = key
+
+
+class SpilledResults():
+    '''
+    The results this executor thread spilled to the KVS. The KVS cannot
+    delete keys, so once a result's consumers have had ttl seconds to read
+    it, we overwrite it with an empty value to free its space. A result may
+    have several consumers, and a hedged consumer may read it twice, so none
+    of them can free it on its own.
+
+    Worker threads call put; the poll loop calls expire.
+    '''
+
+    def __init__(self, ttl=DEFAULT_SPILL_TTL):
+        self.ttl = ttl
+
+        # The key, timestamp and expiry time of each result we spilled, in
+        # the order in which we spilled them. Appends and pops are atomic, so
+        # the worker threads and the poll loop can share it without a lock.
+        self.spilled = deque()
+
+    def put(self, kvs, key, value, now=None):
+        '''
+        Writes a serialized Value to the KVS under key. Returns the handle to
+        send to its consumers, or None if the write failed, in which case the
+        caller should send the value inline after all.
+        '''
+        now = now if now else time.time()
+        timestamp = sutils.generate_timestamp(0)
+
+        result = kvs.put(key, LWWPairLattice(timestamp,
+                                             value.SerializeToString()))
+        if isinstance(result, dict):
+            result = result.get(key, False)
+
+        if not result:
+            logging.error('Failed to spill result %s to the KVS.' % (key))
+            return None
+
+        self.spilled.append((key, timestamp, now + self.ttl))
+        return SpilledResult(key)
+
+    def expire(self, kvs, now=None):
+        '''
+        Frees the results whose consumers have had ttl seconds to read them.
+        '''
+        now = now if now else time.time()
+
+        keys = []
+        lattices = []
+        while len(self.spilled) > 0 and self.spilled[0][2] <= now:
+            key, timestamp, _ = self.spilled.popleft()
+
+            # The empty value must win over the result no matter how the
+            # clocks of the KVS replicas compare, so we order it right after.
+            keys.append(key)
+            lattices.append(LWWPairLattice(timestamp + 1, b''))
+
+        if len(keys) > 0:
+            kvs.put(keys, lattices)
+
+
+def load_spilled_result(kvs, handle):
+    '''
+    Reads a spilled result from the KVS, waiting (with backoff) until the
+    producer's write is visible. The result is read by this consumer only
+    once, so it does not go through the executor's reference cache.
+    '''
+    def fetch():
+        return kvs.get(handle.key)[handle.key]
+
+    payload = wait_for(fetch).reveal()
+    if len(payload) == 0:
+        raise ValueError('Spilled result %s has already expired.' %
+                         (handle.key))
+
+    value = Value()
+    value.ParseFromString(payload)
+    return serializer.load(value)
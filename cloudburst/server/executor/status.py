@@ -0,0 +1,158 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+
+from cloudburst.server.executor import utils
+import cloudburst.server.utils as sutils
+from cloudburst.shared.proto.internal_pb2 import ExecutorLoad
+
+# How often (in seconds) we resend an unchanged status, so that schedulers
+# which missed an update or started after us still learn about this thread.
+STATUS_PUSH_INTERVAL = 1.0
+
+# How much weight the most recent utilization sample gets in the reported
+# utilization.
+UTILIZATION_EWMA_WEIGHT = 0.5
+
+# The least time (in seconds) between two load updates, so that an executor
+# churning through small requests does not flood the schedulers.
+LOAD_PUSH_INTERVAL = 0.005
+
+
+class StatusReporter():
+    '''
+    Sends an executor thread's ThreadStatus to the schedulers. Status is only
+    sent when its contents change, plus a resend of the cached serialized
+    status every interval seconds, which is skipped while a load update is
+    waiting to go out. Function invocations do not change the status, so they
+    no longer trigger pushes.
+
+    The thread's load -- its queue depth and in-flight requests -- changes
+    with every request, so it is sent separately as a small ExecutorLoad
+    message, whenever it changes but at most every load_interval seconds.
+    '''
+
+    def __init__(self, schedulers, pusher_cache, status,
+                 interval=STATUS_PUSH_INTERVAL,
+                 load_interval=LOAD_PUSH_INTERVAL):
+        self.schedulers = schedulers
+        self.pusher_cache = pusher_cache
+        self.status = status
+        self.interval = interval
+        self.load_interval = load_interval
+
+        self.serialized = None
+        self.last_push = 0.0
+
+        self.utilization = None
+
+        self.load = ExecutorLoad()
+        self.load.ip = status.ip
+        self.load.tid = status.tid
+
+        # The last load we sent, and whether the current one differs from it.
+        self.sent_load = None
+        self.last_load_push = 0.0
+        self.load_pending = False
+
+    def push(self):
+        '''
+        Called after the status is modified: sends it to the schedulers if its
+        contents are different from what we last sent.
+        '''
+        msg = self.status.SerializeToString()
+        if msg != self.serialized:
+            self.serialized = msg
+            self._send()
+
+    def tick(self, now=None):
+        '''
+        Called on every iteration of the poll loop: sends a load update that
+        was held back, and otherwise resends the cached status if we have not
+        sent it in the last interval.
+        '''
+        if now is None:
+            now = time.time()
+
+        # The resend waits for a tick on which no load update is due, so the
+        # two are not sent together.
+        pending = self.load_pending
+        if pending and now - self.last_load_push >= self.load_interval:
+            self._send_load(now)
+
+        if self.serialized is None:
+            self.push()
+        elif not pending and now - self.last_push >= self.interval:
+            self._send()
+
+    def report_load(self, queue_depth, in_flight, now=None):
+        '''
+        Records this thread's current load, and sends it to the schedulers if
+        it changed and we have not sent a load update too recently.
+        '''
+        if now is None:
+            now = time.time()
+
+        self.load.queue_depth = queue_depth
+        self.load.in_flight = in_flight
+        self.load_pending = (queue_depth, in_flight) != self.sent_load
+
+        if self.load_pending and \
+                now - self.last_load_push >= self.load_interval:
+            self._send_load(now)
+
+    def load_deadline(self):
+        '''
+        The time by which tick() must be called to send a load update that
+        was held back, or None if there is none.
+        '''
+        if not self.load_pending:
+            return None
+
+        return self.last_load_push + self.load_interval
+
+    def report_utilization(self, sample):
+        '''
+        Folds the thread utilization measured over the last reporting period
+        into a moving average, which is what the schedulers see.
+        '''
+        if self.utilization is None:
+            self.utilization = sample
+        else:
+            self.utilization = (UTILIZATION_EWMA_WEIGHT * sample +
+                                (1 - UTILIZATION_EWMA_WEIGHT) *
+                                self.utilization)
+
+        self.status.utilization = self.utilization
+        self.push()
+
+        return self.utilization
+
+    def _send(self):
+        for sched in self.schedulers:
+            sckt = self.pusher_cache.get(utils.get_status_address(sched))
+            sckt.send(self.serialized)
+
+        self.last_push = time.time()
+
+    def _send_load(self, now):
+        msg = self.load.SerializeToString()
+        for sched in self.schedulers:
+            sckt = self.pusher_cache.get(sutils.get_load_address(sched))
+            sckt.send(msg)
+
+        self.sent_load = (self.load.queue_depth, self.load.in_flight)
+        self.last_load_push = now
+        self.load_pending = False
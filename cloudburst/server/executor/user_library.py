@@ -21,6 +21,18 @@ from cloudburst.shared.utils import DEFAULT_CLIENT_NAME
 serializer = Serializer()
 
 
+class UndeliverableMessage():
+    '''
+    Returned to the sender of a message, through its own inbox, when the
+    executor thread the message was sent to runs its functions on worker
+    threads and so cannot deliver it (see KvsUserLibrary.recv). message is
+    the original message.
+    '''
+
+    def __init__(self, message):
+        self.message = message
+
+
 class AbstractCloudburstUserLibrary:
     # Stores a lattice value at ref.
     def put(self, ref, ltc):
@@ -132,10 +144,17 @@ class KvsUserLibrary(AbstractCloudburstUserLibrary):
     # ip: Executor IP.
     # tid: Executor thread ID.
     # client: The kvs client, used for interfacing with the kvs.
-    def __init__(self, context, pusher_cache, ip, tid, client):
+    # bind_inbox: Whether this library owns the executor's message inbox. Only
+    # one library per executor thread can bind it, so functions that run on
+    # worker threads cannot receive messages (see recv).
+    # cache: The executor's reference cache, if any; keys written through this
+    # library are invalidated in it.
+    def __init__(self, context, pusher_cache, ip, tid, client,
+                 bind_inbox=True, cache=None):
         self.executor_ip = ip
         self.executor_tid = tid
         self.client = client
+        self.cache = cache
 
         self.pusher_cache = pusher_cache
 
@@ -143,11 +162,17 @@ class KvsUserLibrary(AbstractCloudburstUserLibrary):
                                                     self.executor_tid)
 
         # Socket on which inbound messages, if any, will be received.
-        self.recv_inbox_socket = context.socket(zmq.PULL)
-        self.recv_inbox_socket.bind(self.address)
+        self.recv_inbox_socket = None
+        if bind_inbox:
+            self.recv_inbox_socket = context.socket(zmq.PULL)
+            self.recv_inbox_socket.bind(self.address)
 
     def put(self, ref, value, client_name=DEFAULT_CLIENT_NAME):
-        return self.client.put(ref, serializer.dump_lattice(value), client_name)
+        result = self.client.put(ref, serializer.dump_lattice(value), client_name)
+        if self.cache is not None:
+            self.cache.invalidate(ref)
+
+        return result
 
     def get(self, ref, deserialize=True, client_name=DEFAULT_CLIENT_NAME, raw=False):
         refs = ref if type(ref) == list else [ref]
@@ -186,9 +211,18 @@ class KvsUserLibrary(AbstractCloudburstUserLibrary):
         socket.send_pyobj((sender, bytestr))
 
     # We see if any messages have been sent to this thread. We return an empty
-    # list if there are none.
+    # list if there are none. Messages are addressed to an executor thread
+    # rather than to a request, so when several requests run at once on worker
+    # threads, there is no telling which of them a message is for; we refuse
+    # to receive rather than silently return nothing.
     def recv(self):
+        if self.recv_inbox_socket is None:
+            raise RuntimeError('Functions that receive messages cannot run ' +
+                               'on executor worker threads; set ' +
+                               'worker_threads to 0 to use recv.')
+
         res = []
+
         while True:
             try:
                 # We pass in zmq.NOBLOCK here so that we only check for
@@ -206,10 +240,24 @@ class KvsUserLibrary(AbstractCloudburstUserLibrary):
 
         return res
 
+    # Returns every message waiting in this thread's inbox to its sender as
+    # an UndeliverableMessage, for executor threads whose functions cannot
+    # receive messages. Messages that were themselves returned are dropped,
+    # so that two such threads never bounce a message back and forth. Returns
+    # the number of messages taken off of the inbox.
+    def reject(self):
+        msgs = self.recv()
+        for sender, bytestr in msgs:
+            if not isinstance(bytestr, UndeliverableMessage):
+                self.send(sender, UndeliverableMessage(bytestr))
+
+        return len(msgs)
+
     def close(self):
         # Closes the context for this request by clearing any outstanding
         # messages.
-        self.recv()
+        if self.recv_inbox_socket is not None:
+            self.recv()
 
     def execute_js_fun(self, name, *args, client_name='shredder'):
         try:
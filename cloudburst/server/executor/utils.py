@@ -87,15 +87,6 @@ def retrieve_function(name, kvs, user_library, consistency=NORMAL):
     return result
 
 
-def push_status(schedulers, pusher_cache, status):
-    msg = status.SerializeToString()
-
-    # tell all the schedulers your new status
-    for sched in schedulers:
-        sckt = pusher_cache.get(get_status_address(sched))
-        sckt.send(msg)
-
-
 def get_status_address(ip):
     return 'tcp://' + ip + ':' + str(sutils.STATUS_PORT)
 
@@ -0,0 +1,181 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import logging
+import queue
+import threading
+
+from anna.client import AnnaTcpClient
+from anna.zmq_util import SocketCache
+import zmq
+
+from cloudburst.server.executor.user_library import KvsUserLibrary
+from cloudburst.server.executor.utils import get_states_kvs
+from cloudburst.shared.anna_ipc_client import AnnaIpcClient
+
+# Worker threads need their own KVS response sockets, so we give each of them
+# an ID that cannot collide with the executor threads' IDs.
+WORKER_ID_OFFSET = 100
+WORKER_ID_STRIDE = 32
+
+# Each executor thread's last worker ID is its prefetcher's (see prefetch.py),
+# so a pool can have at most this many workers.
+MAX_WORKERS = WORKER_ID_STRIDE - 1
+
+COMPLETION_ADDR_TEMPLATE = 'inproc://worker_completions_%d'
+
+
+def get_worker_id(thread_id, index):
+    return WORKER_ID_OFFSET + thread_id * WORKER_ID_STRIDE + index
+
+
+def create_kvs_clients(context, worker_id, user_states, local):
+    '''
+    Creates a fresh Anna client and user states client for a thread other than
+    the executor's poll loop.
+    '''
+    if local:
+        client = AnnaTcpClient('127.0.0.1', '127.0.0.1', local=True,
+                               offset=worker_id)
+    else:
+        client = AnnaIpcClient(worker_id, context)
+
+    return client, get_states_kvs(client, user_states)
+
+
+class WorkerResources():
+    '''
+    The per-thread state a worker needs to run a function: ZMQ sockets and KVS
+    clients are not thread-safe, so none of these are shared with the poll
+    loop or with other workers.
+    '''
+
+    def __init__(self, pusher_cache, client, states_client, user_library):
+        self.pusher_cache = pusher_cache
+        self.client = client
+        self.states_client = states_client
+        self.user_library = user_library
+
+
+class ExecutorWorkerPool():
+    '''
+    A bounded pool of threads that run function invocations off of the
+    executor's poll loop, so that a function blocked on KVS I/O does not stop
+    the executor from accepting schedules, triggers, and pin messages.
+
+    Work is submitted from the poll loop along with a completion callback. The
+    callback is always invoked back on the poll loop (from drain()), which is
+    the only place that executor metadata is modified. Every completion also
+    sends an empty message to an inproc socket, which the poll loop registers
+    with its poller so it wakes up as soon as a worker finishes.
+
+    Functions that run on workers can send messages but not receive them: the
+    thread's inbox belongs to the poll loop, and a message names an executor
+    thread, not one of the requests running on it. Their user library raises
+    an error from recv, and the poll loop drops the messages it receives.
+    '''
+
+    def __init__(self, num_workers, context, ip, thread_id, user_states,
+                 local, cache):
+        if num_workers > MAX_WORKERS:
+            raise ValueError('An executor thread can have at most %d worker '
+                             'threads, not %d.' % (MAX_WORKERS, num_workers))
+
+        self.num_workers = num_workers
+        self.context = context
+        self.ip = ip
+        self.thread_id = thread_id
+        self.user_states = user_states
+        self.local = local
+        self.cache = cache
+
+        self.pool = ThreadPoolExecutor(max_workers=num_workers)
+        self.completions = queue.Queue()
+        self.in_flight = 0
+
+        self.completion_address = COMPLETION_ADDR_TEMPLATE % thread_id
+        self.completion_socket = context.socket(zmq.PULL)
+        self.completion_socket.bind(self.completion_address)
+
+        self.resources = threading.local()
+        self.worker_ids = itertools.count()
+
+    def full(self):
+        return self.in_flight >= self.num_workers
+
+    def submit(self, work, done):
+        '''
+        Runs work(resources) on a worker thread, and calls done(result) on the
+        poll loop once it finishes. If work raises an exception, it is logged
+        and done is called with None.
+        '''
+        self.in_flight += 1
+        self.pool.submit(self._run, work, done)
+
+    def drain(self):
+        # Clear the wake-up messages; the completion queue is the source of
+        # truth for what has finished.
+        while True:
+            try:
+                self.completion_socket.recv(zmq.DONTWAIT)
+            except zmq.ZMQError as e:
+                if e.errno == zmq.EAGAIN:
+                    break
+                else:
+                    raise e
+
+        while True:
+            try:
+                done, result = self.completions.get_nowait()
+            except queue.Empty:
+                break
+
+            self.in_flight -= 1
+            done(result)
+
+    def _run(self, work, done):
+        resources = self._get_resources()
+
+        try:
+            result = work(resources)
+        except Exception as e:
+            logging.exception('Unexpected error %s on worker thread.' %
+                              (str(e)))
+            result = None
+
+        self.completions.put((done, result))
+        resources.pusher_cache.get(self.completion_address).send(b'')
+
+    def _get_resources(self):
+        if not hasattr(self.resources, 'value'):
+            worker_id = get_worker_id(self.thread_id, next(self.worker_ids))
+            pusher_cache = SocketCache(self.context, zmq.PUSH)
+            client, states_client = create_kvs_clients(self.context,
+                                                       worker_id,
+                                                       self.user_states,
+                                                       self.local)
+
+            # Workers do not own a message inbox, so this library's recv
+            # raises an error (see KvsUserLibrary.recv).
+            user_library = KvsUserLibrary(self.context, pusher_cache, self.ip,
+                                          self.thread_id, states_client,
+                                          bind_inbox=False, cache=self.cache)
+
+            self.resources.value = WorkerResources(pusher_cache, client,
+                                                   states_client,
+                                                   user_library)
+
+        return self.resources.value
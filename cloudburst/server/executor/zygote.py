@@ -0,0 +1,122 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import importlib
+import logging
+import os
+import sys
+import time
+
+# Importing the executor loads everything an executor thread needs -- zmq,
+# anna, and the serializer with numpy, pandas, pyarrow and cloudpickle --
+# once, in the zygote, so forked executors start without paying for it.
+from cloudburst.server import utils as sutils
+from cloudburst.server.executor import server
+
+
+class Zygote():
+    '''
+    A fork server for executor threads. The zygote imports the executor's
+    dependencies (and any modules the functions we expect to pin will need)
+    once, and then forks executor threads from itself. Because a forked child
+    shares the zygote's already-imported modules, it only has to create its
+    sockets and clients before it is ready for work.
+
+    The zygote replaces any executor that exits with code 0 (which is how an
+    executor restarts after an unpin when warm_unpin is off), so restarts are
+    also cheap. An executor that exits with any other code, e.g. after
+    departing, is not replaced. No ZMQ context or thread may be created in
+    the zygote itself, since neither survives a fork.
+    '''
+
+    def __init__(self, spawn, preload_modules=[]):
+        # Called in each forked child with its thread ID and the time at which
+        # it was forked.
+        self.spawn = spawn
+
+        # A map from the PID of each executor we forked to its thread ID.
+        self.children = {}
+
+        for module in preload_modules:
+            logging.info('Preloading module %s.' % (module))
+            importlib.import_module(module)
+
+    def fork(self, thread_id):
+        launch_time = time.time()
+
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.spawn(thread_id, launch_time)
+            except SystemExit as e:
+                code = e.code if type(e.code) == int else 0
+            except BaseException:
+                logging.exception('Executor thread %d failed.' % (thread_id))
+                code = 1
+
+            # Skip the zygote's exit handlers, which belong to the parent.
+            os._exit(code)
+
+        logging.info('Forked executor thread %d (pid %d).' % (thread_id, pid))
+        self.children[pid] = thread_id
+        return pid
+
+    def serve(self, thread_ids):
+        '''
+        Forks an executor for each thread ID and keeps replacing the ones that
+        restart, until all of them have exited for good. Returns the exit code
+        of the last executor to exit.
+        '''
+        for thread_id in thread_ids:
+            self.fork(thread_id)
+
+        code = 0
+        while len(self.children) > 0:
+            pid, status = os.wait()
+            thread_id = self.children.pop(pid, None)
+            if thread_id is None:
+                continue
+
+            if os.WIFEXITED(status):
+                code = os.WEXITSTATUS(status)
+            else:
+                code = 1
+
+            if code == 0:
+                self.fork(thread_id)
+            else:
+                logging.info('Executor thread %d exited with code %d.' %
+                             (thread_id, code))
+
+        return code
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        conf_file = sys.argv[1]
+    else:
+        conf_file = 'conf/cloudburst-config.yml'
+
+    logging.basicConfig(filename='log_executor.txt', level=logging.INFO,
+                        format='%(asctime)s %(message)s')
+
+    conf = sutils.load_conf(conf_file)
+    exec_conf = conf['executor']
+
+    def spawn(thread_id, launch_time):
+        server.run(conf, thread_id, launch_time)
+
+    zygote = Zygote(spawn, exec_conf.get('preload_modules', []))
+    sys.exit(zygote.serve([int(exec_conf['thread_id'])]))
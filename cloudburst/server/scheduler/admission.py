@@ -0,0 +1,136 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import threading
+import time
+
+
+class TokenBucket():
+    '''
+    Admits up to rate requests per second on average, and bursts of up to
+    burst requests at once.
+    '''
+
+    def __init__(self, rate, burst, now=None):
+        if now is None:
+            now = time.time()
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = now
+
+        # The scheduler's DAG call workers share each DAG's bucket.
+        self.lock = threading.Lock()
+
+    def acquire(self, now=None):
+        '''
+        Takes a token and returns True if one is available; otherwise returns
+        False.
+        '''
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens +
+                              max(now - self.last, 0) * self.rate)
+            self.last = now
+
+            if self.tokens < 1:
+                return False
+
+            self.tokens -= 1
+            return True
+
+
+class AdmissionController():
+    '''
+    Decides whether the scheduler accepts a DAG call or sheds it, so that
+    clients back off instead of piling work onto executors that cannot keep
+    up. A call is shed if:
+      * its DAG has a rate limit and has used up its token bucket,
+      * the executors' outstanding requests (as reported in their load
+        updates) have reached max_in_flight in total, or
+      * every executor of one of the DAG's functions has at least
+        max_queue_depth outstanding requests.
+    Each of these is disabled unless it is configured.
+    '''
+
+    def __init__(self, conf=None):
+        conf = conf if conf else {}
+
+        # A map from DAG names to their rate limit, and the limit for DAGs
+        # that are not listed.
+        self.dag_limits = conf.get('dags', {})
+        self.default_limit = conf.get('default', None)
+
+        self.max_in_flight = conf.get('max_in_flight', None)
+        self.max_queue_depth = conf.get('max_queue_depth', None)
+
+        # A map from each rate-limited DAG to its token bucket.
+        self.buckets = {}
+
+        # The number of calls of each DAG we shed since the last report.
+        self.shed = {}
+
+    def admit(self, dag, policy, now=None):
+        '''
+        Returns True if a call of dag should be scheduled, and False if it
+        should be shed.
+        '''
+        if self._admit(dag, policy, now):
+            return True
+
+        self.shed[dag.name] = self.shed.get(dag.name, 0) + 1
+        return False
+
+    def report(self):
+        '''
+        Logs and resets the number of calls shed for each DAG.
+        '''
+        shed, self.shed = self.shed, {}
+        for dname in shed:
+            logging.info('Shed %d calls of DAG %s.' % (shed[dname], dname))
+
+        return shed
+
+    def _admit(self, dag, policy, now):
+        if self.max_in_flight is not None and \
+                policy.total_load() >= self.max_in_flight:
+            return False
+
+        if self.max_queue_depth is not None:
+            for fref in dag.functions:
+                if policy.saturated(fref.name, self.max_queue_depth):
+                    return False
+
+        bucket = self._get_bucket(dag.name, now)
+        if bucket is not None and not bucket.acquire(now):
+            return False
+
+        return True
+
+    def _get_bucket(self, dname, now):
+        bucket = self.buckets.get(dname)
+        if bucket is not None:
+            return bucket
+
+        limit = self.dag_limits.get(dname, self.default_limit)
+        if limit is None:
+            return None
+
+        rate = limit['rate']
+        bucket = TokenBucket(rate, limit.get('burst', rate), now)
+        return self.buckets.setdefault(dname, bucket)
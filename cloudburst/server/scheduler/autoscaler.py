@@ -0,0 +1,234 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import math
+import threading
+
+# The fraction of each replica's time we aim to keep busy.
+DEFAULT_UTILIZATION_TARGET = 0.7
+
+# How many reporting periods in a row a function must need fewer replicas
+# than it has before we unpin one.
+DEFAULT_SCALE_DOWN_PERIODS = 3
+
+# How many replicas of each function are pinned when its DAG is created (see
+# create_dag).
+DEFAULT_BASE_REPLICAS = 1
+
+# The prefix of the names under which the policy engine holds the replicas we
+# are pinning until we commit them.
+REPLICA_DAG_PREFIX = 'replicas/'
+
+
+def needed_replicas(arrival_rate, service_time, utilization_target,
+                    max_replicas=None):
+    '''
+    The number of replicas a function needs to serve arrival_rate requests
+    per second, each of which runs for service_time seconds, without any
+    replica being busy for more than utilization_target of the time. By
+    Little's law, arrival_rate * service_time is the average number of
+    requests in service at once.
+    '''
+    replicas = max(math.ceil(arrival_rate * service_time /
+                             utilization_target), 1)
+
+    if max_replicas is not None:
+        replicas = min(replicas, max_replicas)
+
+    return replicas
+
+
+class ReplicaController():
+    '''
+    Sizes the number of replicas of each function to its load. At the end of
+    each reporting period, the scheduler tells the controller how many calls
+    of each function it received, and the executors' statuses tell it how
+    long each function takes to run. From these, it works out how many
+    replicas each function needs (see needed_replicas).
+
+    A function's missing replicas are pinned as soon as they are needed.
+    Replicas are only unpinned once the function has needed fewer than it
+    has for scale_down_periods periods in a row, and then one per period, so
+    that a short lull does not unpin replicas we are about to need again. We
+    only ever unpin replicas the controller pinned itself, never the ones
+    pinned when a DAG was created or by another scheduler.
+
+    Each scheduler only sees the calls it receives, so it only counts its own
+    replicas and the function's base replicas (the ones pinned with its DAG)
+    towards what those calls need, and ignores the replicas other schedulers
+    pinned for theirs. Together, the schedulers' replicas then add up to about
+    what all of their calls need.
+
+    The main thread records statuses and calls; pinning and unpinning happen
+    in scale, on the thread that owns the policy engine's pin sockets.
+    '''
+
+    def __init__(self, policy, conf=None):
+        conf = conf if conf else {}
+
+        self.policy = policy
+
+        self.utilization_target = conf.get('utilization_target',
+                                           DEFAULT_UTILIZATION_TARGET)
+        self.scale_down_periods = conf.get('scale_down_periods',
+                                           DEFAULT_SCALE_DOWN_PERIODS)
+        self.max_replicas = conf.get('max_replicas', None)
+        self.base_replicas = conf.get('base_replicas', DEFAULT_BASE_REPLICAS)
+
+        # Guards runtimes and targets, which the main thread writes.
+        self.lock = threading.Lock()
+
+        # The mean runtime of each function, as last reported by each
+        # executor thread.
+        self.runtimes = {}
+
+        # The number of replicas each function needs, as of the most recent
+        # period that scale has not acted on yet.
+        self.targets = None
+
+        # The executor threads on which we pinned replicas of each function,
+        # in the order in which we pinned them.
+        self.replicas = {}
+
+        # How many periods in a row each function has needed fewer replicas
+        # than it has.
+        self.idle_periods = {}
+
+    def process_status(self, status):
+        key = (status.ip, status.tid)
+
+        with self.lock:
+            if status.running:
+                self.runtimes[key] = dict(status.mean_runtimes)
+            else:
+                self.runtimes.pop(key, None)
+
+    def record_calls(self, call_counts, elapsed):
+        '''
+        Called at the end of each reporting period, which lasted elapsed
+        seconds, with the number of calls of each function the scheduler
+        received during it.
+        '''
+        if elapsed <= 0:
+            return
+
+        with self.lock:
+            service_times = self._get_service_times()
+
+            targets = {}
+            for fname in call_counts:
+                rate = call_counts[fname] / elapsed
+
+                # An idle function only needs its one replica, but otherwise
+                # we can only size it once we know how long it takes to run.
+                if rate == 0:
+                    targets[fname] = 1
+                elif fname in service_times:
+                    targets[fname] = needed_replicas(rate,
+                                                     service_times[fname],
+                                                     self.utilization_target,
+                                                     self.max_replicas)
+
+            self.targets = targets
+
+    def scale(self, function_refs):
+        '''
+        Pins and unpins replicas to move each function towards the number of
+        replicas it needed in the last period. function_refs maps the name of
+        each function in a registered DAG to its Dag.FunctionReference. Does
+        nothing if no period has ended since the last call.
+        '''
+        with self.lock:
+            targets, self.targets = self.targets, None
+
+        if targets is None:
+            return
+
+        for fname, target in targets.items():
+            if fname not in function_refs:
+                continue
+
+            locations = list(self.policy.function_locations.get(fname, []))
+
+            # Forget replicas that are gone, e.g. because their executor left
+            # or their DAG was deleted.
+            ours = [executor for executor in self.replicas.get(fname, []) if
+                    executor in locations]
+            self.replicas[fname] = ours
+
+            # The replicas sized for this scheduler's calls: the function's
+            # base replicas, as long as they are still around, and ours.
+            base = min(len(locations) - len(ours), self.base_replicas)
+            current = base + len(ours)
+
+            if target > current:
+                self.idle_periods.pop(fname, None)
+                self._add_replicas(function_refs[fname], target - current,
+                                   locations)
+            elif target < current and len(ours) > 0:
+                idle = self.idle_periods.get(fname, 0) + 1
+
+                if idle >= self.scale_down_periods:
+                    executor = ours.pop()
+                    logging.info('Unpinning replica of %s from %s:%d.' %
+                                 ((fname,) + executor))
+                    self.policy.unpin_function(fname, executor)
+                    idle = 0
+
+                self.idle_periods[fname] = idle
+            else:
+                self.idle_periods.pop(fname, None)
+
+    def _add_replicas(self, function_ref, count, locations):
+        fname = function_ref.name
+
+        # Don't ask for more replicas than there are executors to put them on,
+        # since the policy only pins them if it can pin all of them.
+        if function_ref.gpu:
+            available = set(self.policy.unpinned_gpu_executors)
+        else:
+            available = set(self.policy.unpinned_cpu_executors)
+
+        count = min(count, len(available - set(locations)))
+        if count == 0:
+            logging.info('No executors left for more replicas of %s.' %
+                         (fname))
+            return
+
+        logging.info('Pinning %d more replicas of %s.' % (count, fname))
+
+        dag_name = REPLICA_DAG_PREFIX + fname
+        self.policy.pin_functions(dag_name, [function_ref] * count, [],
+                                  exclude=locations)
+
+        # Keep whatever we managed to pin, even if we ran out of executors
+        # partway through.
+        if dag_name in self.policy.pending_dags:
+            pinned = [executor for _, executor in
+                      self.policy.pending_dags[dag_name]]
+            self.policy.commit_dag(dag_name)
+
+            self.replicas.setdefault(fname, []).extend(pinned)
+
+    def _get_service_times(self):
+        # The mean of the runtimes reported by the executors of each function.
+        totals = {}
+        for runtimes in self.runtimes.values():
+            for fname in runtimes:
+                total, count = totals.get(fname, (0.0, 0))
+                totals[fname] = (total + runtimes[fname], count + 1)
+
+        return {fname: total / count for fname, (total, count) in
+                totals.items()}
@@ -12,6 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import logging
 import time
 import uuid
 
@@ -22,12 +23,14 @@ from cloudburst.shared.proto.cloudburst_pb2 import (
     DagTrigger,
     FunctionCall,
     GenericResponse,
+    NORMAL,  # Cloudburst's consistency modes
     NO_RESOURCES  # Cloudburst's error types
 )
-from cloudburst.shared.reference import CloudburstReference
-from cloudburst.shared.serializer import Serializer
-
-serializer = Serializer()
+from cloudburst.shared.proto.internal_pb2 import (
+    CompactDagSchedule,
+    HedgeRequest
+)
+from cloudburst.shared.serializer import get_references
 
 
 def call_function(func_call_socket, pusher_cache, policy):
@@ -42,9 +45,7 @@ def call_function(func_call_socket, pusher_cache, policy):
 
     # Filter the arguments for CloudburstReferences, and use the policy engine to
     # pick a node for this request.
-    refs = list(filter(lambda arg: type(arg) == CloudburstReference,
-                       map(lambda arg: serializer.load(arg),
-                           call.arguments.values)))
+    refs = get_references(call.arguments.values)
     result = policy.pick_executor(refs)
 
     response = GenericResponse()
@@ -68,8 +69,14 @@ def call_function(func_call_socket, pusher_cache, policy):
 def call_dag(call, pusher_cache, dags, policy, request_id=None):
     dag, sources = dags[call.name]
 
+    # Requests with NORMAL consistency are sent to each executor as a compact
+    # schedule that refers to the DAG by version, so we only copy the DAG
+    # into the schedule for the causal modes, which still need it.
+    compact = call.consistency == NORMAL
+
     schedule = DagSchedule()
-    schedule.dag.CopyFrom(dag)
+    if not compact:
+        schedule.dag.CopyFrom(dag)
     schedule.start_time = time.time()
     schedule.consistency = call.consistency
 
@@ -92,19 +99,7 @@ def call_dag(call, pusher_cache, dags, policy, request_id=None):
 
     for fref in dag.functions:
         args = call.function_args[fref.name].values
-
-        processed = list(map(lambda arg: serializer.load(arg), args))
-        flattened = tuple()
-        # Unnest arguments.
-        for arg in processed:
-            if type(arg) == tuple:
-                flattened += arg
-            else:
-                flattened += (arg,)
-        processed = flattened
-
-        refs = list(filter(lambda arg: type(arg) == CloudburstReference,
-                           processed))
+        refs = get_references(args)
 
         colocated = []
         if fref.name in dag.colocated:
@@ -120,24 +115,28 @@ def call_dag(call, pusher_cache, dags, policy, request_id=None):
         ip, tid = result
         schedule.locations[fref.name] = ip + ':' + str(tid)
 
-        # copy over arguments into the dag schedule
-        arg_list = schedule.arguments[fref.name]
-        arg_list.values.extend(args)
+        if not compact:
+            # copy over arguments into the dag schedule
+            arg_list = schedule.arguments[fref.name]
+            arg_list.values.extend(args)
 
-    for fref in dag.functions:
-        loc = schedule.locations[fref.name].split(':')
-        ip = utils.get_queue_address(loc[0], loc[1])
-        schedule.target_function = fref.name
+    if compact:
+        _send_compact_schedules(call, dag, schedule, pusher_cache)
+    else:
+        for fref in dag.functions:
+            loc = schedule.locations[fref.name].split(':')
+            ip = utils.get_queue_address(loc[0], loc[1])
+            schedule.target_function = fref.name
 
-        triggers = sutils.get_dag_predecessors(dag, fref.name)
-        if len(triggers) == 0:
-            triggers.append('BEGIN')
+            triggers = sutils.get_dag_predecessors(dag, fref.name)
+            if len(triggers) == 0:
+                triggers.append('BEGIN')
 
-        schedule.ClearField('triggers')
-        schedule.triggers.extend(triggers)
+            schedule.ClearField('triggers')
+            schedule.triggers.extend(triggers)
 
-        sckt = pusher_cache.get(ip)
-        sckt.send(schedule.SerializeToString())
+            sckt = pusher_cache.get(ip)
+            sckt.send(schedule.SerializeToString())
 
     for source in sources:
         trigger = DagTrigger()
@@ -157,3 +156,66 @@ def call_dag(call, pusher_cache, dags, policy, request_id=None):
         response.response_id = schedule.id
 
     return response
+
+
+def hedge_dag_function(hedge_socket, pusher_cache, policy):
+    '''
+    Starts a backup copy of a late request on another replica of its
+    function: we forward the backup's schedule and the request's triggers
+    there, and both copies then trigger the downstream functions.
+    '''
+    request = HedgeRequest()
+    request.ParseFromString(hedge_socket.recv())
+
+    compact = CompactDagSchedule()
+    compact.ParseFromString(request.schedule)
+    fname = compact.target_function
+
+    ip, tid = request.origin.split(':')
+    result = policy.pick_backup_executor(fname, (ip, int(tid)))
+    if result is None:
+        logging.info('No other replica of %s to hedge request %s on.' %
+                     (fname, compact.id))
+        return
+
+    ip, tid = result
+    sckt = pusher_cache.get(utils.get_compact_queue_address(ip, tid))
+    sckt.send(request.schedule)
+
+    sckt = pusher_cache.get(sutils.get_dag_trigger_address(ip + ':' +
+                                                           str(tid)))
+    for trigger in request.triggers:
+        sckt.send(trigger)
+
+
+def _send_compact_schedules(call, dag, schedule, pusher_cache):
+    version = utils.get_cached_dag_version(dag)
+
+    successors = {}
+    for conn in dag.connections:
+        if conn.source not in successors:
+            successors[conn.source] = []
+        successors[conn.source].append(conn.sink)
+
+    for fref in dag.functions:
+        compact = CompactDagSchedule()
+        compact.id = schedule.id
+        compact.dag_name = dag.name
+        compact.dag_version = version
+        compact.target_function = fref.name
+        compact.arguments = call.function_args[fref.name].SerializeToString()
+        compact.start_time = schedule.start_time
+        compact.response_address = schedule.response_address
+        compact.output_key = schedule.output_key
+        compact.client_id = schedule.client_id
+
+        if fref.name in successors:
+            for sink in successors[fref.name]:
+                compact.locations[sink] = schedule.locations[sink]
+        elif schedule.HasField('continuation'):
+            compact.continuation = schedule.continuation.SerializeToString()
+
+        loc = schedule.locations[fref.name].split(':')
+        sckt = pusher_cache.get(utils.get_compact_queue_address(loc[0],
+                                                                loc[1]))
+        sckt.send(compact.SerializeToString())
@@ -76,27 +76,23 @@ def create_dag(dag_create_socket, pusher_cache, kvs, dags, policy,
     payload = LWWPairLattice(sutils.generate_timestamp(0), serialized)
     kvs.put(dag.name, payload)
 
-    for fref in dag.functions:
-        for _ in range(num_replicas):
-            colocated = []
-
-            if fref.name in dag.colocated:
-                colocated = list(dag.colocated)
-
-            success = policy.pin_function(dag.name, fref, colocated)
-
-            # The policy engine will only return False if it ran out of
-            # resources on which to attempt to pin this function.
-            if not success:
-                logging.info(f'Creating DAG {dag.name} failed due to ' +
-                             'insufficient resources.')
-                sutils.error.error = NO_RESOURCES
-                dag_create_socket.send(sutils.error.SerializeToString())
-
-                # Unpin any previously pinned functions because the operation
-                # failed.
-                policy.discard_dag(dag, True)
-                return
+    # We pin every replica of every function at once.
+    function_refs = [fref for fref in dag.functions for _ in
+                     range(num_replicas)]
+    success = policy.pin_functions(dag.name, function_refs,
+                                   list(dag.colocated))
+
+    # The policy engine will only return False if it ran out of resources on
+    # which to attempt to pin the DAG's functions.
+    if not success:
+        logging.info(f'Creating DAG {dag.name} failed due to ' +
+                     'insufficient resources.')
+        sutils.error.error = NO_RESOURCES
+        dag_create_socket.send(sutils.error.SerializeToString())
+
+        # Unpin any previously pinned functions because the operation failed.
+        policy.discard_dag(dag, True)
+        return
 
     # Only create this metadata after all functions have been successfully
     # created.
@@ -0,0 +1,82 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+import time
+
+# The period (in seconds) over which we count the requests routed to each
+# executor, and the number of buckets that period is divided into.
+LOAD_WINDOW = 5
+LOAD_BUCKETS = 10
+
+
+class SlidingWindowCounter():
+    '''
+    Counts events over the last window seconds. The window is divided into a
+    ring of equally wide buckets; an event is added to the bucket for the
+    current time, and as time passes, buckets that fall out of the window are
+    cleared and subtracted from a running total. Incrementing and reading are
+    both constant time, and memory does not grow with the number of events.
+    Counts are accurate to within one bucket's width of the window.
+    '''
+
+    def __init__(self, window=LOAD_WINDOW, num_buckets=LOAD_BUCKETS):
+        self.width = window / num_buckets
+        self.buckets = [0] * num_buckets
+        self.total = 0
+
+        # The absolute index of the bucket for the most recent time we saw.
+        self.tick = None
+
+        # Several of the scheduler's threads route requests at once.
+        self.lock = threading.Lock()
+
+    def increment(self, count=1, now=None):
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            self._advance(now)
+            self.buckets[self.tick % len(self.buckets)] += count
+            self.total += count
+
+    def count(self, now=None):
+        if now is None:
+            now = time.time()
+
+        with self.lock:
+            self._advance(now)
+            return self.total
+
+    def _advance(self, now):
+        tick = int(now // self.width)
+
+        if self.tick is None:
+            self.tick = tick
+            return
+
+        # Events are never backdated past the current bucket.
+        if tick <= self.tick:
+            return
+
+        if tick - self.tick >= len(self.buckets):
+            self.buckets = [0] * len(self.buckets)
+            self.total = 0
+        else:
+            for passed in range(self.tick + 1, tick + 1):
+                index = passed % len(self.buckets)
+                self.total -= self.buckets[index]
+                self.buckets[index] = 0
+
+        self.tick = tick
@@ -33,6 +33,16 @@ class BaseCloudburstSchedulerPolicy():
         '''
         raise NotImplementedError
 
+    def pick_backup_executor(self, function_name, exclude):
+        '''
+        Pick an executor thread, other than exclude, on which function_name
+        is pinned, to run a backup copy of a request that is running late.
+
+        Returns the IP-thread ID pair of the executor chosen, or None if there
+        is no other replica.
+        '''
+        raise NotImplementedError
+
     def pin_function(self, dag_name, function_name):
         '''
         Pick an executor thread on which to pin a particular DAG function. None
@@ -45,6 +55,25 @@ class BaseCloudburstSchedulerPolicy():
         '''
         raise NotImplementedError
 
+    def pin_functions(self, dag_name, function_refs, colocated, exclude=()):
+        '''
+        Pin each of a list of DAG functions, as pin_function does, but pin
+        them all at once rather than one after another. A function that
+        appears more than once in the list is pinned that many times, on
+        different executors. No function is pinned on an executor in exclude.
+
+        Returns True if every function was successfully pinned and False if
+        we ran out of resources.
+        '''
+        raise NotImplementedError
+
+    def unpin_function(self, function_name, executor):
+        '''
+        Unpin one replica of a function from the given executor thread, and
+        stop sending the function's requests there.
+        '''
+        raise NotImplementedError
+
     def commit_dag(self, dag_name):
         '''
         Persist the function location metadata generated via a sequence of
@@ -67,6 +96,14 @@ class BaseCloudburstSchedulerPolicy():
         '''
         raise NotImplementedError
 
+    def process_load(self, load):
+        '''
+        Process a load update (an ExecutorLoad) from an executor thread: its
+        current queue depth and number of in-flight requests. These arrive
+        much more often than status updates, so policies that do not use them
+        can ignore them.
+        '''
+
     def update(self):
         '''
         Since metadata becomes stale, the server process will periodically ask
@@ -12,9 +12,13 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from collections import Counter
+import itertools
 import logging
 import random
+import threading
 import time
+import uuid
 
 import zmq
 
@@ -24,6 +28,7 @@ from cloudburst.shared.proto.internal_pb2 import (
     PinFunction
 )
 from cloudburst.shared.proto.shared_pb2 import StringSet
+from cloudburst.server.scheduler.load import SlidingWindowCounter
 from cloudburst.server.scheduler.policy.base_policy import (
     BaseCloudburstSchedulerPolicy
 )
@@ -37,16 +42,34 @@ sys_random = random.SystemRandom()
 
 NUM_EXECUTOR_THREADS = 3
 
+# Executors that have been routed more than this many requests in the last
+# load window are avoided with high probability.
+OVERLOAD_THRESHOLD = 1000
+
+# Under the power-of-two policy, how many queued requests one cached
+# reference is worth when comparing two executors.
+LOCALITY_WEIGHT = 1.0
+
 
 class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
+    '''
+    The scheduler picks executors for DAG calls on several threads at once,
+    while its main thread processes status updates and its control thread
+    pins functions. Rather than lock around every pick, picking only reads
+    the metadata maps through snapshots (copies of the relevant lists and
+    keys), and entries that change are replaced rather than modified. Since
+    both the main thread and the control thread change function_locations,
+    they build each new list and swap it in under locations_lock.
+    '''
 
     def __init__(self, pin_accept_socket, pusher_cache, kvs_client, ip,
-                 policy, random_threshold=0.20, local=False):
+                 policy, random_threshold=0.20, local=False,
+                 batching_conf=None, hedging_conf=None):
         # This scheduler's IP address.
         self.ip = ip
 
-        # The policy to use with the scheduler -- random, round-robin, or
-        # locality.
+        # The policy to use with the scheduler -- random, round-robin,
+        # power-of-two, or locality.
         self.policy = policy
 
         # A socket to listen for confirmations of pin operations' successes.
@@ -58,17 +81,40 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
         # This thread's Anna KVS client.
         self.kvs_client = kvs_client
 
-        # A map to track how many requests have been routed to each executor in
-        # the most recent timeslice.
+        # A map from function names to the batching configuration (a latency
+        # SLO and a maximum batch size) to pin batching-enabled functions with.
+        self.batching_conf = batching_conf if batching_conf else {}
+
+        # A map from function names to the runtime quantile past which
+        # executors start backup copies of the function's requests.
+        self.hedging_conf = hedging_conf if hedging_conf else {}
+
+        # A map from each executor to a SlidingWindowCounter of how many
+        # requests have been routed to it in the most recent timeslice.
         self.running_counts = {}
 
+        # A counter per function, which the round-robin policy uses to pick
+        # the next of the function's executors.
+        self.round_robin = {}
+
+        # A map from each executor to its estimated number of outstanding
+        # requests: the queue depth and in-flight count it last reported, plus
+        # the requests we have routed to it since.
+        self.executor_loads = {}
+
         # A map to track nodes which have recently reported high load. These
         # nodes will not be sent requests until after a cooling period.
         self.backoff = {}
 
-        # A map to track which caches are currently caching which keys.
+        # An index from each cached key to a tuple of the IPs of the caches
+        # that hold it. It is updated incrementally from the cache reports.
         self.key_locations = {}
 
+        # The keys in the most recent cache report from each IP, and the
+        # report itself, so that unchanged reports are not parsed again.
+        self.cached_keys = {}
+        self.cache_reports = {}
+
         # Executors which currently have no functions pinned on them.
         self.unpinned_cpu_executors = set()
 
@@ -79,8 +125,10 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
         self.unpinned_gpu_executors = set()
 
         # A map from function names to the executor(s) on which they are
-        # pinned.
+        # pinned. Readers take a snapshot of a list before using it; writers
+        # replace the list while holding locations_lock.
         self.function_locations = {}
+        self.locations_lock = threading.Lock()
 
         # A map to sequester function location information until all functions
         # in a DAG have accepted their pin operations.
@@ -99,13 +147,9 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
 
     def pick_executor(self, references, function_name=None, colocated=[],
                       schedule=None):
-        # Construct a map which maps from IP addresses to the number of
-        # relevant arguments they have cached. For the time begin, we will
-        # just pick the machine that has the most number of keys cached.
-        arg_map = {}
-
         if function_name:
-            executors = set(self.function_locations[function_name])
+            locations = list(self.function_locations[function_name])
+            executors = set(locations)
         else:
             executors = set(self.unpinned_cpu_executors)
 
@@ -122,27 +166,28 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
                 if ip in candidate_nodes:
                     return ip, tid
 
-        for executor in self.backoff:
+        for executor in list(self.backoff):
             if len(executors) > 1:
                 executors.discard(executor)
 
         # Shortcut policies -- if neither of these are activated, we go to the
         # default backoff and locality policy.
-        if function_name:
+        if function_name and len(locations) > 0:
             if self.policy == 'random':
-                return random.choice(self.function_locations[function_name])
+                return random.choice(locations)
             if self.policy == 'round-robin':
-                executor = self.function_locations[function_name].pop(0)
-                self.function_locations[function_name].append(executor)
-                return executor
-
-
-        # Generate a list of all the keys in the system; if any of these nodes
-        # have received many requests, we remove them from the executor set
-        # with high probability.
-        for key in self.running_counts:
-           if (len(self.running_counts[key]) > 1000 and sys_random.random() >
-                   self.random_threshold):
+                counter = self.round_robin.setdefault(function_name,
+                                                      itertools.count())
+                return locations[next(counter) % len(locations)]
+
+
+        # If any of our candidate executors have received many requests, we
+        # remove them from the executor set with high probability.
+        for key in list(executors):
+            counter = self.running_counts.get(key)
+            if (counter is not None and
+                    counter.count() > OVERLOAD_THRESHOLD and
+                    sys_random.random() > self.random_threshold):
                 if len(executors) > 1:
                     executors.discard(key)
 
@@ -152,43 +197,46 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
 
         executor_ips = set([e[0] for e in executors])
 
-        # For each reference, we look at all the places where they are cached,
-        # and we calculate which IP address has the most references cached.
+        # Score each IP address by how many of the references it has cached,
+        # looking each reference up in the key index. This only depends on the
+        # number of references, not on how many keys are cached.
+        scores = Counter()
         for reference in references:
-            if reference.key in self.key_locations:
-                ips = self.key_locations[reference.key]
-
-                for ip in ips:
-                    # Only choose this cached node if its a valid executor for
-                    # our purposes.
-                    if ip in executor_ips:
-                        if ip not in arg_map:
-                            arg_map[ip] = 0
+            scores.update(self.key_locations.get(reference.key, ()))
 
-                        arg_map[ip] += 1
-
-        # Get the IP address that has the maximum value in the arg_map, if
-        # there are any values.
+        # Get the valid executor IP address with the most references cached,
+        # if any of them have any cached.
         max_ip = None
-        if arg_map:
-            max_ip = max(arg_map, key=arg_map.get)
-
-        # Pick a random thead from our potential executors that is on that IP
-        # address with the most keys cached.
-        if max_ip:
-            candidates = list(filter(lambda e: e[0] == max_ip, executors))
-            max_ip = sys_random.choice(candidates)
-
-        # If max_ip was never set (i.e. there were no references cached
-        # anywhere), or with some random chance, we assign this node to a
-        # random executor.
-        if not max_ip or sys_random.random() < self.random_threshold:
-            max_ip = sys_random.sample(executors, 1)[0]
-
-        if max_ip not in self.running_counts:
-            self.running_counts[max_ip] = set()
-
-        self.running_counts[max_ip].add(time.time())
+        for ip, _ in scores.most_common():
+            if ip in executor_ips:
+                max_ip = ip
+                break
+
+        if self.policy == 'power-of-two':
+            max_ip = self._pick_two_choices(executors, scores, max_ip)
+
+            # Count this request towards the executor's load until it next
+            # tells us what its load is.
+            self.executor_loads[max_ip] = \
+                self.executor_loads.get(max_ip, 0) + 1
+        else:
+            # Pick a random thead from our potential executors that is on
+            # that IP address with the most keys cached.
+            if max_ip:
+                candidates = list(filter(lambda e: e[0] == max_ip, executors))
+                max_ip = sys_random.choice(candidates)
+
+            # If max_ip was never set (i.e. there were no references cached
+            # anywhere), or with some random chance, we assign this node to a
+            # random executor.
+            if not max_ip or sys_random.random() < self.random_threshold:
+                max_ip = sys_random.sample(executors, 1)[0]
+
+        counter = self.running_counts.get(max_ip)
+        if counter is None:
+            counter = self.running_counts.setdefault(max_ip,
+                                                     SlidingWindowCounter())
+        counter.increment()
 
         # Remove this IP/tid pair from the system's metadata until it notifies
         # us that it is available again, but only do this for non-DAG requests.
@@ -200,132 +248,268 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
 
         return max_ip
 
-    def pin_function(self, dag_name, function_ref, colocated):
-        # If there are no functions left to choose from, then we return None,
-        # indicating that we ran out of resources to use.
-        if function_ref.gpu and len(self.unpinned_gpu_executors) == 0:
-            return False
-        elif not function_ref.gpu and len(self.unpinned_cpu_executors) == 0:
-            return False
+    def _pick_two_choices(self, executors, scores, locality_ip):
+        '''
+        Power-of-two-choices, blended with locality: we compare two executors
+        and pick the one with the lower cost, which is its estimated load less
+        LOCALITY_WEIGHT for each of the request's references cached on its
+        node. If any node has references cached, one of the two is the least
+        loaded executor on the node with the most; otherwise both are random.
+        '''
+        executors = list(executors)
+        if len(executors) == 1:
+            return executors[0]
+
+        def cost(executor):
+            return self.executor_loads.get(executor, 0) - \
+                LOCALITY_WEIGHT * scores[executor[0]]
+
+        if locality_ip:
+            first = min(filter(lambda e: e[0] == locality_ip, executors),
+                        key=cost)
+            second = sys_random.choice(executors)
+        else:
+            first, second = sys_random.sample(executors, 2)
+
+        return first if cost(first) <= cost(second) else second
+
+    def pick_backup_executor(self, function_name, exclude):
+        executors = set(self.function_locations.get(function_name, []))
+        executors.discard(exclude)
 
+        # Prefer replicas that have not asked us to back off.
+        available = executors - set(self.backoff)
+        if len(available) > 0:
+            executors = available
+
+        if len(executors) == 0:
+            return None
+
+        return sys_random.choice(list(executors))
+
+    def pin_function(self, dag_name, function_ref, colocated):
+        return self.pin_functions(dag_name, [function_ref], colocated)
+
+    def pin_functions(self, dag_name, function_refs, colocated, exclude=()):
+        # Rather than pin one function and wait for its executor to answer
+        # before moving on to the next, we send out a pin for every function
+        # at once and match the answers to the pins by request ID. Pins that
+        # are rejected or time out are retried together in the next round, so
+        # pinning a whole DAG usually takes a single round trip.
         if dag_name not in self.pending_dags:
             self.pending_dags[dag_name] = []
 
+        # Executors that rejected or did not answer a pin for this DAG, as
+        # well as the ones the caller asked us not to use. We do not try them
+        # again, even in local mode.
+        excluded = set(exclude)
+
+        # Pins that timed out, by request ID. If one of them is accepted after
+        # all, we unpin it, since we have pinned that function elsewhere. (In
+        # local mode, the extra copy is harmless, and unpinning would restart
+        # an executor that other functions are pinned on.)
+        abandoned = {}
+
+        remaining = list(function_refs)
+        while len(remaining) > 0:
+            # Pick an executor for every pin in this round before sending any
+            # of them, so that we do not pin anything if we have run out of
+            # resources.
+            planned = []
+            for function_ref in remaining:
+                executor = self._pick_pin_executor(dag_name, function_ref,
+                                                   colocated, excluded,
+                                                   planned)
+
+                # If there are no executors left to choose from, we return
+                # False, indicating that we ran out of resources to use.
+                if executor is None:
+                    return False
+
+                planned.append((function_ref, executor))
+
+            # A map from the request ID of each pin in this round to the
+            # function and executor it pins.
+            outstanding = {}
+            for function_ref, executor in planned:
+                request_id = str(uuid.uuid4())
+                outstanding[request_id] = (function_ref, executor)
+
+                sckt = self.pusher_cache.get(get_pin_address(*executor))
+                sckt.send(self._get_pin_message(function_ref, request_id))
+
+            remaining = []
+            while len(outstanding) > 0:
+                response = GenericResponse()
+                try:
+                    response.ParseFromString(self.pin_accept_socket.recv())
+                except zmq.ZMQError:
+                    for function_ref, executor in outstanding.values():
+                        logging.error('Pin operation to %s:%d timed out. '
+                                      'Retrying.' % executor)
+                        excluded.add(executor)
+                        remaining.append(function_ref)
+
+                    abandoned.update(outstanding)
+                    break
+
+                request_id = response.response_id
+                if request_id in abandoned:
+                    function_ref, executor = abandoned.pop(request_id)
+                    if response.success and not self.local:
+                        sckt = self.pusher_cache.get(
+                            get_unpin_address(*executor))
+                        sckt.send_string(function_ref.name)
+                    continue
+                elif request_id not in outstanding:
+                    logging.info('Ignoring a pin response for unknown request '
+                                 '%s.' % (request_id))
+                    continue
+
+                function_ref, executor = outstanding.pop(request_id)
+
+                # Do not use this executor either way: If it rejected, it has
+                # something else pinned, and if it accepted, it has pinned what
+                # we just asked it to pin. In local mode, however we allow
+                # executors to have multiple functions pinned.
+                if not self.local:
+                    if function_ref.gpu:
+                        self.unpinned_gpu_executors.discard(executor)
+                    else:
+                        self.unpinned_cpu_executors.discard(executor)
+
+                if response.success:
+                    self.pending_dags[dag_name].append((function_ref.name,
+                                                        executor))
+                else:
+                    # The pin operation was rejected, so we try again
+                    # elsewhere in the next round.
+                    logging.error('Node %s:%d rejected pin for %s. Retrying.'
+                                  % (executor + (function_ref.name,)))
+                    excluded.add(executor)
+                    remaining.append(function_ref)
+
+        return True
+
+    def _pick_pin_executor(self, dag_name, function_ref, colocated, excluded,
+                           planned):
+        # Outside of local mode, each executor gets at most one function, so
+        # we also skip the executors that other pins in this round will use.
+        # In local mode, we only keep replicas of the same function apart.
+        unavailable = set(excluded)
+        for other_ref, executor in planned:
+            if not self.local or other_ref.name == function_ref.name:
+                unavailable.add(executor)
+
+        if self.local:
+            for fn, executor in self.pending_dags[dag_name]:
+                if fn == function_ref.name:
+                    unavailable.add(executor)
+
         # Make a copy of the set of executors, so that we don't modify the
         # system's metadata.
         if function_ref.gpu:
-            candidates = set(self.unpinned_gpu_executors)
-        elif len(colocated) == 0:
-            # If this is not a GPU function, just look at all of the unpinned
-            # executors.
-            candidates = set(self.unpinned_cpu_executors)
+            candidates = set(self.unpinned_gpu_executors) - unavailable
         else:
-            candidates = set()
+            candidates = set(self.unpinned_cpu_executors) - unavailable
 
-            already_pinned = set()
-            for fn, thread in self.pending_dags[dag_name]:
-                if fn in colocated:
-                    already_pinned.add((fn, thread))
-            candidate_nodes = set()
+            if function_ref.name in colocated:
+                colocated_candidates = self._get_colocated_candidates(
+                    dag_name, colocated, candidates, planned)
 
-            if len(already_pinned) > 0:
-                for fn, thread in already_pinned:
-                    candidate_nodes.add(thread[0]) # The node's IP
+                # If there are no valid executors to colocate on, we fall back
+                # to pinning anywhere.
+                if len(colocated_candidates) > 0:
+                    candidates = colocated_candidates
 
-                for node, tid in self.unpinned_cpu_executors:
-                    if node in candidate_nodes:
-                        candidates.add((node, tid))
-            else:
-                # If this is the first colocate to be pinned, try to assign to
-                # an empty node.
-                nodes = {}
-                for node, tid in self.unpinned_cpu_executors:
-                    if node not in nodes:
-                        nodes[node] = 0
-                    nodes[node] += 1
-
-                for node in nodes:
-                    if nodes[node] == NUM_EXECUTOR_THREADS:
-                        for i in range(NUM_EXECUTOR_THREADS):
-                            candidates.add((node, i))
-
-        if len(candidates) == 0: # There no valid executors to colocate on.
-            return self.pin_function(dag_name, function_ref, [])
+        if len(candidates) == 0:
+            return None
 
+        # Pin the candidate with smallest tid
+        return min(candidates, key=lambda executor: executor[1])
+
+    def _get_colocated_candidates(self, dag_name, colocated, candidates,
+                                  planned):
+        # The nodes on which other colocated functions of this DAG are pinned,
+        # or are about to be.
+        candidate_nodes = set()
+        for fn, (node, _) in self.pending_dags[dag_name]:
+            if fn in colocated:
+                candidate_nodes.add(node)
+
+        for function_ref, (node, _) in planned:
+            if function_ref.name in colocated:
+                candidate_nodes.add(node)
+
+        if len(candidate_nodes) > 0:
+            return {(node, tid) for node, tid in candidates if node in
+                    candidate_nodes}
+
+        # If this is the first colocated function to be pinned, try to assign
+        # it to an empty node.
+        nodes = {}
+        for node, tid in candidates:
+            if node not in nodes:
+                nodes[node] = 0
+            nodes[node] += 1
+
+        return {(node, tid) for node, tid in candidates if nodes[node] ==
+                NUM_EXECUTOR_THREADS}
+
+    def _get_pin_message(self, function_ref, request_id):
         # Construct a PinFunction message to be sent to executors.
         pin_msg = PinFunction()
         pin_msg.name = function_ref.name
         pin_msg.batching = function_ref.batching
         pin_msg.response_address = self.ip
+        pin_msg.request_id = request_id
 
-        serialized = pin_msg.SerializeToString()
-
-        while True:
-            # # Pick a random executor from the set of candidates and attempt to
-            # # pin this function there.
-            # node, tid = sys_random.sample(candidates, 1)[0]
-            
-            # Pin the candidate with smallest tid
-            node = None
-            tid = 10000
-            for c_node, c_tid in candidates:
-                if c_tid < tid:
-                    node = c_node
-                    tid = c_tid
-
-            for other_node, _ in self.pending_dags[dag_name]:
-                if len(candidates) > 1 and node == other_node:
-                    continue
+        if function_ref.batching and function_ref.name in self.batching_conf:
+            conf = self.batching_conf[function_ref.name]
+            pin_msg.max_batch_size = conf.get('max_batch_size', 0)
+            pin_msg.latency_slo = conf.get('latency_slo', 0.0)
 
-            sckt = self.pusher_cache.get(get_pin_address(node, tid))
-            sckt.send(serialized)
+        if function_ref.name in self.hedging_conf:
+            pin_msg.hedge_quantile = self.hedging_conf[function_ref.name]
 
-            response = GenericResponse()
-            try:
-                response.ParseFromString(self.pin_accept_socket.recv())
-            except zmq.ZMQError:
-                logging.error('Pin operation to %s:%d timed out. Retrying.' %
-                              (node, tid))
-                continue
+        return pin_msg.SerializeToString()
 
-            # Do not use this executor either way: If it rejected, it has
-            # something else pinned, and if it accepted, it has pinned what we
-            # just asked it to pin. In local mode, however we allow executors
-            # to have multiple functions pinned.
-            if not self.local:
-                if function_ref.gpu:
-                    self.unpinned_gpu_executors.discard((node, tid))
-                    candidates.discard((node, tid))
-                else:
-                    self.unpinned_cpu_executors.discard((node, tid))
-                    candidates.discard((node, tid))
-
-            if response.success:
-                # The pin operation succeeded, so we return the node and thread
-                # ID to the caller.
-                self.pending_dags[dag_name].append((function_ref.name, (node,
-                                                                        tid)))
-                return True
-            else:
-                # The pin operation was rejected, remove node and try again.
-                logging.error('Node %s:%d rejected pin for %s. Retrying.'
-                              % (node, tid, function_ref.name))
+    def commit_dag(self, dag_name):
+        for function_name, location in self.pending_dags[dag_name]:
+            self._add_location(function_name, location)
 
-                continue
+        del self.pending_dags[dag_name]
 
-            if len(candidates) == 0 and len(colocated) > 0:
-                # Try again without colocation.
-                return self.pin_function(self, dag_name, function_ref, [])
+    def unpin_function(self, function_name, executor):
+        # Stop routing requests to this replica right away, rather than when
+        # the executor's next status arrives.
+        self._remove_location(function_name, executor)
 
+        sckt = self.pusher_cache.get(get_unpin_address(*executor))
+        sckt.send_string(function_name)
 
-    def commit_dag(self, dag_name):
-        for function_name, location in self.pending_dags[dag_name]:
-            if function_name not in self.function_locations:
-                self.function_locations[function_name] = []
+    def _add_location(self, function_name, executor, first=False,
+                      unique=False):
+        with self.locations_lock:
+            locations = self.function_locations.get(function_name, [])
+            if unique and executor in locations:
+                return
 
-            self.function_locations[function_name].append(location)
+            if first:
+                locations = [executor] + locations
+            else:
+                locations = locations + [executor]
 
-        del self.pending_dags[dag_name]
+            self.function_locations[function_name] = locations
+
+    def _remove_location(self, function_name, executor):
+        # A location may already be gone, e.g. if we unpinned the function
+        # before the executor's status caught up, so this is not an error.
+        with self.locations_lock:
+            locations = self.function_locations.get(function_name, [])
+            if executor in locations:
+                self.function_locations[function_name] = [
+                    location for location in locations if location != executor]
 
     def discard_dag(self, dag, pending=False):
         pinned_locations = []
@@ -339,7 +523,8 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
             # If the DAG was not pinned, we construct a set of all the
             # locations where functions were pinned for this DAG.
             for function_ref in dag.functions:
-                for location in self.function_locations[function_ref.name]:
+                for location in list(self.function_locations.get(
+                        function_ref.name, [])):
                     pinned_locations.append((function_ref.name, location))
 
         # For each location, we fire-and-forget an unpin message.
@@ -359,7 +544,7 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
         if not status.running:
             if key in self.thread_statuses:
                 for fname in self.thread_statuses[key].functions:
-                    self.function_locations[fname].remove(key)
+                    self._remove_location(fname, key)
 
                 del self.thread_statuses[key]
 
@@ -368,6 +553,7 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
             else:
                 self.unpinned_gpu_executors.discard(key)
 
+            self.executor_loads.pop(key, None)
             return
 
         if len(status.functions) == 0:
@@ -381,16 +567,11 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
         # different than calculating two different set differences anyway.
         if key in self.thread_statuses and self.thread_statuses[key] != status:
             for function_name in self.thread_statuses[key].functions:
-                if function_name in self.function_locations:
-                    self.function_locations[function_name].remove(key)
+                self._remove_location(function_name, key)
 
         self.thread_statuses[key] = status
         for function_name in status.functions:
-            if function_name not in self.function_locations:
-                self.function_locations[function_name] = list()
-
-            if key not in self.function_locations[function_name]:
-                self.function_locations[function_name].insert(0, key)
+            self._add_location(function_name, key, first=True, unique=True)
 
         # If the executor thread is overutilized, we add it to the backoff set
         # and ignore it for a period of time.
@@ -405,16 +586,40 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
             if all(not_lone_executor):
                 self.backoff[key] = time.time()
 
-    def update(self):
-        # Periodically clean up the running counts map to drop any times older
-        # than 5 seconds.
-        for executor in self.running_counts:
-            new_set = set()
-            for ts in self.running_counts[executor]:
-                if time.time() - ts < 5:
-                    new_set.add(ts)
+    def process_load(self, load):
+        key = (load.ip, load.tid)
+
+        # Executors only tell us about their load while they are running.
+        if key in self.thread_statuses:
+            self.executor_loads[key] = load.queue_depth + load.in_flight
+
+    def total_load(self):
+        '''
+        The sum of the estimated loads of all executors. We add it up on
+        every call rather than keeping a running total, since the DAG call
+        workers and the main thread update the loads concurrently.
+        '''
+        return sum(list(self.executor_loads.values()))
+
+    def saturated(self, function_name, max_load):
+        '''
+        Whether every executor the function is pinned on has an estimated
+        load of at least max_load.
+        '''
+        locations = list(self.function_locations.get(function_name, []))
+        if len(locations) == 0:
+            return False
+
+        return all([self.executor_loads.get(executor, 0) >= max_load for
+                    executor in locations])
 
-            self.running_counts[executor] = new_set
+    def update(self):
+        # The running counts expire on their own; we only drop the counters
+        # of executors that have not been sent anything recently, so the map
+        # does not keep executors that have left.
+        for executor, counter in list(self.running_counts.items()):
+            if counter.count() == 0:
+                self.running_counts.pop(executor, None)
 
         # Clean up any backoff messages that were added more than 5 seconds ago
         # -- this should be enough to drain a queue.
@@ -427,36 +632,64 @@ class DefaultCloudburstSchedulerPolicy(BaseCloudburstSchedulerPolicy):
             del self.backoff[executor]
 
         executors = set(map(lambda status: status.ip,
-                            self.thread_statuses.values()))
+                            list(self.thread_statuses.values())))
+
+        # Forget the cached keys of any node we no longer know about.
+        for ip in set(self.cached_keys) - executors:
+            self._update_cached_keys(ip, set())
+            self.cache_reports.pop(ip, None)
 
-        # Update the sets of keys that are being cached at each IP address.
-        self.key_locations.clear()
-        for ip in executors:
-            key = get_cache_ip_key(ip)
+        if len(executors) == 0:
+            return
 
+        # Read the sets of keys that are being cached at each IP address, all
+        # in one request.
+        ips = list(executors)
+        reports = self.kvs_client.get([get_cache_ip_key(ip) for ip in ips])
+
+        for ip in ips:
             # This is of type LWWPairLattice, which has a StringSet protobuf
             # packed into it; we want the keys in that StringSet protobuf.
-            lattice = self.kvs_client.get(key)[key]
+            lattice = reports.get(get_cache_ip_key(ip))
             if lattice is None:
                 # We will only get None if this executor is still joining; if
                 # so, we just ignore this for now and move on.
                 continue
 
+            report = lattice.reveal()
+            if self.cache_reports.get(ip) == report:
+                continue
+
             st = StringSet()
-            st.ParseFromString(lattice.reveal())
+            st.ParseFromString(report)
+
+            self.cache_reports[ip] = report
+            self._update_cached_keys(ip, set(st.keys))
+
+    def _update_cached_keys(self, ip, keys):
+        '''
+        Applies the difference between the keys cached at ip and the keys it
+        last reported to the key index.
+        '''
+        previous = self.cached_keys.get(ip, set())
+
+        for key in previous - keys:
+            remaining = tuple(other for other in
+                              self.key_locations.get(key, ()) if other != ip)
+            if len(remaining) > 0:
+                self.key_locations[key] = remaining
+            else:
+                self.key_locations.pop(key, None)
 
-            for key in st.keys:
-                if key not in self.key_locations:
-                    self.key_locations[key] = []
+        for key in keys - previous:
+            self.key_locations[key] = self.key_locations.get(key, ()) + (ip,)
 
-                self.key_locations[key].append(ip)
+        if len(keys) > 0:
+            self.cached_keys[ip] = keys
+        else:
+            self.cached_keys.pop(ip, None)
 
     def update_function_locations(self, new_locations):
         for location in new_locations:
-            function_name = location.name
-            if function_name not in self.function_locations:
-                self.function_locations[function_name] = []
-
-            key = (location.ip, location.tid)
-            if key not in self.function_locations[function_name]:
-                self.function_locations[function_name].append(key)
+            self._add_location(location.name, (location.ip, location.tid),
+                               unique=True)
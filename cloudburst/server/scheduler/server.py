@@ -15,6 +15,7 @@
 import json
 import logging
 import sys
+import threading
 import time
 import uuid
 import zmq
@@ -23,49 +24,57 @@ from anna.client import AnnaTcpClient
 from anna.zmq_util import SocketCache
 import requests
 
-from cloudburst.server.scheduler.call import call_dag, call_function
-from cloudburst.server.scheduler.create import (
-    create_dag,
-    create_function,
-    delete_dag
+from cloudburst.server.scheduler.admission import AdmissionController
+from cloudburst.server.scheduler.autoscaler import ReplicaController
+from cloudburst.server.scheduler.call import (
+    call_dag,
+    call_function,
+    hedge_dag_function
 )
 from cloudburst.server.scheduler.policy.default_policy import (
     DefaultCloudburstSchedulerPolicy
 )
 import cloudburst.server.scheduler.utils as sched_utils
+from cloudburst.server.scheduler.workers import ControlThread, DagCallWorkers
 import cloudburst.server.utils as sutils
 from cloudburst.shared.proto.cloudburst_pb2 import (
     Continuation,
     Dag,
-    DagCall,
-    GenericResponse,
-    NO_SUCH_DAG,  # Cloudburst's error types
     Value
 )
 from cloudburst.shared.proto.internal_pb2 import (
+    ExecutorLoad,
     ExecutorStatistics,
     SchedulerStatus,
     ThreadStatus
 )
 from cloudburst.shared.proto.shared_pb2 import StringSet
+from cloudburst.shared.backoff import wait_for
+from cloudburst.shared.histogram import DEFAULT_LEGACY_SAMPLES
 from cloudburst.shared.utils import (
     CONNECT_PORT,
-    DAG_CALL_PORT,
-    DAG_CREATE_PORT,
-    DAG_DELETE_PORT,
     FUNC_CALL_PORT,
-    FUNC_CREATE_PORT,
     LIST_PORT
 )
 
 METADATA_THRESHOLD = 5
 REPORT_THRESHOLD = 5
 
+# How long to wait for a DAG that another scheduler told us about to show up
+# in the KVS.
+DAG_FETCH_TIMEOUT = 1
+
+# The number of threads that serve DAG calls by default.
+DEFAULT_DAG_CALL_THREADS = 4
+
 logging.basicConfig(filename='log_scheduler.txt', level=logging.INFO,
                     format='%(asctime)s %(message)s')
 
 
-def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
+def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type,
+              batching_conf=None, hedging_conf=None,
+              dag_call_threads=DEFAULT_DAG_CALL_THREADS, admission_conf=None,
+              autoscaling_conf=None, legacy_samples=DEFAULT_LEGACY_SAMPLES):
 
     # If the management IP is not set, we are running in local mode.
     local = (mgmt_ip is None)
@@ -75,27 +84,23 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
 
     context = zmq.Context(1)
 
-    # A mapping from a DAG's name to its protobuf representation.
+    # A mapping from a DAG's name to its protobuf representation. DAGs are
+    # created and deleted on the control thread and read by the DAG call
+    # workers; this thread only iterates over it while holding metadata_lock.
     dags = {}
 
-    # Tracks how often a request for each function is received.
+    # Tracks how often a request for each function is received. Calls served
+    # by the DAG call workers are counted by the workers, and added in when we
+    # report.
     call_frequency = {}
 
-    # Tracks the time interval between successive requests for a particular
-    # DAG.
-    interarrivals = {}
-
-    # Tracks the most recent arrival for each DAG -- used to calculate
-    # interarrival times.
-    last_arrivals = {}
+    # Guards changes to, and iteration over, dags and call_frequency.
+    metadata_lock = threading.Lock()
 
     # Maintains a list of all other schedulers in the system, so we can
     # propagate metadata to them.
     schedulers = set()
 
-    # Tracks the process time in scheduler for each DAG.
-    dag_process_times = {}
-
     # Internal metadata to track thread utilization.
     event_occupancy = {'connect': 0.0,
                     'func_create': 0.0,
@@ -107,27 +112,18 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
                     'exec_status': 0.0,
                     'sched_update': 0.0,
                     'continuation': 0.0,
+                    'hedge': 0.0,
+                    'load': 0.0,
+                    'autoscale': 0.0,
                     }
     total_occupancy = 0.0
 
     connect_socket = context.socket(zmq.REP)
     connect_socket.bind(sutils.BIND_ADDR_TEMPLATE % (CONNECT_PORT))
 
-    func_create_socket = context.socket(zmq.REP)
-    func_create_socket.bind(sutils.BIND_ADDR_TEMPLATE % (FUNC_CREATE_PORT))
-
     func_call_socket = context.socket(zmq.REP)
     func_call_socket.bind(sutils.BIND_ADDR_TEMPLATE % (FUNC_CALL_PORT))
 
-    dag_create_socket = context.socket(zmq.REP)
-    dag_create_socket.bind(sutils.BIND_ADDR_TEMPLATE % (DAG_CREATE_PORT))
-
-    dag_call_socket = context.socket(zmq.REP)
-    dag_call_socket.bind(sutils.BIND_ADDR_TEMPLATE % (DAG_CALL_PORT))
-
-    dag_delete_socket = context.socket(zmq.REP)
-    dag_delete_socket.bind(sutils.BIND_ADDR_TEMPLATE % (DAG_DELETE_PORT))
-
     list_socket = context.socket(zmq.REP)
     list_socket.bind(sutils.BIND_ADDR_TEMPLATE % (LIST_PORT))
 
@@ -138,15 +134,16 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
     sched_update_socket.bind(sutils.BIND_ADDR_TEMPLATE %
                              (sutils.SCHED_UPDATE_PORT))
 
-    pin_accept_socket = context.socket(zmq.PULL)
-    pin_accept_socket.setsockopt(zmq.RCVTIMEO, 10000) # 10 seconds.
-    pin_accept_socket.bind(sutils.BIND_ADDR_TEMPLATE %
-                           (sutils.PIN_ACCEPT_PORT))
-
     continuation_socket = context.socket(zmq.PULL)
     continuation_socket.bind(sutils.BIND_ADDR_TEMPLATE %
                              (sutils.CONTINUATION_PORT))
 
+    hedge_socket = context.socket(zmq.PULL)
+    hedge_socket.bind(sutils.BIND_ADDR_TEMPLATE % (sutils.HEDGE_PORT))
+
+    load_socket = context.socket(zmq.PULL)
+    load_socket.bind(sutils.BIND_ADDR_TEMPLATE % (sutils.LOAD_PORT))
+
     if not local:
         management_request_socket = context.socket(zmq.REQ)
         management_request_socket.setsockopt(zmq.RCVTIMEO, 500)
@@ -161,21 +158,42 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
 
     poller = zmq.Poller()
     poller.register(connect_socket, zmq.POLLIN)
-    poller.register(func_create_socket, zmq.POLLIN)
     poller.register(func_call_socket, zmq.POLLIN)
-    poller.register(dag_create_socket, zmq.POLLIN)
-    poller.register(dag_call_socket, zmq.POLLIN)
-    poller.register(dag_delete_socket, zmq.POLLIN)
     poller.register(list_socket, zmq.POLLIN)
     poller.register(exec_status_socket, zmq.POLLIN)
     poller.register(sched_update_socket, zmq.POLLIN)
     poller.register(continuation_socket, zmq.POLLIN)
+    poller.register(hedge_socket, zmq.POLLIN)
+    poller.register(load_socket, zmq.POLLIN)
+
+    # Slow control operations -- function and DAG creation, which waits on
+    # executors to accept pins, and DAG deletion -- run on their own thread.
+    # The policy engine pins and unpins with that thread's sockets.
+    control = ControlThread(context, route_addr, ip, local, dags,
+                            call_frequency, metadata_lock)
 
     # Start the policy engine.
-    policy = DefaultCloudburstSchedulerPolicy(pin_accept_socket, pusher_cache,
-                                           kvs, ip, policy_type, local=local)
+    policy = DefaultCloudburstSchedulerPolicy(control.pin_accept_socket,
+                                              control.pusher_cache, kvs, ip,
+                                              policy_type, local=local,
+                                              batching_conf=batching_conf,
+                                              hedging_conf=hedging_conf)
     policy.update()
 
+    # DAG calls are served by a pool of worker threads that share the policy
+    # engine with this thread.
+    admission = AdmissionController(admission_conf)
+    workers = DagCallWorkers(context, max(dag_call_threads, 1), dags, policy,
+                             admission)
+
+    # The replica controller is only enabled if it is configured.
+    autoscaler = None
+    if autoscaling_conf is not None:
+        autoscaler = ReplicaController(policy, autoscaling_conf)
+
+    control.start(policy, autoscaler)
+    workers.start()
+
     start = time.time()
 
     while True:
@@ -192,16 +210,6 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
             event_occupancy['connect'] += elapsed
             total_occupancy += elapsed
 
-        if (func_create_socket in socks and
-                socks[func_create_socket] == zmq.POLLIN):
-            work_start = time.time()
-            
-            create_function(func_create_socket, kvs)
-
-            elapsed = time.time() - work_start
-            event_occupancy['func_create'] += elapsed
-            total_occupancy += elapsed
-
         if func_call_socket in socks and socks[func_call_socket] == zmq.POLLIN:
             work_start = time.time()
 
@@ -211,66 +219,6 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
             event_occupancy['func_call'] += elapsed
             total_occupancy += elapsed
 
-        if (dag_create_socket in socks and socks[dag_create_socket]
-                == zmq.POLLIN):
-            work_start = time.time()
-
-            create_dag(dag_create_socket, pusher_cache, kvs, dags, policy,
-                       call_frequency)
-            
-            elapsed = time.time() - work_start
-            event_occupancy['dag_create'] += elapsed
-            total_occupancy += elapsed
-
-        if dag_call_socket in socks and socks[dag_call_socket] == zmq.POLLIN:
-            work_start = time.time()
-            call = DagCall()
-            call.ParseFromString(dag_call_socket.recv())
-
-            name = call.name
-
-            t = time.time()
-            if name in last_arrivals:
-                if name not in interarrivals:
-                    interarrivals[name] = []
-
-                interarrivals[name].append(t - last_arrivals[name])
-
-            last_arrivals[name] = t
-
-            if name not in dags:
-                resp = GenericResponse()
-                resp.success = False
-                resp.error = NO_SUCH_DAG
-
-                dag_call_socket.send(resp.SerializeToString())
-                continue
-
-            dag = dags[name]
-            for fname in dag[0].functions:
-                call_frequency[fname.name] += 1
-
-            response = call_dag(call, pusher_cache, dags, policy)
-            dag_call_socket.send(response.SerializeToString())
-
-            elapsed = time.time() - work_start
-            event_occupancy['dag_call'] += elapsed
-            total_occupancy += elapsed
-
-            if name not in dag_process_times:
-                dag_process_times[name] = []
-            dag_process_times[name].append(elapsed)
-
-        if (dag_delete_socket in socks and socks[dag_delete_socket] ==
-                zmq.POLLIN):
-            work_start = time.time()
-
-            delete_dag(dag_delete_socket, dags, policy, call_frequency)
-
-            elapsed = time.time() - work_start
-            event_occupancy['dag_delete'] += elapsed
-            total_occupancy += elapsed
-
         if list_socket in socks and socks[list_socket] == zmq.POLLIN:
             work_start = time.time()
 
@@ -294,6 +242,8 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
             status.ParseFromString(exec_status_socket.recv())
 
             policy.process_status(status)
+            if autoscaler:
+                autoscaler.process_status(status)
 
             elapsed = time.time() - work_start
             event_occupancy['exec_status'] += elapsed
@@ -310,17 +260,27 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
             # do not yet know about.
             for dname in status.dags:
                 if dname not in dags:
-                    payload = kvs.get(dname)
-                    while None in payload:
-                        payload = kvs.get(dname)
+                    # The DAG might not have propagated through the KVS yet.
+                    # Rather than block this loop, we give up after a short
+                    # wait; the next gossip message will try again.
+                    try:
+                        payload = wait_for(lambda: kvs.get(dname),
+                                           lambda p: p[dname] is not None,
+                                           timeout=DAG_FETCH_TIMEOUT)
+                    except TimeoutError:
+                        logging.info('DAG %s not yet in the KVS.' % (dname))
+                        continue
 
                     dag = Dag()
                     dag.ParseFromString(payload[dname].reveal())
-                    dags[dag.name] = (dag, sched_utils.find_dag_source(dag))
 
-                    for fname in dag.functions:
-                        if fname.name not in call_frequency:
-                            call_frequency[fname.name] = 0
+                    with metadata_lock:
+                        dags[dag.name] = (dag,
+                                          sched_utils.find_dag_source(dag))
+
+                        for fname in dag.functions:
+                            if fname.name not in call_frequency:
+                                call_frequency[fname.name] = 0
 
             policy.update_function_locations(status.function_locations)
 
@@ -347,13 +307,46 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
 
             call_dag(call, pusher_cache, dags, policy, continuation.id)
 
-            for fname in dag.functions:
-                call_frequency[fname.name] += 1
+            with metadata_lock:
+                for fname in dag.functions:
+                    if fname.name in call_frequency:
+                        call_frequency[fname.name] += 1
 
             elapsed = time.time() - work_start
             event_occupancy['continuation'] += elapsed
             total_occupancy += elapsed
 
+        if hedge_socket in socks and socks[hedge_socket] == zmq.POLLIN:
+            work_start = time.time()
+
+            hedge_dag_function(hedge_socket, pusher_cache, policy)
+
+            elapsed = time.time() - work_start
+            event_occupancy['hedge'] += elapsed
+            total_occupancy += elapsed
+
+        if load_socket in socks and socks[load_socket] == zmq.POLLIN:
+            work_start = time.time()
+
+            # Executors send load updates every few milliseconds when busy,
+            # so we apply all of the ones that are waiting at once.
+            while True:
+                try:
+                    msg = load_socket.recv(zmq.DONTWAIT)
+                except zmq.ZMQError as e:
+                    if e.errno == zmq.EAGAIN:
+                        break
+                    else:
+                        raise e
+
+                load = ExecutorLoad()
+                load.ParseFromString(msg)
+                policy.process_load(load)
+
+            elapsed = time.time() - work_start
+            event_occupancy['load'] += elapsed
+            total_occupancy += elapsed
+
         end = time.time()
 
         if end - start > METADATA_THRESHOLD:
@@ -369,12 +362,34 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
                     schedulers = latest_schedulers
 
         if end - start > REPORT_THRESHOLD:
+            # Gather what the DAG call workers and the control thread saw in
+            # this period. Their occupancy is summed over threads, so it is
+            # not counted towards this thread's.
+            interarrivals = {}
+            dag_process_times = {}
+            for thread_stats in workers.stats + [control.stats]:
+                occupancy, counts, arrivals, process_times = \
+                    thread_stats.collect()
+
+                for event in occupancy:
+                    event_occupancy[event] += occupancy[event]
+
+                with metadata_lock:
+                    for fname in counts:
+                        if fname in call_frequency:
+                            call_frequency[fname] += counts[fname]
+
+                sched_utils.merge_histograms(interarrivals, arrivals)
+                sched_utils.merge_histograms(dag_process_times, process_times)
+
             status = SchedulerStatus()
-            for name in dags.keys():
-                status.dags.append(name)
+            with metadata_lock:
+                for name in dags.keys():
+                    status.dags.append(name)
 
-            for fname in policy.function_locations:
-                for loc in policy.function_locations[fname]:
+            # The control thread may pin functions while we read these.
+            for fname, locations in list(policy.function_locations.items()):
+                for loc in locations:
                     floc = status.function_locations.add()
                     floc.name = fname
                     floc.ip = loc[0]
@@ -390,14 +405,21 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
                     sckt.send(msg)
 
             stats = ExecutorStatistics()
-            for fname in call_frequency:
-                fstats = stats.functions.add()
-                fstats.name = fname
-                fstats.call_count = call_frequency[fname]
-                logging.info('Reporting %d calls for function %s.' %
-                             (call_frequency[fname], fname))
-
-                call_frequency[fname] = 0
+            call_counts = {}
+            with metadata_lock:
+                for fname in call_frequency:
+                    call_counts[fname] = call_frequency[fname]
+                    fstats = stats.functions.add()
+                    fstats.name = fname
+                    fstats.call_count = call_frequency[fname]
+                    logging.info('Reporting %d calls for function %s.' %
+                                 (call_frequency[fname], fname))
+
+                    call_frequency[fname] = 0
+
+            admission.report()
+            if autoscaler:
+                autoscaler.record_calls(call_counts, end - start)
 
             sched_utils.print_scheduler_stats(interarrivals, log=True, msg='Scheduler DAG interarrival stats:')
             sched_utils.print_scheduler_stats(dag_process_times, log=True, msg='Scheduler DAG process time stats:')
@@ -406,12 +428,12 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
                 dstats = stats.dags.add()
                 dstats.name = dname
                 dstats.call_count = len(interarrivals[dname]) + 1
-                dstats.interarrival.extend(interarrivals[dname])
-
-                interarrivals[dname].clear()
+                interarrivals[dname].to_proto(dstats.interarrival_histogram)
 
-            for dname in dag_process_times:
-                dag_process_times[dname].clear()
+                # Older management servers still read the raw interarrivals,
+                # so we send them a bounded sample.
+                dstats.interarrival.extend(
+                    interarrivals[dname].values(legacy_samples))
 
             # We only attempt to send the statistics if we are running in
             # cluster mode. If we are running in local mode, we write them to
@@ -423,7 +445,7 @@ def scheduler(ip, mgmt_ip, user_states, route_addr, policy_type):
 
             utilization = total_occupancy / (end - start)
 
-            logging.info('Total thread occupancy: %.6f' % (utilization))
+            logging.info('Total main thread occupancy: %.6f' % (utilization))
 
             for event in event_occupancy:
                 occ = event_occupancy[event] / (end - start)
@@ -445,4 +467,9 @@ if __name__ == '__main__':
     sched_conf = conf['scheduler']
 
     scheduler(conf['ip'], conf['mgmt_ip'], conf['user_states'], sched_conf['routing_address'],
-              sched_conf['policy'])
+              sched_conf['policy'], sched_conf.get('batching'),
+              sched_conf.get('hedging'),
+              sched_conf.get('dag_call_threads', DEFAULT_DAG_CALL_THREADS),
+              sched_conf.get('admission'), sched_conf.get('autoscaling'),
+              int(sched_conf.get('legacy_stats_samples',
+                                 DEFAULT_LEGACY_SAMPLES)))
@@ -13,7 +13,6 @@
 #  limitations under the License.
 
 import logging
-import numpy as np
 import zmq
 
 from anna.lattices import SetLattice
@@ -30,6 +29,10 @@ SCHEDULERS_PORT = 7004
 
 unit_dict = {'s': 1, 'ms': 1000, 'us': 1000000}
 
+# A map from each DAG's name to the Dag object we last computed a version for
+# and that version.
+_dag_versions = {}
+
 def get_func_list(client, prefix, fullname=False):
     funcs = client.get(FUNCOBJ)[FUNCOBJ]
     if not funcs:
@@ -75,6 +78,10 @@ def get_queue_address(ip, tid):
     return 'tcp://' + ip + ':' + str(sutils.DAG_QUEUE_PORT + int(tid))
 
 
+def get_compact_queue_address(ip, tid):
+    return 'tcp://' + ip + ':' + str(sutils.COMPACT_DAG_QUEUE_PORT + int(tid))
+
+
 def get_scheduler_list_address(mgmt_ip):
     return 'tcp://' + mgmt_ip + ':' + str(SCHEDULERS_PORT)
 
@@ -83,6 +90,18 @@ def get_scheduler_update_address(ip):
     return 'tcp://' + ip + ':' + str(sutils.SCHED_UPDATE_PORT)
 
 
+def get_cached_dag_version(dag):
+    '''
+    Returns the DAG's version, only hashing each DAG we have registered once.
+    '''
+    cached = _dag_versions.get(dag.name)
+    if cached is None or cached[0] is not dag:
+        cached = (dag, sutils.get_dag_version(dag))
+        _dag_versions[dag.name] = cached
+
+    return cached[1]
+
+
 def get_ip_set(management_request_socket, exec_threads=True):
     # we can send an empty request because the response is always the same
     management_request_socket.send(b'')
@@ -118,6 +137,17 @@ def find_dag_source(dag):
 
     return funcs
 
+
+def merge_histograms(histograms, other):
+    '''
+    Merges a map from names to LatencyHistograms into another such map.
+    '''
+    for name in other:
+        if name in histograms:
+            histograms[name].merge(other[name])
+        else:
+            histograms[name] = other[name]
+
 def print_scheduler_stats(data, unit='ms', log=False, msg=None):
     if msg:
         if log:
@@ -125,24 +155,24 @@ def print_scheduler_stats(data, unit='ms', log=False, msg=None):
         else:
             print(msg)
 
+    # Each value in data is a LatencyHistogram, so percentiles are read off
+    # of its buckets rather than computed over every sample.
     for k, v in data.items():
-        assert(type(v) == list)
         if len(v) == 0:
             continue
         # Amplify according to unit
-        npv = [x * unit_dict[unit] for x in v]
-        npdata = np.array(npv)
-        mean = np.mean(npdata)
-        median = np.percentile(npdata, 50)
-        p75 = np.percentile(npdata, 75)
-        p95 = np.percentile(npdata, 95)
-        p99 = np.percentile(npdata, 99)
-        mx = np.max(npdata)
-
-        p25 = np.percentile(npdata, 25)
-        p05 = np.percentile(npdata, 5)
-        p01 = np.percentile(npdata, 1)
-        mn = np.min(npdata)
+        scale = unit_dict[unit]
+        mean = v.mean() * scale
+        median = v.quantile(0.5) * scale
+        p75 = v.quantile(0.75) * scale
+        p95 = v.quantile(0.95) * scale
+        p99 = v.quantile(0.99) * scale
+        mx = v.max * scale
+
+        p25 = v.quantile(0.25) * scale
+        p05 = v.quantile(0.05) * scale
+        p01 = v.quantile(0.01) * scale
+        mn = v.min * scale
 
         output = ('DAG %s:\n\tsample size: %d\n' +
               '\tTime unit: %s\n'
@@ -150,7 +180,7 @@ def print_scheduler_stats(data, unit='ms', log=False, msg=None):
               '\tmin/max: (%.3f, %.3f)\n' +
               '\tp25/p75: (%.3f, %.3f)\n' +
               '\tp5/p95: (%.3f, %.3f)\n' +
-              '\tp1/p99: (%.3f, %.3f)') % (k, len(npdata), unit, mean,
+              '\tp1/p99: (%.3f, %.3f)') % (k, len(v), unit, mean,
                                            median, mn, mx, p25, p75, p05, p95,
                                            p01, p99)
         
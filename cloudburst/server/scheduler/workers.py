@@ -0,0 +1,341 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import threading
+import time
+
+from anna.client import AnnaTcpClient
+from anna.zmq_util import SocketCache
+import zmq
+
+from cloudburst.server.scheduler.call import call_dag
+from cloudburst.server.scheduler.create import (
+    create_dag,
+    create_function,
+    delete_dag
+)
+import cloudburst.server.utils as sutils
+from cloudburst.shared.histogram import LatencyHistogram
+from cloudburst.shared.proto.cloudburst_pb2 import (
+    DagCall,
+    GenericResponse,
+    NO_SUCH_DAG  # Cloudburst's error types
+)
+from cloudburst.shared.utils import (
+    DAG_CALL_PORT,
+    DAG_CREATE_PORT,
+    DAG_DELETE_PORT,
+    FUNC_CREATE_PORT,
+    OVERLOADED
+)
+
+DAG_CALL_BACKEND_ADDR = 'inproc://dag_call_workers'
+
+# The control thread has its own KVS client, whose response ports are offset
+# from those of the scheduler's main thread. In local mode, every component
+# runs on one host, so the offset must not collide with any other client's:
+# the scheduler's main thread uses 0, the executor's poll loop 1, clients
+# 10 plus their thread ID, and executor worker threads 100 and up (see
+# cloudburst/server/executor/workers.py).
+CONTROL_KVS_OFFSET = 50
+
+# How long the control thread waits for the next answer to its outstanding
+# pins before it gives up on them.
+PIN_ACCEPT_TIMEOUT = 10000  # 10 seconds.
+
+# How often the control thread checks whether the replica controller has new
+# targets to act on.
+SCALE_POLL_INTERVAL = 1000  # 1 second.
+
+
+class ThreadStats():
+    '''
+    The statistics one scheduler thread gathers over a reporting period. Only
+    the owning thread records into it and the main thread collects it when it
+    reports, so its lock is never contended on the request path.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset()
+
+    def add_occupancy(self, event, elapsed):
+        with self.lock:
+            self.occupancy[event] = self.occupancy.get(event, 0.0) + elapsed
+
+    def record_call(self, dag, interarrival, elapsed):
+        with self.lock:
+            self.occupancy['dag_call'] = self.occupancy.get('dag_call', 0.0) \
+                + elapsed
+
+            for fref in dag.functions:
+                self.call_counts[fref.name] = \
+                    self.call_counts.get(fref.name, 0) + 1
+
+            if interarrival is not None:
+                if dag.name not in self.interarrivals:
+                    self.interarrivals[dag.name] = LatencyHistogram()
+                self.interarrivals[dag.name].add(interarrival)
+
+            if dag.name not in self.process_times:
+                self.process_times[dag.name] = LatencyHistogram()
+            self.process_times[dag.name].add(elapsed)
+
+    def collect(self):
+        '''
+        Returns the occupancy, call counts, interarrivals and process times
+        recorded since the last collection, and starts a new period.
+        '''
+        with self.lock:
+            result = (self.occupancy, self.call_counts, self.interarrivals,
+                      self.process_times)
+            self._reset()
+
+        return result
+
+    def _reset(self):
+        self.occupancy = {}
+        self.call_counts = {}
+        self.interarrivals = {}
+        self.process_times = {}
+
+
+class DagCallWorkers():
+    '''
+    Serves DAG calls on a pool of threads rather than on the scheduler's poll
+    loop. A proxy thread fans calls arriving on the DAG call port out to the
+    workers, each of which picks executors and sends out schedules with its
+    own sockets. Workers share the scheduler's DAG map and policy engine; they
+    only read the DAG map, and the policy is written so that picking
+    executors is safe alongside the main thread's metadata updates. Calls
+    that the admission controller sheds are answered with OVERLOADED.
+    '''
+
+    def __init__(self, context, num_workers, dags, policy, admission):
+        self.context = context
+        self.dags = dags
+        self.policy = policy
+        self.admission = admission
+
+        # The most recent arrival of each DAG, shared by all workers so that
+        # interarrival times cover every call, not just one worker's.
+        self.last_arrivals = {}
+
+        self.stats = [ThreadStats() for _ in range(num_workers)]
+
+        frontend = context.socket(zmq.ROUTER)
+        frontend.bind(sutils.BIND_ADDR_TEMPLATE % (DAG_CALL_PORT))
+
+        backend = context.socket(zmq.DEALER)
+        backend.bind(DAG_CALL_BACKEND_ADDR)
+
+        self.threads = [threading.Thread(target=zmq.proxy,
+                                         args=(frontend, backend),
+                                         daemon=True)]
+        for stats in self.stats:
+            self.threads.append(threading.Thread(target=self._run,
+                                                 args=(stats,), daemon=True))
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self, stats):
+        socket = self.context.socket(zmq.REP)
+        socket.connect(DAG_CALL_BACKEND_ADDR)
+
+        pusher_cache = SocketCache(self.context, zmq.PUSH)
+
+        while True:
+            call = DagCall()
+            call.ParseFromString(socket.recv())
+            work_start = time.time()
+
+            try:
+                response = self._call(call, pusher_cache, stats, work_start)
+            except Exception as e:
+                logging.exception('Unexpected error %s while calling DAG %s.'
+                                  % (str(e), call.name))
+                response = GenericResponse()
+                response.success = False
+
+            socket.send(response.SerializeToString())
+
+    def _call(self, call, pusher_cache, stats, work_start):
+        name = call.name
+
+        previous = self.last_arrivals.get(name)
+        self.last_arrivals[name] = work_start
+
+        if name not in self.dags:
+            response = GenericResponse()
+            response.success = False
+            response.error = NO_SUCH_DAG
+            return response
+
+        dag = self.dags[name][0]
+        if not self.admission.admit(dag, self.policy):
+            response = GenericResponse()
+            response.success = False
+            response.error = OVERLOADED
+            return response
+
+        response = call_dag(call, pusher_cache, self.dags, self.policy)
+
+        interarrival = None
+        if previous is not None:
+            interarrival = work_start - previous
+
+        stats.record_call(dag, interarrival, time.time() - work_start)
+        return response
+
+
+class ControlThread():
+    '''
+    Handles the scheduler's slow control operations -- creating functions,
+    and creating and deleting DAGs -- on their own thread, so that waiting on
+    executors to accept pins does not hold up DAG calls or status updates.
+    The thread owns the socket on which pins are accepted and the socket
+    cache the policy engine sends pins and unpins with, so the replica
+    controller, if there is one, also pins and unpins replicas here. Changes
+    to the scheduler's DAG and call frequency maps are made under
+    metadata_lock.
+    '''
+
+    def __init__(self, context, kvs_addr, ip, local, dags, call_frequency,
+                 metadata_lock):
+        self.context = context
+        self.dags = dags
+        self.call_frequency = call_frequency
+        self.metadata_lock = metadata_lock
+        self.stats = ThreadStats()
+
+        self.kvs = AnnaTcpClient(kvs_addr, ip, local=local,
+                                 offset=CONTROL_KVS_OFFSET)
+
+        self.pin_accept_socket = context.socket(zmq.PULL)
+        self.pin_accept_socket.setsockopt(zmq.RCVTIMEO, PIN_ACCEPT_TIMEOUT)
+        self.pin_accept_socket.bind(sutils.BIND_ADDR_TEMPLATE %
+                                    (sutils.PIN_ACCEPT_PORT))
+
+        self.pusher_cache = SocketCache(context, zmq.PUSH)
+
+        self.policy = None
+        self.autoscaler = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self, policy, autoscaler=None):
+        self.policy = policy
+        self.autoscaler = autoscaler
+        self.thread.start()
+
+    def _run(self):
+        func_create_socket = self.context.socket(zmq.REP)
+        func_create_socket.bind(sutils.BIND_ADDR_TEMPLATE %
+                                (FUNC_CREATE_PORT))
+
+        dag_create_socket = self.context.socket(zmq.REP)
+        dag_create_socket.bind(sutils.BIND_ADDR_TEMPLATE % (DAG_CREATE_PORT))
+
+        dag_delete_socket = self.context.socket(zmq.REP)
+        dag_delete_socket.bind(sutils.BIND_ADDR_TEMPLATE % (DAG_DELETE_PORT))
+
+        poller = zmq.Poller()
+        poller.register(func_create_socket, zmq.POLLIN)
+        poller.register(dag_create_socket, zmq.POLLIN)
+        poller.register(dag_delete_socket, zmq.POLLIN)
+
+        timeout = SCALE_POLL_INTERVAL if self.autoscaler else None
+
+        while True:
+            socks = dict(poller.poll(timeout=timeout))
+
+            if (func_create_socket in socks and
+                    socks[func_create_socket] == zmq.POLLIN):
+                work_start = time.time()
+
+                create_function(func_create_socket, self.kvs)
+
+                self.stats.add_occupancy('func_create',
+                                         time.time() - work_start)
+
+            if (dag_create_socket in socks and
+                    socks[dag_create_socket] == zmq.POLLIN):
+                work_start = time.time()
+
+                # Pinning can take a while, but only this thread waits on it;
+                # the lock only keeps the main thread from reading the
+                # metadata maps while we change them.
+                create_dag(dag_create_socket, self.pusher_cache, self.kvs,
+                           _LockedDict(self.dags, self.metadata_lock),
+                           self.policy,
+                           _LockedDict(self.call_frequency,
+                                       self.metadata_lock))
+
+                self.stats.add_occupancy('dag_create',
+                                         time.time() - work_start)
+
+            if (dag_delete_socket in socks and
+                    socks[dag_delete_socket] == zmq.POLLIN):
+                work_start = time.time()
+
+                delete_dag(dag_delete_socket,
+                           _LockedDict(self.dags, self.metadata_lock),
+                           self.policy,
+                           _LockedDict(self.call_frequency,
+                                       self.metadata_lock))
+
+                self.stats.add_occupancy('dag_delete',
+                                         time.time() - work_start)
+
+            if self.autoscaler:
+                work_start = time.time()
+
+                with self.metadata_lock:
+                    function_refs = {}
+                    for dag, _ in self.dags.values():
+                        for fref in dag.functions:
+                            function_refs[fref.name] = fref
+
+                self.autoscaler.scale(function_refs)
+
+                self.stats.add_occupancy('autoscale',
+                                         time.time() - work_start)
+
+
+class _LockedDict():
+    '''
+    A view of a dict whose updates are made while holding a lock, so the
+    create and delete handlers can be used unchanged from the control thread.
+    Reads do not take the lock.
+    '''
+
+    def __init__(self, data, lock):
+        self.data = data
+        self.lock = lock
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.data[key] = value
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.data[key]
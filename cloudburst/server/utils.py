@@ -12,6 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import hashlib
 import time
 
 from anna.lattices import VectorClock, MaxIntLattice
@@ -28,12 +29,15 @@ FUNC_EXEC_PORT = 4020
 DAG_QUEUE_PORT = 4030
 DAG_EXEC_PORT = 4040
 SELF_DEPART_PORT = 4050
+COMPACT_DAG_QUEUE_PORT = 4060
 
 STATUS_PORT = 5007
 SCHED_UPDATE_PORT = 5008
 BACKOFF_PORT = 5009
 PIN_ACCEPT_PORT = 5010
 CONTINUATION_PORT = 5011
+HEDGE_PORT = 5012
+LOAD_PORT = 5013
 
 # For message sending via the user library.
 RECV_INBOX_PORT = 5500
@@ -74,6 +78,14 @@ def get_pin_accept_port(ip):
     return 'tcp://' + ip + ':' + str(PIN_ACCEPT_PORT)
 
 
+def get_hedge_address(ip):
+    return 'tcp://' + ip + ':' + str(HEDGE_PORT)
+
+
+def get_load_address(ip):
+    return 'tcp://' + ip + ':' + str(LOAD_PORT)
+
+
 def get_dag_predecessors(dag, fname):
     result = []
 
@@ -84,6 +96,14 @@ def get_dag_predecessors(dag, fname):
     return result
 
 
+def get_dag_version(dag):
+    '''
+    A digest of a DAG's definition, used to tell apart DAGs that are deleted
+    and registered again under the same name.
+    '''
+    return hashlib.sha1(dag.SerializeToString(deterministic=True)).hexdigest()
+
+
 def get_user_msg_inbox_addr(ip, tid):
     return 'tcp://' + ip + ':' + str(int(tid) + RECV_INBOX_PORT)
 
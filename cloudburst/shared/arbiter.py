@@ -2,6 +2,7 @@ import ast
 import inspect
 import textwrap
 import logging
+import threading
 import time
 import cloudburst.shared.ast_analyzer as ast_analyzer
 from cloudburst.shared.ast_analyzer import FALLBACK_IDENTIFIER
@@ -22,7 +23,10 @@ def calc_shredder_expectation():
     return 0.001
 
 class Arbiter:
-    ## Assume only one function pinned to executor
+    ## Assume only one function pinned to executor. With executor worker
+    ## threads, several calls of it run at once: each call's start time and
+    ## expectation are kept per thread, and what we learn across calls is
+    ## guarded by a lock.
     def __init__(self):
         # Func meta
         self.func = None
@@ -31,7 +35,8 @@ class Arbiter:
         self.func_args = None
         self.RPN_str = None
         # Profile
-        self.exec_start_time = time.time()  ## There's no parallel execution
+        self.lock = threading.Lock()
+        self.calls = threading.local()
         self.expect_fail_count = 0
         self.feedback_exec_times = 0
         self.expectation = None
@@ -40,6 +45,11 @@ class Arbiter:
         self.compare_latencies = { ANNA_CLIENT_NAME: [], SHREDDER_CLIENT_NAME: [] }
         self.compare_decision = None
     
+    def reset(self):
+        # Forget the bound function and everything we learned about it, so
+        # that the executor can bind another function without restarting.
+        self.__init__()
+
     def reset_fallback(self):
         self.fallback_flag = True
         self.compare_decision = None
@@ -72,12 +82,15 @@ class Arbiter:
             return None
         
     def exec_start(self):
-        self.exec_start_time = time.time()
+        self.calls.start_time = time.time()
+        self.calls.expectation = None
     
     def exec_end(self):
-        elapsed = time.time() - self.exec_start_time
-        if self.expectation:
-            self.feedback(elapsed)
+        elapsed = time.time() - self.calls.start_time
+        expectation = getattr(self.calls, 'expectation', None)
+        if expectation:
+            with self.lock:
+                self.feedback(elapsed, expectation)
         return elapsed
     
     # According to args, choose client & calc expectation
@@ -87,6 +100,15 @@ class Arbiter:
             logging.info(f'Arbiter returns original args')
             return args
         
+        with self.lock:
+            final_args = self._choose_client(args)
+
+            # This call's expectation, for the feedback once it finishes.
+            self.calls.expectation = self.expectation
+
+        return final_args
+
+    def _choose_client(self, args):
         # overhead_start = time.time()
         
         # assert len(args) == len(self.func_args) + 1, f'Final_arg len: {len(args)}, Func_arg len: {len(self.func_args)}'
@@ -145,15 +167,18 @@ class Arbiter:
         else:
             return SHREDDER_CLIENT_NAME, shredder_median
     
-    def feedback(self, elapsed):
+    def feedback(self, elapsed, expectation):
         if self.fallback_flag and not self.compare_decision:
-            # Fallback comparing
-            self.compare_latencies[self.current_compare_client()].append(elapsed)
+            # Fallback comparing; calls that were running while we collected
+            # the last latency we needed are not counted.
+            cur_client = self.current_compare_client()
+            if cur_client:
+                self.compare_latencies[cur_client].append(elapsed)
             return
         
         # Normal case, we already has expectation for every execution
         self.feedback_exec_times += 1
-        if elapsed > EXPECTATION_UPPER_BOUND * self.expectation:
+        if elapsed > EXPECTATION_UPPER_BOUND * expectation:
             self.expect_fail_count += 1
             # logging.info(f'Latency beyond expectation, elapsed {elapsed}, expectation {self.expectation}')
             # Feedback verification
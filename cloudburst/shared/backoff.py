@@ -0,0 +1,78 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import random
+import time
+
+# The first retry waits about a millisecond, and the wait doubles on every
+# retry until it reaches 100 milliseconds, so a waiter issues at most a few
+# dozen requests per second once it has been waiting for a while.
+INITIAL_DELAY = 0.001
+MAX_DELAY = 0.1
+MULTIPLIER = 2
+
+
+def is_present(result):
+    return result is not None
+
+
+def all_present(kv_pairs):
+    return None not in kv_pairs.values()
+
+
+def jittered_delays(initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY):
+    '''
+    Yields an endless sequence of delays that double from initial_delay up to
+    max_delay, each with jitter, for callers that retry on their own.
+    '''
+    delay = initial_delay
+    while True:
+        yield delay * random.uniform(0.5, 1.0)
+        delay = min(delay * MULTIPLIER, max_delay)
+
+
+def wait_for(fetch, ready=is_present, timeout=None,
+             initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY):
+    '''
+    Calls fetch() until ready() returns True for its result, and returns that
+    result. The first call happens immediately; after that, retries back off
+    exponentially (with jitter, so that many waiters do not retry in lockstep)
+    up to max_delay between calls.
+
+    fetch: A function with no arguments, typically a KVS request.
+    ready: A function which takes fetch's result and decides whether we are
+    done waiting. By default, we wait for a result that is not None.
+    timeout: The number of seconds after which we give up and raise a
+    TimeoutError. If None, we wait indefinitely.
+    '''
+    if timeout is not None:
+        deadline = time.time() + timeout
+
+    delay = initial_delay
+    result = fetch()
+
+    while not ready(result):
+        sleep = delay * random.uniform(0.5, 1.0)
+        if timeout is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError('Gave up waiting after %.3f seconds.' %
+                                   (timeout))
+            sleep = min(sleep, remaining)
+
+        time.sleep(sleep)
+        delay = min(delay * MULTIPLIER, max_delay)
+        result = fetch()
+
+    return result
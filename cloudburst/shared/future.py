@@ -13,16 +13,22 @@
 #  limitations under the License.
 
 
+from cloudburst.shared.backoff import wait_for
+
+
 class CloudburstFuture():
     def __init__(self, obj_id, kvs_client, serializer):
         self.obj_id = obj_id
         self.kvs_client = kvs_client
         self.serializer = serializer
 
-    def get(self):
-        obj = self.kvs_client.get(self.obj_id)
-
-        while obj is None:
-            obj = self.kvs_client.get(self.obj_id)
+    def get(self, timeout=None):
+        '''
+        Blocks until the result is in the KVS and returns it. If timeout (in
+        seconds) is set and the result is still missing when it expires, a
+        TimeoutError is raised.
+        '''
+        obj = wait_for(lambda: self.kvs_client.get(self.obj_id),
+                       timeout=timeout)
 
         return self.serializer.load_lattice(obj)
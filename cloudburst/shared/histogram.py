@@ -0,0 +1,209 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import math
+
+# Quantiles are reported to within 1% of the true value.
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# Values at or below this (in seconds) are all counted as zero.
+MIN_VALUE = 1e-9
+
+# The most buckets we keep; past this, the lowest buckets are merged. At 1%
+# accuracy, this covers nine orders of magnitude without merging anything.
+MAX_BUCKETS = 2048
+
+# The most values we put in each of the deprecated raw-list fields of a
+# statistics report, which only old readers still use. 0 leaves them empty.
+DEFAULT_LEGACY_SAMPLES = 100
+
+
+class LatencyHistogram():
+    '''
+    A mergeable histogram of non-negative values, such as latencies, with
+    logarithmically sized buckets (as in DDSketch). Each bucket covers a range
+    of values whose ends are within a constant factor of each other, so any
+    quantile we report is within relative_accuracy of the true one. Memory is
+    bounded by MAX_BUCKETS regardless of how many values are added, and two
+    histograms with the same accuracy can be merged by adding their buckets.
+    '''
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        self.clear()
+
+    def clear(self):
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        if value <= MIN_VALUE:
+            self.zero_count += 1
+        else:
+            index = math.ceil(math.log(value) / self.log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + 1
+
+            if len(self.buckets) > MAX_BUCKETS:
+                self._collapse()
+
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge histograms with different ' +
+                             'accuracies.')
+
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+        if len(self.buckets) > MAX_BUCKETS:
+            self._collapse()
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        if self.count == 0:
+            return 0.0
+
+        return self.sum / self.count
+
+    def quantile(self, q):
+        '''
+        Returns an estimate of the qth quantile (0 <= q <= 1), or 0 if the
+        histogram is empty.
+        '''
+        if self.count == 0:
+            return 0.0
+
+        # The extremes are tracked exactly.
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return self._bucket_value(index)
+
+        return self.max
+
+    def values(self, limit=None):
+        '''
+        Returns a list of values, in ascending order, that follows the
+        distribution of the values added: one per value added, or, if there
+        were more than limit, limit values at evenly spaced ranks. Each is
+        within relative_accuracy of the value it stands for. This is for
+        readers of the raw lists that the histograms replaced.
+        '''
+        if limit is None or self.count <= limit:
+            ranks = range(self.count)
+        elif limit <= 0:
+            return []
+        elif limit == 1:
+            ranks = [(self.count - 1) // 2]
+        else:
+            ranks = [round(i * (self.count - 1) / (limit - 1)) for i in
+                     range(limit)]
+
+        result = []
+        ranks = iter(ranks)
+        rank = next(ranks, None)
+
+        seen = self.zero_count
+        while rank is not None and rank < seen:
+            result.append(max(self.min, 0.0))
+            rank = next(ranks, None)
+
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            while rank is not None and rank < seen:
+                result.append(self._bucket_value(index))
+                rank = next(ranks, None)
+
+        return result
+
+    def to_proto(self, histogram):
+        '''
+        Fills in a Histogram protobuf. The buckets are sent as a dense array
+        of counts starting at the lowest occupied bucket.
+        '''
+        histogram.relative_accuracy = self.relative_accuracy
+        histogram.count = self.count
+        histogram.sum = self.sum
+        histogram.zero_count = self.zero_count
+
+        if self.count > 0:
+            histogram.min = self.min
+            histogram.max = self.max
+
+        if len(self.buckets) > 0:
+            offset = min(self.buckets)
+            histogram.offset = offset
+            histogram.counts.extend([self.buckets.get(index, 0) for index in
+                                     range(offset, max(self.buckets) + 1)])
+
+    @staticmethod
+    def from_proto(histogram):
+        result = LatencyHistogram(histogram.relative_accuracy)
+        result.count = histogram.count
+        result.sum = histogram.sum
+        result.zero_count = histogram.zero_count
+
+        if histogram.count > 0:
+            result.min = histogram.min
+            result.max = histogram.max
+
+        for idx, count in enumerate(histogram.counts):
+            if count > 0:
+                result.buckets[histogram.offset + idx] = count
+
+        return result
+
+    def _bucket_value(self, index):
+        # The midpoint of the bucket (in relative terms).
+        value = 2 * self.gamma ** index / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def _collapse(self):
+        # Fold the lowest buckets into the lowest bucket we keep, which only
+        # loses accuracy for the smallest values.
+        indices = sorted(self.buckets)
+        excess = indices[:len(indices) - MAX_BUCKETS]
+        target = indices[len(excess)]
+
+        for index in excess:
+            self.buckets[target] += self.buckets.pop(index)
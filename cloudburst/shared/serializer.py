@@ -34,6 +34,10 @@ from cloudburst.shared.proto.cloudburst_pb2 import (
 from cloudburst.shared.reference import CloudburstReference
 import cloudburst.shared.future as future
 
+# A pickled CloudburstReference always names its class, so an argument whose
+# serialized body does not contain this cannot hold a reference.
+_REFERENCE_MARKER = CloudburstReference.__name__.encode()
+
 
 class Serializer():
     def __init__(self, string_format='raw_unicode_escape'):
@@ -177,3 +181,28 @@ class Serializer():
             return msg
 
         return pa.deserialize(msg)
+
+
+def get_references(args):
+    '''
+    Returns the CloudburstReferences in args, a list of Value protobufs,
+    including those nested in tuples of arguments. Only arguments that can
+    contain references are deserialized: arrays and strings are skipped, as
+    are pickled arguments that do not mention CloudburstReference.
+    '''
+    serializer = Serializer()
+
+    refs = []
+    for arg in args:
+        if arg.type != DEFAULT or _REFERENCE_MARKER not in arg.body:
+            continue
+
+        value = serializer.load(arg)
+
+        # Unnest arguments.
+        if type(value) == tuple:
+            refs.extend([v for v in value if type(v) == CloudburstReference])
+        elif type(value) == CloudburstReference:
+            refs.append(value)
+
+    return refs
@@ -33,6 +33,12 @@ DAG_CALL_PORT = 5005
 # The port on which DAG deletion requests are made.
 DAG_DELETE_PORT = 5006
 
+# The CloudburstError a scheduler responds with when it sheds a DAG call
+# because the system is overloaded; clients should retry after backing off.
+# CloudburstError itself is defined in the shared protobufs, which do not have
+# a value for this yet, so we use one well outside of their range.
+OVERLOADED = 100
+
 # The name of the default KVS states client.
 DEFAULT_CLIENT_NAME = 'anna'
 
@@ -93,6 +93,13 @@ if [[ "$ROLE" = "executor" ]]; then
   echo "    scheduler_ips:" >> conf/cloudburst-config.yml
   echo "$LST" >> conf/cloudburst-config.yml
 
+  # The fork server restarts executors itself, and only exits once they have
+  # all departed.
+  if [[ "$EXECUTOR_MODE" = "zygote" ]]; then
+    python3.6 cloudburst/server/executor/zygote.py
+    exit $?
+  fi
+
   while true; do
     python3.6 cloudburst/server/executor/server.py
 
@@ -16,16 +16,30 @@ import sys
 import unittest
 
 from tests.server.executor import (
+    test_batching,
+    test_cache,
     test_call as test_executor_call,
+    test_dag_plan,
+    test_dag_store,
+    test_hedging,
+    test_object_store,
     test_pin,
-    test_user_library
+    test_request_table,
+    test_spill,
+    test_status,
+    test_user_library,
+    test_zygote
 )
 from tests.server.scheduler import (
+    test_admission,
+    test_autoscaler,
     test_call as test_scheduler_call,
-    test_create
+    test_create,
+    test_load,
+    test_workers
 )
 from tests.server.scheduler.policy import test_default_policy
-from tests.shared import test_serializer
+from tests.shared import test_backoff, test_histogram, test_serializer
 
 
 def cloudburst_test_suite():
@@ -35,21 +49,53 @@ def cloudburst_test_suite():
     # Load Cloudburst Executor tests
     cloudburst_tests.append(
         loader.loadTestsFromTestCase(test_executor_call.TestExecutorCall))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_batching.TestAdaptiveBatcher))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_cache.TestReferenceCache))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_dag_plan.TestDagPlan))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_dag_store.TestDagStore))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_hedging.TestHedger))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_object_store.TestNodeObjectStore))
     cloudburst_tests.append(
         loader.loadTestsFromTestCase(test_pin.TestExecutorPin))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_request_table.TestRequestTable))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_spill.TestSpilledResults))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_status.TestStatusReporter))
     cloudburst_tests.append(
         loader.loadTestsFromTestCase(test_user_library.TestUserLibrary))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_zygote.TestZygote))
 
     # Load Cloudburst Scheduler tests
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_admission.TestAdmissionControl))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_autoscaler.TestReplicaController))
     cloudburst_tests.append(
         loader.loadTestsFromTestCase(test_scheduler_call.TestSchedulerCall))
     cloudburst_tests.append(
         loader.loadTestsFromTestCase(test_create.TestSchedulerCreate))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_load.TestSlidingWindowCounter))
+    cloudburst_tests.append(
+        loader.loadTestsFromTestCase(test_workers.TestThreadStats))
     cloudburst_tests.append(
         loader.loadTestsFromTestCase(
             test_default_policy.TestDefaultSchedulerPolicy))
 
     # Load miscellaneous tests
+    cloudburst_tests.append(loader.loadTestsFromTestCase(
+        test_backoff.TestBackoff))
+    cloudburst_tests.append(loader.loadTestsFromTestCase(
+        test_histogram.TestLatencyHistogram))
     cloudburst_tests.append(loader.loadTestsFromTestCase(
         test_serializer.TestSerializer))
 
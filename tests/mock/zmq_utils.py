@@ -14,6 +14,9 @@
 
 from zmq import EAGAIN, ZMQError
 
+from cloudburst.shared.proto.cloudburst_pb2 import GenericResponse
+from cloudburst.shared.proto.internal_pb2 import PinFunction
+
 
 class MockZmqSocket():
     def __init__(self):
@@ -72,3 +75,38 @@ class MockPusherCache():
     def get(self, address):
         self.addresses.append(address)
         return self.socket
+
+
+class MockPinAcceptSocket(MockZmqSocket):
+    '''
+    A mock of the scheduler's pin accept socket, which answers the pin
+    messages sent through a MockPusherCache in the order they were sent. Each
+    entry in the inbox is whether to accept (True) or reject (False) the next
+    pin. Once the inbox is empty, receiving times out.
+    '''
+
+    def __init__(self, pusher_cache):
+        super().__init__()
+        self.pusher_cache = pusher_cache
+        self.answered = 0
+
+    def recv(self):
+        if len(self.inbox) == 0:
+            err = ZMQError()
+            err.errno = EAGAIN
+
+            raise err
+
+        # Pin messages are serialized protobufs; unpin messages are strings.
+        pins = [message for message in self.pusher_cache.socket.outbox if
+                type(message) == bytes]
+
+        pin_msg = PinFunction()
+        pin_msg.ParseFromString(pins[self.answered])
+        self.answered += 1
+
+        response = GenericResponse()
+        response.success = self.inbox.pop(0)
+        response.response_id = pin_msg.request_id
+
+        return response.SerializeToString()
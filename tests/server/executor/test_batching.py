@@ -0,0 +1,112 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from cloudburst.server.executor.batching import AdaptiveBatcher
+
+
+class TestAdaptiveBatcher(unittest.TestCase):
+    '''
+    Tests for the executor's adaptive batcher, ensuring that the batch size
+    and wait window it picks respect the latency SLO.
+    '''
+
+    def test_no_history_runs_immediately(self):
+        '''
+        Ensures that a batcher with no observations does not hold requests.
+        '''
+        batcher = AdaptiveBatcher(max_batch_size=10, latency_slo=1.0)
+        batcher.add('a', [], None, now=0.0)
+
+        self.assertTrue(batcher.ready(now=0.0))
+        keys, _, _ = batcher.take()
+        self.assertEqual(keys, ['a'])
+        self.assertEqual(batcher.deadline(), None)
+
+    def test_batch_sized_by_slo(self):
+        '''
+        Feeds the batcher a steady arrival rate and runtime profile and
+        ensures that it picks the largest batch that fits in the SLO, holding
+        requests until that batch is full.
+        '''
+        batcher = AdaptiveBatcher(max_batch_size=20, latency_slo=0.1)
+
+        # Batches take 10ms plus 5ms per request.
+        batcher.record(1, 0.015)
+        batcher.record(4, 0.03)
+        self.assertAlmostEqual(batcher.estimate(8), 0.05)
+
+        # Requests arrive every 5ms, so a batch of size n takes 5(n - 1)ms to
+        # fill and runs for 10 + 5n ms: n = 9 is the largest that fits.
+        batcher.add('warmup', [], None, now=0.0)
+        batcher.take()
+        for i in range(8):
+            batcher.add(i, [], None, now=0.005 * (i + 1))
+            self.assertFalse(batcher.ready(now=0.005 * (i + 1)))
+
+        self.assertEqual(batcher.target_size, 9)
+        self.assertAlmostEqual(batcher.deadline(), 0.045)
+
+        batcher.add(8, [], None, now=0.045)
+        self.assertTrue(batcher.ready(now=0.045))
+
+        keys, trigger_sets, schedules = batcher.take()
+        self.assertEqual(keys, list(range(9)))
+        self.assertEqual(len(trigger_sets), 9)
+        self.assertEqual(len(schedules), 9)
+
+    def test_deadline_releases_partial_batch(self):
+        '''
+        Ensures that a partial batch is released once its oldest request has
+        waited for the planned window.
+        '''
+        batcher = AdaptiveBatcher(max_batch_size=20, latency_slo=0.1)
+        batcher.record(1, 0.01)
+        batcher.add('a', [], None, now=0.0)
+        batcher.take()
+
+        batcher.add('b', [], None, now=0.01)
+        self.assertTrue(batcher.target_size > 1)
+        self.assertFalse(batcher.ready(now=0.01))
+        self.assertTrue(batcher.ready(now=batcher.deadline()))
+
+    def test_take_respects_max_batch_size(self):
+        '''
+        Ensures that no more than max_batch_size requests are released at once.
+        '''
+        batcher = AdaptiveBatcher(max_batch_size=2)
+        for i in range(5):
+            batcher.add(i, [], None, now=0.0)
+
+        keys, _, _ = batcher.take()
+        self.assertEqual(keys, [0, 1])
+        self.assertEqual(len(batcher.pending), 3)
+
+    def test_leftover_requests_keep_arrival_time(self):
+        '''
+        Ensures that the requests left over after a full batch is taken are
+        released by a deadline based on when they arrived.
+        '''
+        batcher = AdaptiveBatcher(max_batch_size=2, latency_slo=0.1)
+        batcher.record(1, 0.01)
+        batcher.add('warmup', [], None, now=0.0)
+        batcher.take()
+
+        for i in range(3):
+            batcher.add(i, [], None, now=0.01 * (i + 1))
+
+        batcher.take()
+        self.assertEqual(batcher.oldest_arrival, 0.03)
+        self.assertAlmostEqual(batcher.deadline(), 0.03 + batcher.max_wait)
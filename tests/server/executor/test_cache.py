@@ -0,0 +1,217 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+import time
+import unittest
+
+from cloudburst.server.executor.cache import ReferenceCache
+
+
+class TestReferenceCache(unittest.TestCase):
+    '''
+    Tests for the executor's reference cache, ensuring that the memory budget
+    is respected at insert time, that each eviction policy picks the expected
+    victims, and that the reported statistics are accurate.
+    '''
+
+    def test_capacity_enforced_on_insert(self):
+        '''
+        Inserts more bytes than the cache can hold and ensures that entries
+        are evicted immediately rather than on a periodic sweep.
+        '''
+        cache = ReferenceCache(capacity=100, policy='lru')
+
+        for i in range(5):
+            self.assertTrue(cache.put('key%d' % i, i, size=30))
+
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.size, 90)
+        self.assertEqual(cache.evictions, 2)
+
+    def test_oversized_value_not_cached(self):
+        '''
+        Ensures that a value larger than the whole budget is rejected and does
+        not evict anything.
+        '''
+        cache = ReferenceCache(capacity=100, policy='lru')
+        cache.put('small', 1, size=10)
+
+        self.assertFalse(cache.put('large', 2, size=101))
+        self.assertTrue('small' in cache)
+        self.assertFalse('large' in cache)
+
+    def test_lru_keeps_recently_used(self):
+        '''
+        Ensures that a recently read key survives an eviction under LRU.
+        '''
+        cache = ReferenceCache(capacity=30, policy='lru')
+        cache.put('a', 1, size=10)
+        cache.put('b', 2, size=10)
+        cache.put('c', 3, size=10)
+
+        cache.get('a')
+        cache.put('d', 4, size=10)
+
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+
+    def test_lfu_keeps_frequently_used(self):
+        '''
+        Ensures that a hot key survives evictions under LFU even when it is
+        the oldest key in the cache.
+        '''
+        cache = ReferenceCache(capacity=30, policy='lfu')
+        cache.put('hot', 1, size=10)
+        for _ in range(5):
+            cache.get('hot')
+
+        cache.put('b', 2, size=10)
+        cache.put('c', 3, size=10)
+        cache.get('c')
+        cache.put('d', 4, size=10)
+
+        self.assertTrue('hot' in cache)
+        self.assertTrue('c' in cache)
+        self.assertFalse('b' in cache)
+
+    def test_arc_evicts_within_budget(self):
+        '''
+        Runs a mixed workload through the ARC policy and ensures the budget is
+        never exceeded and frequently read keys are retained.
+        '''
+        cache = ReferenceCache(capacity=50, policy='arc')
+        cache.put('hot', 0, size=10)
+        cache.get('hot')
+
+        for i in range(20):
+            cache.put('scan%d' % i, i, size=10)
+            self.assertTrue(cache.size <= 50)
+
+        self.assertTrue('hot' in cache)
+
+    def test_report(self):
+        '''
+        Ensures that the statistics report reflects hits, misses, and
+        evictions, and that the counters are reset afterwards.
+        '''
+        class Stats():
+            pass
+
+        cache = ReferenceCache(capacity=10, policy='lru')
+        cache.put('a', 1, size=10)
+        cache.get('a')
+        cache.get('b')
+        cache.put('c', 2, size=10)
+
+        stats = Stats()
+        cache.report(stats)
+
+        self.assertEqual(stats.hits, 1)
+        self.assertEqual(stats.misses, 1)
+        self.assertEqual(stats.evictions, 1)
+        self.assertEqual(stats.size_bytes, 10)
+        self.assertEqual(stats.entries, 1)
+        self.assertEqual(cache.hits, 0)
+
+    def test_expired_entry_revalidated(self):
+        '''
+        Ensures that an entry older than the TTL is treated as a miss, and
+        that it is renewed if the KVS still holds the same version.
+        '''
+        cache = ReferenceCache(capacity=100, ttl=0.01)
+        cache.put('a', 'value', size=10, version=1)
+
+        time.sleep(0.02)
+        self.assertEqual(cache.get('a'), None)
+
+        self.assertEqual(cache.revalidate('a', 1), 'value')
+        self.assertEqual(cache.revalidations, 1)
+        self.assertEqual(cache.get('a'), 'value')
+
+    def test_new_version_drops_entry(self):
+        '''
+        Ensures that an expired entry is dropped if the KVS has a newer
+        version of the key.
+        '''
+        cache = ReferenceCache(capacity=100, ttl=0.01)
+        cache.put('a', 'value', size=10, version=1)
+
+        time.sleep(0.02)
+        self.assertEqual(cache.revalidate('a', 2), None)
+        self.assertFalse('a' in cache)
+        self.assertEqual(cache.size, 0)
+
+    def test_invalidate(self):
+        '''
+        Ensures that written keys are dropped from the cache immediately.
+        '''
+        cache = ReferenceCache(capacity=100)
+        cache.put('a', 1, size=10)
+        cache.put('b', 2, size=10)
+
+        cache.invalidate(['a', 'c'])
+        self.assertFalse('a' in cache)
+        self.assertTrue('b' in cache)
+        self.assertEqual(cache.invalidations, 1)
+
+    def test_clear(self):
+        '''
+        Ensures that clearing the cache drops every entry under every eviction
+        policy, leaving the cache usable.
+        '''
+        for policy in ['lru', 'lfu', 'arc']:
+            cache = ReferenceCache(capacity=100, policy=policy)
+            cache.put('a', 1, size=10)
+            cache.put('b', 2, size=10)
+            cache.get('a')
+
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+            self.assertEqual(cache.size, 0)
+
+            cache.put('a', 3, size=90)
+            cache.put('c', 4, size=20)
+            self.assertFalse('a' in cache)
+            self.assertTrue('c' in cache)
+
+    def test_lookup_waits_for_prefetch(self):
+        '''
+        Ensures that a lookup for a key that is being prefetched waits for the
+        prefetch to land instead of reporting a miss, and that keys that are
+        already cached or pending are not reserved twice.
+        '''
+        cache = ReferenceCache(capacity=100)
+        self.assertTrue(cache.reserve('a'))
+        self.assertFalse(cache.reserve('a'))
+
+        def prefetch():
+            time.sleep(0.05)
+            cache.put('a', 'value', size=10)
+            cache.release('a')
+
+        thread = threading.Thread(target=prefetch)
+        thread.start()
+
+        self.assertEqual(cache.get('a'), 'value')
+        thread.join()
+
+        self.assertFalse(cache.reserve('a'))
+        self.assertEqual(len(cache.pending), 0)
+
+    def test_invalid_policy(self):
+        '''
+        Ensures that an unknown eviction policy is rejected.
+        '''
+        self.assertRaises(ValueError, ReferenceCache, 10, 'fifo')
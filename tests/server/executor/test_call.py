@@ -23,7 +23,10 @@ from anna.lattices import (
     VectorClock
 )
 
+from cloudburst.server.executor import call as executor_call
+from cloudburst.server.executor.cache import ReferenceCache
 from cloudburst.server.executor.call import exec_function, exec_dag_function
+from cloudburst.server.executor.spill import SpilledResult, SpilledResults
 from cloudburst.server.executor.user_library import CloudburstUserLibrary
 from cloudburst.server.utils import DEFAULT_VC
 from cloudburst.shared.proto.cloudburst_pb2 import (
@@ -490,6 +493,93 @@ class TestExecutorCall(unittest.TestCase):
         val = serializer.load(trigger.arguments.values[0])
         self.assertEqual(val, incr('', arg))
 
+    def test_exec_dag_non_sink_same_thread(self):
+        '''
+        Executes a non-sink function in a DAG whose successor is pinned on the
+        same executor thread, and ensures that the successor's trigger is
+        handed back in-process, with the unserialized result, rather than
+        being sent over ZMQ.
+        '''
+        def incr(_, x): return x + 1
+        iname = 'incr'
+
+        def square(_, x): return x * x
+        sname = 'square'
+        arg = 1
+
+        dag = create_linear_dag([incr, square], [iname, sname],
+                                self.kvs_client, 'dag')
+        schedule, triggers = self._create_fn_schedule(dag, arg, iname, [iname,
+                                                                        sname])
+
+        local_triggers = []
+        exec_dag_function(self.pusher_cache, self.kvs_client, self.kvs_client,
+                          [triggers], incr, [schedule], self.user_library, {},
+                          ReferenceCache(), [], False, None, None,
+                          self.ip + ':0', local_triggers)
+
+        self.assertEqual(len(self.pusher_cache.socket.outbox), 0)
+        self.assertEqual(len(local_triggers), 1)
+
+        trigger = local_triggers[0]
+        self.assertEqual(trigger.id, schedule.id)
+        self.assertEqual(trigger.target_function, sname)
+        self.assertEqual(trigger.source, iname)
+        self.assertEqual(trigger.values, (incr('', arg),))
+
+    def test_exec_dag_large_result_spilled(self):
+        '''
+        Executes a non-sink function whose result is over the inline limit
+        and ensures that the result is spilled to the KVS once, that the
+        downstream trigger carries a handle to it, and that the downstream
+        function reads it without caching it.
+        '''
+        def incr(_, x): return x + 1
+        iname = 'incr'
+
+        def square(_, x): return x * x
+        sname = 'square'
+        arg = 1
+
+        dag = create_linear_dag([incr, square], [iname, sname],
+                                self.kvs_client, 'dag')
+        schedule, triggers = self._create_fn_schedule(dag, arg, iname, [iname,
+                                                                        sname])
+
+        spilled = SpilledResults()
+        old_limit = executor_call.INLINE_RESULT_LIMIT
+        executor_call.INLINE_RESULT_LIMIT = 0
+        try:
+            exec_dag_function(self.pusher_cache, self.kvs_client,
+                              self.kvs_client, [triggers], incr, [schedule],
+                              self.user_library, {}, ReferenceCache(), [],
+                              False, spilled=spilled)
+        finally:
+            executor_call.INLINE_RESULT_LIMIT = old_limit
+
+        trigger = DagTrigger()
+        trigger.ParseFromString(self.pusher_cache.socket.outbox[0])
+        self.assertEqual(len(trigger.arguments.values), 1)
+
+        handle = serializer.load(trigger.arguments.values[0])
+        self.assertEqual(type(handle), SpilledResult)
+        self.assertEqual(len(spilled.spilled), 1)
+
+        # The downstream function gets the result itself.
+        schedule.target_function = sname
+        del schedule.triggers[:]
+        schedule.triggers.append(iname)
+
+        cache = ReferenceCache()
+        exec_dag_function(self.pusher_cache, self.kvs_client, self.kvs_client,
+                          [[trigger]], square, [schedule], self.user_library,
+                          {}, cache, [], False)
+
+        result = self.kvs_client.get(schedule.id)[schedule.id]
+        self.assertEqual(serializer.load_lattice(result),
+                         square('', incr('', arg)))
+        self.assertIsNone(cache.get(handle.key, None))
+
     def test_exec_causal_dag_non_sink(self):
         '''
         Creates and executes a non-sink function in a causal-mode DAG. This
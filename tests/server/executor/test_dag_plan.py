@@ -0,0 +1,116 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from cloudburst.server.executor.dag_plan import (
+    DagPlan,
+    DagPlanCache,
+    DagVersionCache
+)
+
+
+class FakeRef():
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeConnection():
+    def __init__(self, source, sink):
+        self.source = source
+        self.sink = sink
+
+
+class FakeDag():
+    '''
+    A stand-in for the Dag protobuf with just the fields a plan reads.
+    '''
+
+    def __init__(self, name, functions, connections):
+        self.name = name
+        self.functions = [FakeRef(fname) for fname in functions]
+        self.connections = [FakeConnection(source, sink) for source, sink in
+                            connections]
+
+
+class TestDagPlan(unittest.TestCase):
+    '''
+    Tests for the executor's compiled DAG plans, ensuring that the lookup
+    tables match the DAG's structure and that plans are cached per DAG
+    version.
+    '''
+
+    def test_diamond_plan(self):
+        dag = FakeDag('diamond', ['a', 'b', 'c', 'd'],
+                      [('a', 'b'), ('a', 'c'), ('b', 'd'), ('c', 'd')])
+        plan = DagPlan(dag)
+
+        self.assertEqual(plan.functions['c'].name, 'c')
+        self.assertEqual(plan.successors['a'], ['b', 'c'])
+        self.assertEqual(plan.predecessors['d'], ['b', 'c'])
+        self.assertEqual(plan.sinks, {'d'})
+
+        self.assertEqual(plan.descendants['a'], {'b', 'c', 'd'})
+        self.assertEqual(plan.descendants['b'], {'d'})
+        self.assertEqual(plan.descendants['d'], set())
+
+        self.assertEqual(plan.trigger_count('a'), 1)
+        self.assertEqual(plan.trigger_count('d'), 2)
+
+    def test_plan_cache(self):
+        '''
+        Ensures that the same DAG version reuses its plan, that a DAG
+        re-registered with a new version gets a new one, and that the cache is
+        bounded. Lookups only use the DAG's name and version, never its
+        serialized form.
+        '''
+        cache = DagPlanCache(capacity=2)
+        dag = FakeDag('linear', ['a', 'b'], [('a', 'b')])
+
+        plan = cache.get(dag, 'v1')
+        self.assertEqual(plan.version, 'v1')
+        self.assertTrue(cache.get(dag, 'v1') is plan)
+
+        changed = FakeDag('linear', ['a', 'b', 'c'], [('a', 'b'), ('b', 'c')])
+        self.assertFalse(cache.get(changed, 'v2') is plan)
+        self.assertEqual(cache.get(changed, 'v2').sinks, {'c'})
+
+        cache.get(FakeDag('other', ['x'], []), 'v1')
+        self.assertEqual(len(cache.plans), 2)
+        self.assertFalse(cache.get(dag, 'v1') is plan)
+
+    def test_version_cache(self):
+        '''
+        Ensures that each Dag object is only hashed once, that an equal but
+        distinct Dag object is hashed again, and that the cache is bounded.
+        '''
+        digests = []
+
+        def digest(dag):
+            digests.append(dag)
+            return 'v%d' % (len(digests))
+
+        cache = DagVersionCache(capacity=2, digest=digest)
+        dag = FakeDag('linear', ['a', 'b'], [('a', 'b')])
+
+        self.assertEqual(cache.get(dag), 'v1')
+        self.assertEqual(cache.get(dag), 'v1')
+        self.assertEqual(len(digests), 1)
+
+        copy = FakeDag('linear', ['a', 'b'], [('a', 'b')])
+        self.assertEqual(cache.get(copy), 'v2')
+
+        cache.get(FakeDag('other', ['x'], []))
+        self.assertEqual(len(cache.versions), 2)
+        self.assertEqual(cache.get(dag), 'v4')
@@ -0,0 +1,128 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from anna.lattices import LWWPairLattice
+
+from cloudburst.server import utils as sutils
+from cloudburst.server.executor.dag_store import DagStore
+from cloudburst.shared.proto.cloudburst_pb2 import Arguments, NORMAL
+from cloudburst.shared.proto.internal_pb2 import CompactDagSchedule
+from cloudburst.shared.serializer import Serializer
+from tests.mock import kvs_client
+from tests.server.utils import create_linear_dag
+
+serializer = Serializer()
+
+
+class TestDagStore(unittest.TestCase):
+    '''
+    Tests for the executor's store of DAG definitions, ensuring that compact
+    schedules are expanded into full schedules, that each DAG version is only
+    read from the KVS once, and that schedules whose DAG version has not
+    reached the KVS yet are held until it does.
+    '''
+
+    def setUp(self):
+        self.kvs_client = kvs_client.MockAnnaClient()
+        self.store = DagStore(self.kvs_client, pending_timeout=10)
+
+        def incr(_, x):
+            return x + 1
+
+        def square(_, x):
+            return x * x
+
+        self.dag = create_linear_dag([incr, square], ['incr', 'square'],
+                                     self.kvs_client, 'linear')
+        self.kvs_client.put(self.dag.name, LWWPairLattice(
+            sutils.generate_timestamp(0), self.dag.SerializeToString()))
+
+    def test_expand_schedule(self):
+        args = Arguments()
+        args.values.extend([serializer.dump(1)])
+
+        compact = CompactDagSchedule()
+        compact.id = 'id'
+        compact.dag_name = self.dag.name
+        compact.dag_version = sutils.get_dag_version(self.dag)
+        compact.target_function = 'incr'
+        compact.arguments = args.SerializeToString()
+        compact.locations['square'] = '127.0.0.1:1'
+        compact.output_key = 'output'
+
+        schedule, plan = self.store.expand(compact)
+        self.assertEqual(schedule.id, 'id')
+        self.assertEqual(schedule.dag.name, self.dag.name)
+        self.assertEqual(len(schedule.dag.functions), 0)
+        self.assertEqual(schedule.consistency, NORMAL)
+        self.assertEqual(list(schedule.triggers), ['BEGIN'])
+        self.assertEqual(schedule.locations['square'], '127.0.0.1:1')
+        self.assertEqual(schedule.arguments['incr'], args)
+        self.assertEqual(schedule.output_key, 'output')
+        self.assertEqual(plan.version, compact.dag_version)
+
+        # The DAG is now cached, so we don't need the KVS for this version.
+        del self.kvs_client.kvs[self.dag.name]
+        compact.target_function = 'square'
+        schedule, same_plan = self.store.expand(compact)
+        self.assertEqual(list(schedule.triggers), ['incr'])
+        self.assertTrue(same_plan is plan)
+
+    def test_held_until_dag_arrives(self):
+        version = sutils.get_dag_version(self.dag)
+        del self.kvs_client.kvs[self.dag.name]
+
+        compact = self.get_compact('first', version)
+        self.assertIsNone(self.store.expand(compact, now=100))
+        self.assertEqual(self.store.retry(now=101), [])
+
+        # Later schedules wait behind the ones already held.
+        self.kvs_client.put(self.dag.name, LWWPairLattice(
+            sutils.generate_timestamp(0), self.dag.SerializeToString()))
+        self.assertIsNone(self.store.expand(self.get_compact('second',
+                                                             version),
+                                            now=102))
+
+        expanded = self.store.retry(now=103)
+        self.assertEqual([compact.id for compact, _, _ in expanded],
+                         ['first', 'second'])
+        for _, schedule, plan in expanded:
+            self.assertEqual(schedule.dag.name, self.dag.name)
+            self.assertEqual(plan.version, version)
+
+        self.assertEqual(len(self.store.pending), 0)
+        self.assertIsNone(self.store.deadline())
+
+    def test_unknown_version(self):
+        compact = self.get_compact('id', 'stale')
+
+        self.assertIsNone(self.store.expand(compact, now=100))
+        self.assertEqual(len(self.store.dags), 0)
+        self.assertTrue(self.store.deadline() <= 100.1)
+
+        # We give up on the schedule once it has waited too long.
+        self.assertEqual(self.store.retry(now=105), [])
+        self.assertEqual(len(self.store.pending), 1)
+        self.assertEqual(self.store.retry(now=111), [])
+        self.assertEqual(len(self.store.pending), 0)
+
+    def get_compact(self, schedule_id, version):
+        compact = CompactDagSchedule()
+        compact.id = schedule_id
+        compact.dag_name = self.dag.name
+        compact.dag_version = version
+        compact.target_function = 'incr'
+        return compact
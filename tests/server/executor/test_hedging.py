@@ -0,0 +1,144 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from cloudburst.server import utils as sutils
+from cloudburst.server.executor.call import LocalTrigger
+from cloudburst.server.executor.hedging import Hedger, MIN_HEDGE_SAMPLES
+from cloudburst.shared.histogram import LatencyHistogram
+from cloudburst.shared.proto.cloudburst_pb2 import (
+    DagSchedule,
+    DagTrigger,
+    NORMAL  # Cloudburst's consistency modes
+)
+from cloudburst.shared.proto.internal_pb2 import (
+    CompactDagSchedule,
+    HedgeRequest
+)
+from cloudburst.shared.serializer import Serializer
+from tests.mock import kvs_client, zmq_utils
+from tests.server.utils import create_linear_dag
+
+serializer = Serializer()
+
+
+class TestHedger(unittest.TestCase):
+    '''
+    Tests for hedged execution on the executor, ensuring that a request that
+    runs past its function's runtime quantile is sent to a scheduler for a
+    backup copy exactly once, and that requests which cannot be hedged are
+    left alone.
+    '''
+
+    def setUp(self):
+        self.pusher_cache = zmq_utils.MockPusherCache()
+        self.hedger = Hedger(['127.0.0.2'], self.pusher_cache, '127.0.0.1:0')
+
+        def incr(_, x):
+            return x + 1
+
+        def square(_, x):
+            return x * x
+
+        self.dag = create_linear_dag([incr, square], ['incr', 'square'],
+                                     kvs_client.MockAnnaClient(), 'linear')
+
+        runtimes = LatencyHistogram()
+        for _ in range(MIN_HEDGE_SAMPLES):
+            runtimes.add(1.0)
+
+        self.hedger.configure('incr', 0.95)
+        self.hedger.configure('square', 0.95)
+        self.hedger.update('incr', runtimes)
+        self.hedger.update('square', runtimes)
+
+    def test_hedge_late_request(self):
+        schedule = self._create_schedule('incr')
+        trigger = DagTrigger()
+        trigger.id = schedule.id
+        trigger.source = 'BEGIN'
+        trigger.target_function = 'incr'
+
+        key = (schedule.id, 'incr')
+        self.assertTrue(self.hedger.watch(key, schedule, [trigger], now=0))
+        self.assertAlmostEqual(self.hedger.deadline(), 1.0, places=1)
+
+        self.assertEqual(self.hedger.check(now=0.5), 0)
+        self.assertEqual(self.hedger.check(now=2), 1)
+        self.assertEqual(self.hedger.check(now=3), 0)
+        self.assertIsNone(self.hedger.deadline())
+
+        self.assertEqual(len(self.pusher_cache.socket.outbox), 1)
+        self.assertEqual(self.pusher_cache.addresses[0],
+                         sutils.get_hedge_address('127.0.0.2'))
+
+        request = HedgeRequest()
+        request.ParseFromString(self.pusher_cache.socket.outbox[0])
+        self.assertEqual(request.origin, '127.0.0.1:0')
+        self.assertEqual(request.triggers, [trigger.SerializeToString()])
+
+        compact = CompactDagSchedule()
+        compact.ParseFromString(request.schedule)
+        self.assertTrue(compact.hedged)
+        self.assertEqual(compact.id, schedule.id)
+        self.assertEqual(compact.target_function, 'incr')
+        self.assertEqual(compact.dag_version,
+                         sutils.get_dag_version(self.dag))
+
+    def test_finished_request(self):
+        '''
+        Ensures that a request that finishes in time, or that we are running
+        as a backup copy, is never hedged, and that local triggers are
+        serialized when the request starts.
+        '''
+        schedule = self._create_schedule('incr')
+        key = (schedule.id, 'incr')
+        trigger = LocalTrigger(schedule.id, 'BEGIN', 'incr', [1])
+
+        self.assertTrue(self.hedger.watch(key, schedule, [trigger], now=0))
+        trigger.values[0] = 2
+        self.hedger.done(key)
+        self.assertEqual(self.hedger.check(now=2), 0)
+
+        self.hedger.mark_backup(key)
+        self.assertFalse(self.hedger.watch(key, schedule, [trigger], now=0))
+        self.assertEqual(len(self.pusher_cache.socket.outbox), 0)
+
+    def test_unhedged_requests(self):
+        '''
+        Ensures that sinks, functions without enough runtime samples, and
+        causal requests are not hedged.
+        '''
+        schedule = self._create_schedule('square')
+        self.assertFalse(self.hedger.watch((schedule.id, 'square'), schedule,
+                                           [], now=0))
+
+        hedger = Hedger(['127.0.0.2'], self.pusher_cache, '127.0.0.1:0')
+        hedger.configure('incr', 0.95)
+        hedger.update('incr', LatencyHistogram())
+        schedule = self._create_schedule('incr')
+        self.assertFalse(hedger.watch((schedule.id, 'incr'), schedule, [],
+                                      now=0))
+
+    def _create_schedule(self, fname):
+        schedule = DagSchedule()
+        schedule.id = 'id'
+        schedule.dag.CopyFrom(self.dag)
+        schedule.target_function = fname
+        schedule.consistency = NORMAL
+        schedule.locations['square'] = '127.0.0.1:1'
+        schedule.arguments[fname].values.extend([serializer.dump(1)])
+
+        return schedule
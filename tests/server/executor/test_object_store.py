@@ -0,0 +1,90 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from cloudburst.server.executor import object_store
+from cloudburst.server.executor.object_store import (
+    load_shared_object,
+    NodeObjectStore
+)
+
+
+class TestNodeObjectStore(unittest.TestCase):
+    '''
+    Tests for the node-local object store, ensuring that arrays round-trip
+    through it, that every consumer gets its own copy-on-write view, and that
+    objects are cleaned up once they are picked up.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = NodeObjectStore('127.0.0.1', self.directory, threshold=16)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_accepts(self):
+        '''
+        Ensures that only large enough numpy arrays go through the store, and
+        that only executors on this node are considered local.
+        '''
+        self.assertTrue(self.store.accepts(np.zeros(4)))
+        self.assertFalse(self.store.accepts(np.zeros(1)))
+        self.assertFalse(self.store.accepts(b'0' * 64))
+
+        self.assertTrue(self.store.is_local('127.0.0.1:2'))
+        self.assertFalse(self.store.is_local('127.0.0.2:0'))
+
+    def test_round_trip_to_multiple_consumers(self):
+        '''
+        Passes an array to two consumers and ensures that each sees the
+        original values, that a write by one is not seen by the other, and
+        that the store is empty once both have picked it up.
+        '''
+        arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+        handles = self.store.put(arr, ['left', 'right'])
+
+        left = load_shared_object(handles['left'])
+        self.assertTrue(np.array_equal(left, arr))
+        self.assertEqual(left.dtype, np.float32)
+
+        left[0, 0] = 100
+        right = load_shared_object(handles['right'])
+        self.assertEqual(right[0, 0], 0)
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sweep_orphans(self):
+        '''
+        Ensures that objects nobody picked up are removed after the TTL.
+        '''
+        self.store.put(np.zeros(4), ['sink'])
+
+        self.store.sweep()
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+        old_ttl = object_store.ORPHAN_TTL
+        object_store.ORPHAN_TTL = -1
+        try:
+            self.store.sweep()
+        finally:
+            object_store.ORPHAN_TTL = old_ttl
+
+        self.assertEqual(os.listdir(self.directory), [])
@@ -62,7 +62,8 @@ class TestExecutorPin(unittest.TestCase):
         create_function(func, self.kvs_client, fname)
 
         # Create a pin message and put it into the socket.
-        msg = PinFunction(name=fname, response_address=self.ip)
+        msg = PinFunction(name=fname, response_address=self.ip,
+                          request_id='pin')
         self.socket.inbox.append(msg.SerializeToString())
 
         # Execute the pin operation.
@@ -76,6 +77,7 @@ class TestExecutorPin(unittest.TestCase):
         response = GenericResponse()
         response.ParseFromString(self.pusher_cache.socket.outbox[0])
         self.assertTrue(response.success)
+        self.assertEqual(response.response_id, msg.request_id)
 
         self.assertEqual(func('', 1), self.pinned_functions[fname]('', 1))
         self.assertTrue(fname in self.pinned_functions)
@@ -146,6 +148,29 @@ class TestExecutorPin(unittest.TestCase):
 
         self.assertEqual(restart.exception.code, 0)
 
+    def test_warm_unpin(self):
+        '''
+        This test unpins a function in place: the executor should stop
+        advertising the function without restarting.
+        '''
+        fname = 'square'
+
+        def square(_, x): x * x
+        self.pinned_functions[fname] = square
+        self.runtimes[fname] = []
+        self.exec_counts[fname] = []
+        self.status.functions.append(fname)
+
+        self.socket.inbox.append(fname)
+        try:
+            result = unpin(self.socket, self.status, self.pinned_functions,
+                           self.runtimes, self.exec_counts, warm=True)
+        except SystemExit:
+            self.fail('Unpin attempted to exit during a warm unpin.')
+
+        self.assertEqual(result, fname)
+        self.assertTrue(fname not in self.status.functions)
+
     def test_bad_unpin(self):
         '''
         This test attempts to unpin a function that does not currently exist at
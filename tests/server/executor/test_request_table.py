@@ -0,0 +1,138 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+import unittest
+
+from cloudburst.server.executor.request_table import RequestTable, TimingWheel
+
+
+class TestRequestTable(unittest.TestCase):
+    '''
+    Tests for the executor's request-state table and its timing wheel,
+    ensuring that requests stuck waiting for triggers are dropped and counted,
+    that running requests are never dropped, and that finished requests are
+    forgotten after a short while.
+    '''
+
+    def test_wheel_expiry(self):
+        '''
+        Ensures that keys expire once their tick has passed, including keys
+        more than one rotation away, and that cancelled keys never expire.
+        '''
+        wheel = TimingWheel(resolution=1, num_slots=4, now=0)
+        wheel.schedule('a', 2)
+        wheel.schedule('b', 6)
+        wheel.schedule('c', 3)
+        wheel.cancel('c')
+
+        self.assertEqual(wheel.advance(1), [])
+        self.assertEqual(wheel.advance(2), ['a'])
+        self.assertEqual(wheel.advance(5), [])
+        self.assertEqual(wheel.advance(6), ['b'])
+        self.assertEqual(len(wheel), 0)
+
+    def test_wheel_catches_up(self):
+        '''
+        Ensures that advancing the wheel far past several rotations expires
+        everything that was due.
+        '''
+        wheel = TimingWheel(resolution=1, num_slots=4, now=0)
+        for i in range(1, 10):
+            wheel.schedule(i, i)
+
+        self.assertEqual(sorted(wheel.advance(100)), list(range(1, 10)))
+
+    def test_abandoned_request(self):
+        '''
+        Ensures that a request whose triggers never all arrive is dropped once
+        its deadline passes and is counted as abandoned.
+        '''
+        requests = RequestTable(timeout=1)
+        key = ('id', 'square')
+        now = time.time()
+
+        requests.queue['square'] = {'id': 'schedule'}
+        requests.received_triggers[key] = {'incr': 'trigger'}
+        requests.track(key, now)
+
+        self.assertEqual(requests.expire(now + 0.5), 0)
+        self.assertEqual(requests.expire(now + 2), 1)
+
+        self.assertEqual(requests.queue['square'], {})
+        self.assertFalse(key in requests.received_triggers)
+        self.assertFalse(key in requests.receive_times)
+
+        class Stats():
+            pass
+
+        stats = Stats()
+        requests.report(stats)
+        self.assertEqual(stats.abandoned_requests, 1)
+        self.assertEqual(requests.abandoned, 0)
+
+    def test_finished_request(self):
+        '''
+        Ensures that a request that is running is not abandoned, and that a
+        finished request is remembered only for the finished TTL.
+        '''
+        requests = RequestTable(timeout=1, finished_ttl=5)
+        key = ('id', 'square')
+        now = time.time()
+
+        requests.queue['square'] = {'id': 'schedule'}
+        requests.track(key, now)
+        requests.dispatch(key)
+
+        self.assertEqual(requests.expire(now + 2), 0)
+        self.assertEqual(requests.queue['square'], {'id': 'schedule'})
+
+        requests.finish(key, True, now + 2)
+        self.assertEqual(requests.queue['square'], {})
+        self.assertTrue(key in requests.finished_executions)
+
+        self.assertEqual(requests.expire(now + 8), 0)
+        self.assertFalse(key in requests.finished_executions)
+
+    def test_duplicate_trigger(self):
+        '''
+        Ensures that a trigger from a source a running request was started
+        with is a duplicate, but a trigger from another source is not.
+        '''
+        requests = RequestTable(timeout=1)
+        key = ('id', 'square')
+
+        requests.track(key)
+        requests.dispatch(key, ['incr'])
+        self.assertTrue(requests.is_duplicate(key, 'incr'))
+        self.assertFalse(requests.is_duplicate(key, 'decr'))
+
+        requests.finish(key, True)
+        self.assertTrue(requests.is_duplicate(key, 'decr'))
+        self.assertFalse(key in requests.running)
+
+    def test_load(self):
+        '''
+        Ensures that queued requests only count towards the queue depth until
+        they start running, and that finished requests count towards neither.
+        '''
+        requests = RequestTable(timeout=1)
+        requests.queue['square'] = {'a': 'schedule', 'b': 'schedule'}
+        self.assertEqual(requests.load(), (2, 0))
+
+        requests.dispatch(('a', 'square'))
+        self.assertEqual(requests.load(), (1, 1))
+
+        requests.finish(('a', 'square'), True)
+        self.assertEqual(requests.load(), (1, 0))
@@ -0,0 +1,73 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import unittest
+
+from cloudburst.server.executor.spill import (
+    load_spilled_result,
+    SpilledResults
+)
+from cloudburst.shared.serializer import Serializer
+from tests.mock import kvs_client
+
+serializer = Serializer()
+logging.disable(logging.CRITICAL)
+
+
+class TestSpilledResults(unittest.TestCase):
+    '''
+    Tests for the results an executor spills to the KVS, ensuring that they
+    can be read until they expire and that a failed write is reported to the
+    caller.
+    '''
+
+    def setUp(self):
+        self.kvs_client = kvs_client.MockAnnaClient()
+        self.spilled = SpilledResults(ttl=10)
+        self.value = serializer.dump([1, 2, 3], None, False)
+
+    def test_read_until_expired(self):
+        '''
+        Spills a result, reads it twice, as two consumers would, and ensures
+        that it is emptied once its time to live is up.
+        '''
+        handle = self.spilled.put(self.kvs_client, 'key', self.value, now=100)
+
+        for _ in range(2):
+            self.assertEqual(load_spilled_result(self.kvs_client, handle),
+                             [1, 2, 3])
+
+        self.spilled.expire(self.kvs_client, now=105)
+        self.assertEqual(load_spilled_result(self.kvs_client, handle),
+                         [1, 2, 3])
+
+        self.spilled.expire(self.kvs_client, now=110)
+        self.assertEqual(len(self.spilled.spilled), 0)
+        self.assertEqual(self.kvs_client.get('key')['key'].reveal(), b'')
+        self.assertRaises(ValueError, load_spilled_result, self.kvs_client,
+                          handle)
+
+    def test_failed_put(self):
+        '''
+        Ensures that no handle is returned, and nothing is tracked, if the
+        KVS does not accept the result.
+        '''
+        class FailingKvsClient(kvs_client.MockAnnaClient):
+            def put(self, keys, lattices):
+                return {keys: False}
+
+        handle = self.spilled.put(FailingKvsClient(), 'key', self.value)
+        self.assertIsNone(handle)
+        self.assertEqual(len(self.spilled.spilled), 0)
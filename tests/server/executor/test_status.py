@@ -0,0 +1,141 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+import unittest
+
+from cloudburst.server.executor.status import StatusReporter
+from cloudburst.server.utils import get_load_address
+from cloudburst.shared.proto.internal_pb2 import ExecutorLoad, ThreadStatus
+from tests.mock import zmq_utils
+
+
+class TestStatusReporter(unittest.TestCase):
+    '''
+    Tests for the executor's status reporter, ensuring that statuses are only
+    sent to the schedulers when they change or when the resend timer fires.
+    '''
+
+    def setUp(self):
+        self.pusher_cache = zmq_utils.MockPusherCache()
+        self.socket = self.pusher_cache.socket
+
+        self.status = ThreadStatus()
+        self.status.ip = '127.0.0.1'
+        self.status.tid = 0
+        self.status.running = True
+
+        self.reporter = StatusReporter(['127.0.0.1', '127.0.0.2'],
+                                       self.pusher_cache, self.status,
+                                       interval=1.0)
+
+    def test_push_only_on_change(self):
+        '''
+        Ensures that an unchanged status is not resent, and that a change is
+        sent to every scheduler.
+        '''
+        self.reporter.push()
+        self.assertEqual(len(self.socket.outbox), 2)
+
+        self.reporter.push()
+        self.assertEqual(len(self.socket.outbox), 2)
+
+        self.status.functions.append('incr')
+        self.reporter.push()
+        self.assertEqual(len(self.socket.outbox), 4)
+
+        status = ThreadStatus()
+        status.ParseFromString(self.socket.outbox[-1])
+        self.assertEqual(list(status.functions), ['incr'])
+
+    def test_tick_resends_after_interval(self):
+        '''
+        Ensures that the cached status is resent once the interval passes.
+        '''
+        self.reporter.push()
+
+        self.reporter.tick(now=time.time())
+        self.assertEqual(len(self.socket.outbox), 2)
+
+        self.reporter.tick(now=time.time() + 1.0)
+        self.assertEqual(len(self.socket.outbox), 4)
+
+    def test_tick_skips_resend_with_pending_load(self):
+        '''
+        Ensures that the cached status is not resent while a load update is
+        held back, and is resent once nothing is pending.
+        '''
+        self.reporter.push()
+
+        now = time.time()
+        self.reporter.report_load(3, 1, now=now)
+        self.reporter.report_load(2, 1, now=now)
+        self.assertEqual(len(self.socket.outbox), 4)
+
+        # The load update goes out, but the status is not resent with it.
+        self.reporter.tick(now=now + 1.0)
+        self.assertEqual(len(self.socket.outbox), 6)
+        self.assertEqual(self.pusher_cache.addresses[-1],
+                         get_load_address('127.0.0.2'))
+
+        self.reporter.tick(now=now + 1.0)
+        self.assertEqual(len(self.socket.outbox), 8)
+
+    def test_utilization_smoothed(self):
+        '''
+        Ensures that the reported utilization is a moving average of the
+        measured samples.
+        '''
+        self.assertAlmostEqual(self.reporter.report_utilization(0.8), 0.8)
+        self.assertAlmostEqual(self.reporter.report_utilization(0.0), 0.4)
+        self.assertAlmostEqual(self.status.utilization, 0.4)
+
+    def test_load_rate_limited(self):
+        '''
+        Ensures that load changes are sent to the load port of every
+        scheduler, that unchanged loads are not resent, and that a change
+        inside the rate limit is held back until the next tick after it.
+        '''
+        self.reporter.push()
+        self.assertEqual(len(self.socket.outbox), 2)
+
+        now = time.time()
+        self.reporter.report_load(3, 1, now=now)
+        self.assertEqual(len(self.socket.outbox), 4)
+        self.assertEqual(self.pusher_cache.addresses[-1],
+                         get_load_address('127.0.0.2'))
+
+        load = ExecutorLoad()
+        load.ParseFromString(self.socket.outbox[-1])
+        self.assertEqual(load.queue_depth, 3)
+        self.assertEqual(load.in_flight, 1)
+
+        self.reporter.report_load(3, 1, now=now + 0.1)
+        self.assertEqual(len(self.socket.outbox), 4)
+
+        # A change right after a send waits for the interval to pass.
+        self.reporter.report_load(2, 2, now=now + 0.1)
+        self.reporter.report_load(1, 2, now=now + 0.101)
+        self.assertEqual(len(self.socket.outbox), 6)
+
+        deadline = self.reporter.load_deadline()
+        self.assertAlmostEqual(deadline, now + 0.1 +
+                               self.reporter.load_interval)
+
+        self.reporter.tick(now=deadline)
+        self.assertEqual(len(self.socket.outbox), 8)
+        self.assertEqual(self.reporter.load_deadline(), None)
+
+        load.ParseFromString(self.socket.outbox[-1])
+        self.assertEqual(load.queue_depth, 1)
@@ -14,7 +14,11 @@
 
 import unittest
 
-from cloudburst.server.executor.user_library import CloudburstUserLibrary
+from cloudburst.server.executor.user_library import (
+    CloudburstUserLibrary,
+    KvsUserLibrary,
+    UndeliverableMessage
+)
 from cloudburst.shared.serializer import Serializer
 from tests.mock.kvs_client import MockAnnaClient
 from tests.mock.zmq_utils import MockPusherCache, MockZmqContext
@@ -86,3 +90,40 @@ class TestUserLibrary(unittest.TestCase):
         self.assertEqual(msgs[1][0], sender)
         self.assertEqual(msgs[0][1], message2)
         self.assertEqual(msgs[1][1], message1)
+
+    def test_receive_without_inbox(self):
+        '''
+        Tests that a library that does not own the executor's inbox, as on a
+        worker thread, refuses to receive messages but can still be closed.
+        '''
+        user_library = KvsUserLibrary(self.context, self.pusher_cache, self.ip,
+                                      0, self.kvs_client, bind_inbox=False)
+        self.context.sckt.inbox.append(((self.ip, 0), 'hello'))
+
+        self.assertRaises(RuntimeError, user_library.recv)
+        user_library.close()
+        self.assertEqual(len(self.context.sckt.inbox), 1)
+
+    def test_reject(self):
+        '''
+        Tests that rejecting the inbox returns each message to its sender,
+        except for messages that were themselves returned.
+        '''
+        user_library = KvsUserLibrary(self.context, self.pusher_cache, self.ip,
+                                      0, self.kvs_client)
+        sender = ('127.0.0.2', 1)
+        self.context.sckt.inbox.append((sender, 'hello'))
+        self.context.sckt.inbox.append((sender, UndeliverableMessage('bye')))
+
+        self.assertEqual(user_library.reject(), 2)
+        self.assertEqual(len(self.context.sckt.inbox), 0)
+
+        send_socket = self.pusher_cache.socket
+        self.assertEqual(len(send_socket.outbox), 1)
+        self.assertEqual(self.pusher_cache.addresses,
+                         ['tcp://127.0.0.2:5501'])
+
+        returned_by, returned = send_socket.outbox[0]
+        self.assertEqual(returned_by, (self.ip, 0))
+        self.assertTrue(isinstance(returned, UndeliverableMessage))
+        self.assertEqual(returned.message, 'hello')
@@ -0,0 +1,48 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import sys
+import tempfile
+import unittest
+
+from cloudburst.server.executor.zygote import Zygote
+
+
+class TestZygote(unittest.TestCase):
+    '''
+    Tests for the executor fork server, ensuring that executors which restart
+    are forked again and that executors which exit for good are not.
+    '''
+
+    def test_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = os.path.join(directory, 'launches')
+
+            def spawn(thread_id, launch_time):
+                with open(log, 'a') as f:
+                    f.write('%d\n' % (thread_id))
+
+                with open(log) as f:
+                    launches = len(f.readlines())
+
+                # Restart the first time, and depart the second time.
+                sys.exit(0 if launches == 1 else 1)
+
+            zygote = Zygote(spawn, ['json'])
+            self.assertEqual(zygote.serve([3]), 1)
+            self.assertEqual(len(zygote.children), 0)
+
+            with open(log) as f:
+                self.assertEqual(f.read(), '3\n3\n')
@@ -18,18 +18,21 @@ import unittest
 
 from anna.lattices import LWWPairLattice
 
+from cloudburst.server.scheduler.load import SlidingWindowCounter
 from cloudburst.server.scheduler.policy.default_policy import (
     DefaultCloudburstSchedulerPolicy
 )
 from cloudburst.server.scheduler.utils import get_cache_ip_key
-import cloudburst.server.utils as sutils
 from cloudburst.shared.proto.cloudburst_pb2 import Dag
 from cloudburst.shared.proto.internal_pb2 import (
+    ExecutorLoad,
+    PinFunction,
     ThreadStatus,
     SchedulerStatus,
     CPU
 )
 from cloudburst.shared.proto.shared_pb2 import StringSet
+from cloudburst.shared.reference import CloudburstReference
 from cloudburst.shared.serializer import Serializer
 from tests.mock import kvs_client, zmq_utils
 
@@ -48,7 +51,7 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
     def setUp(self):
         self.pusher_cache = zmq_utils.MockPusherCache()
         self.socket = zmq_utils.MockZmqSocket()
-        self.pin_socket = zmq_utils.MockZmqSocket()
+        self.pin_socket = zmq_utils.MockPinAcceptSocket(self.pusher_cache)
 
         self.kvs_client = kvs_client.MockAnnaClient()
         self.ip = '127.0.0.1'
@@ -81,10 +84,9 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
         self.policy.unpinned_cpu_executors.update(address_set)
 
         self.policy.backoff[(self.ip, 1)] = time.time()
-        self.policy.running_counts[self.ip, 2] = set()
+        self.policy.running_counts[self.ip, 2] = SlidingWindowCounter()
         for _ in range(1100):
-            time.sleep(.0001)
-            self.policy.running_counts[(self.ip, 2)].add(time.time())
+            self.policy.running_counts[(self.ip, 2)].increment()
 
         # Ensure that we have returned None because both our valid executors
         # were overloaded.
@@ -92,6 +94,24 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
         self.assertEqual(result, (self.ip, 3))
 
 
+    def test_round_robin(self):
+        '''
+        This test ensures that the round-robin policy cycles through the
+        executors a function is pinned on, without reordering the policy's
+        function location metadata.
+        '''
+        self.policy.policy = 'round-robin'
+        locations = [(self.ip, 1), (self.ip, 2), (self.ip, 3)]
+        self.policy.function_locations['function'] = list(locations)
+
+        picks = [self.policy.pick_executor([], 'function') for _ in
+                 range(2 * len(locations))]
+
+        self.assertEqual(picks, locations + locations)
+        self.assertEqual(self.policy.function_locations['function'],
+                         locations)
+
+
     def test_pin_reject(self):
         '''
         This test explicitly rejects a pin request from the policy and ensures
@@ -102,8 +122,8 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
         self.policy.unpinned_cpu_executors.update(address_set)
 
         # Create one failing and one successful response.
-        self.pin_socket.inbox.append(sutils.ok_resp)
-        self.pin_socket.inbox.append(sutils.error.SerializeToString())
+        self.pin_socket.inbox.append(False)
+        self.pin_socket.inbox.append(True)
 
         success = self.policy.pin_function(
             'dag', Dag.FunctionReference(name='function'), [])
@@ -114,6 +134,94 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
         self.assertEqual(len(self.policy.unpinned_cpu_executors), 0)
         self.assertEqual(len(self.policy.pending_dags), 1)
 
+    def test_pin_parallel(self):
+        '''
+        This test pins several functions at once and ensures that every pin is
+        sent out before any is answered, and that a rejected pin is retried on
+        another executor.
+        '''
+        address_set = {(self.ip, 1), (self.ip, 2), (self.ip, 3),
+                       (self.ip, 4)}
+        self.policy.unpinned_cpu_executors.update(address_set)
+
+        # Reject the second of the three pins.
+        self.pin_socket.inbox.extend([True, False, True, True])
+
+        names = ['f', 'g', 'h']
+        function_refs = [Dag.FunctionReference(name=name) for name in names]
+        success = self.policy.pin_functions('dag', function_refs, [])
+        self.assertTrue(success)
+
+        # All three pins go out in the first round, and the rejected one is
+        # retried afterwards with a new request ID.
+        pins = []
+        for message in self.pusher_cache.socket.outbox:
+            pin_msg = PinFunction()
+            pin_msg.ParseFromString(message)
+            pins.append(pin_msg)
+
+        self.assertEqual([pin_msg.name for pin_msg in pins], names + ['g'])
+        self.assertEqual(len({pin_msg.request_id for pin_msg in pins}), 4)
+
+        # Each pin was sent to a different executor, and g's rejecting
+        # executor is not used again.
+        addresses = self.pusher_cache.addresses
+        self.assertEqual(len(set(addresses)), 4)
+
+        pending = dict(self.policy.pending_dags['dag'])
+        self.assertEqual(set(pending.keys()), set(names))
+        self.assertEqual(pending['g'], (self.ip, 4))
+        self.assertEqual(len(self.policy.unpinned_cpu_executors), 0)
+
+    def test_power_of_two(self):
+        '''
+        This test ensures that the power-of-two policy routes requests to the
+        less loaded of two executors, that it counts the requests it routes
+        until the executor reports its load again, and that cached references
+        are weighed against load.
+        '''
+        self.policy.policy = 'power-of-two'
+        idle = (self.ip, 1)
+        busy = ('192.168.0.1', 1)
+        self.policy.function_locations['function'] = [idle, busy]
+
+        for executor in [idle, busy]:
+            status = ThreadStatus()
+            status.ip = executor[0]
+            status.tid = executor[1]
+            status.running = True
+            status.functions.append('function')
+            self.policy.thread_statuses[executor] = status
+
+        def report(executor, queue_depth, in_flight):
+            load = ExecutorLoad()
+            load.ip = executor[0]
+            load.tid = executor[1]
+            load.queue_depth = queue_depth
+            load.in_flight = in_flight
+            self.policy.process_load(load)
+
+        report(idle, 0, 1)
+        report(busy, 3, 1)
+
+        # The idle executor gets requests until our estimate of its load
+        # passes the busy executor's.
+        for _ in range(3):
+            self.assertEqual(self.policy.pick_executor([], 'function'), idle)
+        self.assertEqual(self.policy.executor_loads[idle], 4)
+
+        # A fresh report replaces our estimate.
+        report(idle, 4, 2)
+        self.assertEqual(self.policy.pick_executor([], 'function'), busy)
+
+        # Two cached references outweigh one extra queued request.
+        report(idle, 1, 0)
+        report(busy, 2, 0)
+        ref = CloudburstReference('key', True)
+        self.policy.key_locations['key'] = (busy[0],)
+        self.assertEqual(self.policy.pick_executor([ref, ref], 'function'),
+                         busy)
+
     def test_process_status(self):
         '''
         This test ensures that when a new status update is received from an
@@ -242,15 +350,16 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
         self.policy.backoff[old_executor] = time.time() - 10
         self.policy.backoff[new_executor] = time.time()
 
-        # For the new executor, add 10 old running times and 10 new ones.
-        self.policy.running_counts[new_executor] = set()
-        for _ in range(10):
-            time.sleep(.0001)
-            self.policy.running_counts[new_executor].add(time.time() - 10)
+        # For the new executor, add 10 old running times and 10 new ones. The
+        # old executor was only sent requests long ago.
+        self.policy.running_counts[new_executor] = SlidingWindowCounter()
+        self.policy.running_counts[new_executor].increment(10,
+                                                           time.time() - 10)
+        self.policy.running_counts[new_executor].increment(10)
 
-        for _ in range(10):
-            time.sleep(.0001)
-            self.policy.running_counts[new_executor].add(time.time())
+        self.policy.running_counts[old_executor] = SlidingWindowCounter()
+        self.policy.running_counts[old_executor].increment(10,
+                                                           time.time() - 10)
 
         # Publish some caching metadata into the KVS for each executor.
         old_set = StringSet()
@@ -267,7 +376,8 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
         # Check that the metadata has been correctly pruned.
         self.assertEqual(len(self.policy.backoff), 1)
         self.assertTrue(new_executor in self.policy.backoff)
-        self.assertEqual(len(self.policy.running_counts[new_executor]), 10)
+        self.assertEqual(self.policy.running_counts[new_executor].count(), 10)
+        self.assertTrue(old_executor not in self.policy.running_counts)
 
         # Check that the caching information is correct.
         self.assertTrue(len(self.policy.key_locations['key1']), 1)
@@ -283,6 +393,50 @@ class TestDefaultSchedulerPolicy(unittest.TestCase):
         self.assertTrue(new_ip in self.policy.key_locations['key4'])
         self.assertTrue(new_ip in self.policy.key_locations['key5'])
 
+    def test_incremental_cache_update(self):
+        '''
+        This test ensures that the key index is updated with the difference
+        between successive cache reports, and that the keys cached on a node
+        that has left are dropped.
+        '''
+        first_ip = '127.0.0.1'
+        second_ip = '192.168.0.1'
+
+        for tid, ip in enumerate([first_ip, second_ip]):
+            status = ThreadStatus()
+            status.ip = ip
+            status.tid = tid
+            status.running = True
+            self.policy.thread_statuses[(ip, tid)] = status
+
+        def report(ip, keys):
+            st = StringSet()
+            st.keys.extend(keys)
+            self.kvs_client.put(get_cache_ip_key(ip),
+                                LWWPairLattice(0, st.SerializeToString()))
+
+        report(first_ip, ['key1', 'key2'])
+        report(second_ip, ['key2'])
+        self.policy.update()
+
+        self.assertEqual(self.policy.key_locations['key1'], (first_ip,))
+        self.assertEqual(set(self.policy.key_locations['key2']),
+                         {first_ip, second_ip})
+
+        # The first node evicts key2 and caches key3.
+        report(first_ip, ['key1', 'key3'])
+        self.policy.update()
+
+        self.assertEqual(self.policy.key_locations['key2'], (second_ip,))
+        self.assertEqual(self.policy.key_locations['key3'], (first_ip,))
+
+        # The second node leaves.
+        del self.policy.thread_statuses[(second_ip, 1)]
+        self.policy.update()
+
+        self.assertTrue('key2' not in self.policy.key_locations)
+        self.assertEqual(set(self.policy.key_locations), {'key1', 'key3'})
+
     def test_update_function_locations(self):
         '''
         This test ensures that the update_function_locations method correctly
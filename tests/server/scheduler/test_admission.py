@@ -0,0 +1,129 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from cloudburst.server.scheduler.admission import (
+    AdmissionController,
+    TokenBucket
+)
+from cloudburst.server.scheduler.policy.default_policy import (
+    DefaultCloudburstSchedulerPolicy
+)
+from cloudburst.shared.proto.cloudburst_pb2 import Dag
+from cloudburst.shared.proto.internal_pb2 import ExecutorLoad, ThreadStatus
+from tests.mock import kvs_client, zmq_utils
+
+
+class TestAdmissionControl(unittest.TestCase):
+    '''
+    Tests the scheduler's admission control, ensuring that DAG calls are shed
+    once their DAG's rate limit is used up or once the executors report too
+    much outstanding work, and admitted otherwise.
+    '''
+
+    def setUp(self):
+        self.ip = '127.0.0.1'
+        self.policy = DefaultCloudburstSchedulerPolicy(
+            zmq_utils.MockZmqSocket(), zmq_utils.MockPusherCache(),
+            kvs_client.MockAnnaClient(), self.ip, policy='random',
+            random_threshold=0)
+
+        self.dag = Dag()
+        self.dag.name = 'dag'
+        self.dag.functions.add().name = 'square'
+
+        self.executors = [(self.ip, 0), (self.ip, 1)]
+        self.policy.function_locations['square'] = list(self.executors)
+        for executor in self.executors:
+            status = ThreadStatus()
+            status.ip, status.tid = executor
+            status.running = True
+            status.functions.append('square')
+            self.policy.thread_statuses[executor] = status
+
+    def report_load(self, executor, queue_depth):
+        load = ExecutorLoad()
+        load.ip, load.tid = executor
+        load.queue_depth = queue_depth
+        self.policy.process_load(load)
+
+    def test_token_bucket(self):
+        '''
+        Tests that a bucket admits a burst, then refills at its rate.
+        '''
+        bucket = TokenBucket(rate=10, burst=2, now=0.0)
+
+        self.assertTrue(bucket.acquire(now=0.0))
+        self.assertTrue(bucket.acquire(now=0.0))
+        self.assertFalse(bucket.acquire(now=0.0))
+
+        # A tenth of a second refills one token.
+        self.assertTrue(bucket.acquire(now=0.1))
+        self.assertFalse(bucket.acquire(now=0.1))
+
+    def test_unlimited(self):
+        '''
+        Tests that everything is admitted if nothing is configured.
+        '''
+        admission = AdmissionController()
+        self.report_load(self.executors[0], 10000)
+
+        for _ in range(100):
+            self.assertTrue(admission.admit(self.dag, self.policy))
+
+    def test_dag_rate_limit(self):
+        '''
+        Tests that calls of a rate-limited DAG are shed once its bucket is
+        empty, and that shed calls are counted.
+        '''
+        admission = AdmissionController({'dags': {'dag': {'rate': 1,
+                                                          'burst': 3}}})
+
+        results = [admission.admit(self.dag, self.policy, now=0.0) for _ in
+                   range(5)]
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertEqual(admission.report(), {'dag': 2})
+        self.assertEqual(admission.report(), {})
+
+    def test_queue_depth(self):
+        '''
+        Tests that calls are shed only while every executor of one of the
+        DAG's functions is saturated.
+        '''
+        admission = AdmissionController({'max_queue_depth': 10})
+
+        self.report_load(self.executors[0], 10)
+        self.assertTrue(admission.admit(self.dag, self.policy))
+
+        self.report_load(self.executors[1], 12)
+        self.assertFalse(admission.admit(self.dag, self.policy))
+
+        self.report_load(self.executors[0], 3)
+        self.assertTrue(admission.admit(self.dag, self.policy))
+
+    def test_max_in_flight(self):
+        '''
+        Tests that calls are shed while the executors' total outstanding
+        requests are at the global cap.
+        '''
+        admission = AdmissionController({'max_in_flight': 15})
+
+        self.report_load(self.executors[0], 10)
+        self.report_load(self.executors[1], 4)
+        self.assertEqual(self.policy.total_load(), 14)
+        self.assertTrue(admission.admit(self.dag, self.policy))
+
+        self.report_load(self.executors[1], 5)
+        self.assertFalse(admission.admit(self.dag, self.policy))
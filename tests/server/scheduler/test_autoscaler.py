@@ -0,0 +1,211 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from cloudburst.server.scheduler.autoscaler import (
+    needed_replicas,
+    ReplicaController
+)
+from cloudburst.server.scheduler.policy.default_policy import (
+    DefaultCloudburstSchedulerPolicy
+)
+from cloudburst.server.scheduler.utils import get_unpin_address
+from cloudburst.shared.proto.cloudburst_pb2 import Dag
+from cloudburst.shared.proto.internal_pb2 import PinFunction, ThreadStatus
+from tests.mock import kvs_client, zmq_utils
+
+
+class TestReplicaController(unittest.TestCase):
+    '''
+    Tests the scheduler's replica controller in local mode, with a function
+    pinned on one of four executor threads, ensuring that replicas are added
+    as the function's load grows and removed, with hysteresis, once it drops.
+    '''
+
+    def setUp(self):
+        self.ip = '127.0.0.1'
+        self.pusher_cache = zmq_utils.MockPusherCache()
+        self.pin_socket = zmq_utils.MockPinAcceptSocket(self.pusher_cache)
+
+        self.policy = DefaultCloudburstSchedulerPolicy(
+            self.pin_socket, self.pusher_cache, kvs_client.MockAnnaClient(),
+            self.ip, policy='random', random_threshold=0, local=True)
+
+        self.fref = Dag.FunctionReference(name='square')
+        self.function_refs = {self.fref.name: self.fref}
+
+        self.executors = [(self.ip, tid) for tid in range(4)]
+        for executor in self.executors:
+            status = ThreadStatus()
+            status.ip, status.tid = executor
+            status.running = True
+            if executor == self.executors[0]:
+                status.functions.append(self.fref.name)
+            self.policy.process_status(status)
+
+        self.controller = ReplicaController(self.policy,
+                                            {'utilization_target': 0.5,
+                                             'scale_down_periods': 2})
+
+        # The function takes 100ms to run.
+        status = ThreadStatus()
+        status.ip, status.tid = self.executors[0]
+        status.running = True
+        status.mean_runtimes[self.fref.name] = 0.1
+        self.controller.process_status(status)
+
+    def test_needed_replicas(self):
+        '''
+        Tests that the arrival rate times the service time is spread over
+        replicas at the utilization target.
+        '''
+        self.assertEqual(needed_replicas(0, 0.1, 0.5), 1)
+        self.assertEqual(needed_replicas(10, 0.1, 0.5), 2)
+        self.assertEqual(needed_replicas(11, 0.1, 0.5), 3)
+        self.assertEqual(needed_replicas(100, 0.1, 0.5, max_replicas=4), 4)
+
+    def test_scale_up(self):
+        '''
+        Tests that a function whose load needs three replicas gets two more,
+        on executors it is not already pinned on.
+        '''
+        # 15 calls per second take 1.5 executors' worth of time.
+        self.controller.record_calls({self.fref.name: 75}, 5.0)
+        self.pin_socket.inbox.extend([True, True])
+        self.controller.scale(self.function_refs)
+
+        pins = self.pusher_cache.socket.outbox
+        self.assertEqual(len(pins), 2)
+        for message in pins:
+            pin_msg = PinFunction()
+            pin_msg.ParseFromString(message)
+            self.assertEqual(pin_msg.name, self.fref.name)
+
+        locations = self.policy.function_locations[self.fref.name]
+        self.assertEqual(len(locations), 3)
+        self.assertEqual(len(set(locations)), 3)
+        self.assertEqual(len(self.controller.replicas[self.fref.name]), 2)
+        self.assertEqual(len(self.policy.pending_dags), 0)
+
+        # Nothing else happens until the next period ends.
+        self.controller.scale(self.function_refs)
+        self.assertEqual(len(pins), 2)
+
+    def test_other_schedulers_replicas(self):
+        '''
+        Tests that replicas pinned by another scheduler, for the calls it
+        received, do not count towards the replicas this scheduler's calls
+        need.
+        '''
+        other = self.executors[1]
+        self.policy.process_status(self.get_status(other, [self.fref.name]))
+
+        self.controller.record_calls({self.fref.name: 75}, 5.0)
+        self.pin_socket.inbox.extend([True, True])
+        self.controller.scale(self.function_refs)
+
+        self.assertEqual(len(self.pusher_cache.socket.outbox), 2)
+        self.assertEqual(set(self.controller.replicas[self.fref.name]),
+                         set(self.executors[2:]))
+
+        # Once our calls stop, we unpin our replicas but leave the other
+        # scheduler's alone.
+        for _ in range(4):
+            self.controller.record_calls({self.fref.name: 0}, 5.0)
+            self.controller.scale(self.function_refs)
+
+        locations = self.policy.function_locations[self.fref.name]
+        self.assertEqual(set(locations), {self.executors[0], other})
+        self.assertEqual(len(self.controller.replicas[self.fref.name]), 0)
+
+    def test_scale_down(self):
+        '''
+        Tests that replicas are unpinned one at a time, only once they have
+        not been needed for two periods in a row, and that the replica pinned
+        with the DAG is kept.
+        '''
+        self.controller.record_calls({self.fref.name: 75}, 5.0)
+        self.pin_socket.inbox.extend([True, True])
+        self.controller.scale(self.function_refs)
+        added = list(self.controller.replicas[self.fref.name])
+
+        messages = self.pusher_cache.socket.outbox
+        addresses = self.pusher_cache.addresses
+        self.assertEqual(len(messages), 2)
+
+        # The function goes idle.
+        for expected in [0, 1, 1, 2, 2, 2]:
+            self.controller.record_calls({self.fref.name: 0}, 5.0)
+            self.controller.scale(self.function_refs)
+
+            self.assertEqual(len(messages), 2 + expected)
+
+        self.assertEqual(messages[2:], [self.fref.name] * 2)
+        self.assertEqual(addresses[2:], [get_unpin_address(*executor) for
+                                         executor in reversed(added)])
+
+        locations = self.policy.function_locations[self.fref.name]
+        self.assertEqual(locations, [self.executors[0]])
+        self.assertEqual(len(self.controller.replicas[self.fref.name]), 0)
+
+    def test_brief_lull(self):
+        '''
+        Tests that a single quiet period between busy ones unpins nothing.
+        '''
+        self.controller.record_calls({self.fref.name: 75}, 5.0)
+        self.pin_socket.inbox.extend([True, True])
+        self.controller.scale(self.function_refs)
+
+        for calls in [0, 75, 0, 75]:
+            self.controller.record_calls({self.fref.name: calls}, 5.0)
+            self.controller.scale(self.function_refs)
+
+        self.assertEqual(len(self.pusher_cache.socket.outbox), 2)
+        self.assertEqual(
+            len(self.policy.function_locations[self.fref.name]), 3)
+
+    def test_status_after_scale_down(self):
+        '''
+        Tests that the status an executor sends after one of the controller's
+        replicas is unpinned from it is processed normally.
+        '''
+        self.controller.record_calls({self.fref.name: 75}, 5.0)
+        self.pin_socket.inbox.extend([True, True])
+        self.controller.scale(self.function_refs)
+
+        # The new replicas report that they have the function pinned.
+        added = list(self.controller.replicas[self.fref.name])
+        for executor in added:
+            self.policy.process_status(self.get_status(executor,
+                                                       [self.fref.name]))
+
+        for _ in range(2):
+            self.controller.record_calls({self.fref.name: 0}, 5.0)
+            self.controller.scale(self.function_refs)
+
+        # The executor we unpinned from reports that it is empty again.
+        unpinned = added[-1]
+        self.policy.process_status(self.get_status(unpinned, []))
+
+        locations = self.policy.function_locations[self.fref.name]
+        self.assertEqual(set(locations), {self.executors[0], added[0]})
+        self.assertTrue(unpinned in self.policy.unpinned_cpu_executors)
+
+    def get_status(self, executor, functions):
+        status = ThreadStatus()
+        status.ip, status.tid = executor
+        status.running = True
+        status.functions.extend(functions)
+        return status
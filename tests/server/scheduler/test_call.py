@@ -14,7 +14,13 @@
 
 import unittest
 
-from cloudburst.server.scheduler.call import call_function, call_dag
+import numpy as np
+
+from cloudburst.server.scheduler.call import (
+    call_dag,
+    call_function,
+    get_references
+)
 from cloudburst.server.scheduler.policy.default_policy import (
     DefaultCloudburstSchedulerPolicy
 )
@@ -28,9 +34,12 @@ from cloudburst.shared.proto.cloudburst_pb2 import (
     FunctionCall,
     GenericResponse,
     NO_RESOURCES,  # Cloudburst's error types
-    NORMAL  # Cloudburst's consistency modes
+    MULTI, NORMAL  # Cloudburst's consistency modes
+)
+from cloudburst.shared.proto.internal_pb2 import (
+    CompactDagSchedule,
+    ThreadStatus
 )
-from cloudburst.shared.proto.internal_pb2 import ThreadStatus
 from cloudburst.shared.reference import CloudburstReference
 from cloudburst.shared.serializer import Serializer
 from tests.mock import kvs_client, zmq_utils
@@ -156,6 +165,23 @@ class TestSchedulerCall(unittest.TestCase):
         self.assertEqual(self.pusher_cache.addresses[0],
                          utils.get_exec_address(*new_key))
 
+    def test_get_references(self):
+        '''
+        Ensures that references are found among a call's arguments, including
+        in tuples of arguments, and that arrays, strings and other values are
+        not mistaken for them.
+        '''
+        first = CloudburstReference('first', True)
+        second = CloudburstReference('second', False)
+
+        args = [serializer.dump(value, serialize=False) for value in
+                [first, (second, 1), np.zeros(4), 'CloudburstReference', 3,
+                 [CloudburstReference('nested', True)]]]
+
+        refs = get_references(args)
+        self.assertEqual([ref.key for ref in refs], ['first', 'second'])
+        self.assertFalse(refs[1].deserialize)
+
     def test_function_call_no_resources(self):
         '''
         Constructs a scenario where there are no available resources in the
@@ -221,13 +247,18 @@ class TestSchedulerCall(unittest.TestCase):
         self.assertEqual(len(self.pusher_cache.socket.outbox), 3)
 
         # Extract each of the two schedules and ensure that they are correct.
-        source_schedule = DagSchedule()
+        # Calls with NORMAL consistency are sent as compact schedules that
+        # only carry what each function needs.
+        source_schedule = CompactDagSchedule()
         source_schedule.ParseFromString(self.pusher_cache.socket.outbox[0])
-        self._verify_dag_schedule(source, 'BEGIN', source_schedule, dag, call)
+        self._verify_compact_schedule(source, source_schedule, dag, call)
+        self.assertEqual(dict(source_schedule.locations),
+                         {sink: '%s:%d' % sink_address})
 
-        sink_schedule = DagSchedule()
+        sink_schedule = CompactDagSchedule()
         sink_schedule.ParseFromString(self.pusher_cache.socket.outbox[1])
-        self._verify_dag_schedule(sink, source, sink_schedule, dag, call)
+        self._verify_compact_schedule(sink, sink_schedule, dag, call)
+        self.assertEqual(len(sink_schedule.locations), 0)
 
         # Make sure that only trigger was sent, and it was for the DAG source.
         trigger = DagTrigger()
@@ -242,13 +273,47 @@ class TestSchedulerCall(unittest.TestCase):
         # expect.
         self.assertEqual(len(self.pusher_cache.addresses), 3)
         self.assertEqual(self.pusher_cache.addresses[0],
-                         utils.get_queue_address(*source_address))
+                         utils.get_compact_queue_address(*source_address))
         self.assertEqual(self.pusher_cache.addresses[1],
-                         utils.get_queue_address(*sink_address))
+                         utils.get_compact_queue_address(*sink_address))
         self.assertEqual(
             self.pusher_cache.addresses[2], sutils.get_dag_trigger_address(
                 ':'.join(map(lambda s: str(s), source_address))))
 
+    def test_dag_call_causal(self):
+        '''
+        Tests that a DAG call with causal consistency still sends each
+        function the full schedule, which the causal modes rely on.
+        '''
+        source = 'source'
+        sink = 'sink'
+        dag, source_address, sink_address = self._construct_dag_with_locations(
+            source, sink)
+
+        call = DagCall()
+        call.name = dag.name
+        call.consistency = MULTI
+        call.output_key = 'output_key'
+        call.client_id = '0'
+
+        call_dag(call, self.pusher_cache, {dag.name: (dag, {source})},
+                 self.policy)
+
+        self.assertEqual(len(self.pusher_cache.socket.outbox), 3)
+
+        source_schedule = DagSchedule()
+        source_schedule.ParseFromString(self.pusher_cache.socket.outbox[0])
+        self._verify_dag_schedule(source, 'BEGIN', source_schedule, dag, call)
+
+        sink_schedule = DagSchedule()
+        sink_schedule.ParseFromString(self.pusher_cache.socket.outbox[1])
+        self._verify_dag_schedule(sink, source, sink_schedule, dag, call)
+
+        self.assertEqual(self.pusher_cache.addresses[0],
+                         utils.get_queue_address(*source_address))
+        self.assertEqual(self.pusher_cache.addresses[1],
+                         utils.get_queue_address(*sink_address))
+
     '''
     HELPER FUNCTIONS
     '''
@@ -262,6 +327,13 @@ class TestSchedulerCall(unittest.TestCase):
         self.assertEqual(schedule.client_id, call.client_id)
         self.assertEqual(schedule.output_key, call.output_key)
 
+    def _verify_compact_schedule(self, function, schedule, dag, call):
+        self.assertEqual(schedule.dag_name, dag.name)
+        self.assertEqual(schedule.dag_version, sutils.get_dag_version(dag))
+        self.assertEqual(schedule.target_function, function)
+        self.assertEqual(schedule.client_id, call.client_id)
+        self.assertEqual(schedule.output_key, call.output_key)
+
     def _construct_dag_with_locations(self, source, sink):
         # Construct a simple, two-function DAG.
         dag = Dag()
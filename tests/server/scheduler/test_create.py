@@ -12,7 +12,6 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import random
 import unittest
 
 from anna.lattices import LWWPairLattice, SingleKeyCausalLattice
@@ -54,7 +53,7 @@ class TestSchedulerCreate(unittest.TestCase):
 
         self.pusher_cache = zmq_utils.MockPusherCache()
         self.socket = zmq_utils.MockZmqSocket()
-        self.pin_socket = zmq_utils.MockZmqSocket()
+        self.pin_socket = zmq_utils.MockPinAcceptSocket(self.pusher_cache)
 
         self.kvs_client = kvs_client.MockAnnaClient()
         self.ip = '127.0.0.1'
@@ -147,8 +146,8 @@ class TestSchedulerCreate(unittest.TestCase):
         self.policy.unpinned_cpu_executors.update(address_set)
 
         # Prepopulate the pin_accept socket with sufficient success messages.
-        self.pin_socket.inbox.append(sutils.ok_resp)
-        self.pin_socket.inbox.append(sutils.ok_resp)
+        self.pin_socket.inbox.append(True)
+        self.pin_socket.inbox.append(True)
 
         # Call the DAG creation method.
         dags = {}
@@ -247,10 +246,9 @@ class TestSchedulerCreate(unittest.TestCase):
     def test_create_dag_insufficient_resources(self):
         '''
         This test attempts to create a DAG even though there are not enough
-        free executors in the system. It checks that a pin message is attempted
-        to be sent, we run out of resources, and then the request is rejected.
-        We check that the metadata is properly restored back to its original
-        state.
+        free executors in the system. It checks that the request is rejected
+        without any pin messages being sent, and that the metadata is left in
+        its original state.
         '''
         # Create a simple two-function DAG and add it to the inbound socket.
         source = 'source'
@@ -266,9 +264,6 @@ class TestSchedulerCreate(unittest.TestCase):
         address_set = {(self.ip, 1)}
         self.policy.unpinned_cpu_executors.update(address_set)
 
-        # Prepopulate the pin_accept socket with sufficient success messages.
-        self.pin_socket.inbox.append(sutils.ok_resp)
-
         # Attempt to create the DAG.
         dags = {}
         call_frequency = {}
@@ -282,30 +277,68 @@ class TestSchedulerCreate(unittest.TestCase):
         self.assertFalse(response.success)
         self.assertEqual(response.error, NO_RESOURCES)
 
-        # Test that the correct pin messages were sent.
-        self.assertEqual(len(self.pusher_cache.socket.outbox), 2)
-        messages = self.pusher_cache.socket.outbox
+        # Since the DAG does not fit, nothing is pinned, so nothing has to be
+        # unpinned either.
+        self.assertEqual(len(self.pusher_cache.socket.outbox), 0)
 
-        # Checks for the pin message.
-        pin_msg = PinFunction()
-        pin_msg.ParseFromString(messages[0])
-        self.assertEqual(pin_msg.response_address, self.ip)
-        self.assertEqual(pin_msg.name, source)
+        # Check that no additional messages were sent.
+        self.assertEqual(len(self.policy.unpinned_cpu_executors), 1)
+        self.assertEqual(len(self.policy.function_locations), 0)
+        self.assertEqual(len(self.policy.pending_dags), 0)
 
-        # Checks for the unpin message.
-        self.assertEqual(messages[1], source)
+        # Check that no additional metadata was created or sent.
+        self.assertEqual(len(call_frequency), 0)
+        self.assertEqual(len(dags), 0)
 
-        address = random.sample(address_set, 1)[0]
+    def test_create_dag_rejected(self):
+        '''
+        This test creates a DAG whose pins are sent out together, one of which
+        is rejected. Once there are no executors left to retry the rejected
+        pin on, the request fails, and the function that was pinned is
+        unpinned again.
+        '''
+        source = 'source'
+        sink = 'sink'
+        dag_name = 'dag'
+
+        dag = create_linear_dag([None, None], [source, sink], self.kvs_client,
+                                dag_name)
+        self.socket.inbox.append(dag.SerializeToString())
+
+        address_set = {(self.ip, 1), (self.ip, 2)}
+        self.policy.unpinned_cpu_executors.update(address_set)
+
+        # Accept the source's pin and reject the sink's.
+        self.pin_socket.inbox.extend([True, False])
+
+        dags = {}
+        call_frequency = {}
+        create_dag(self.socket, self.pusher_cache, self.kvs_client, dags,
+                   self.policy, call_frequency)
+
+        # Check that an error was returned to the user.
+        self.assertEqual(len(self.socket.outbox), 1)
+        response = GenericResponse()
+        response.ParseFromString(self.socket.outbox[0])
+        self.assertFalse(response.success)
+        self.assertEqual(response.error, NO_RESOURCES)
+
+        # Both pins were sent before either was answered, and then the source
+        # was unpinned.
+        messages = self.pusher_cache.socket.outbox
+        self.assertEqual(len(messages), 3)
+        for message, name in zip(messages[:2], [source, sink]):
+            pin_msg = PinFunction()
+            pin_msg.ParseFromString(message)
+            self.assertEqual(pin_msg.name, name)
+
+        self.assertEqual(messages[2], source)
         addresses = self.pusher_cache.addresses
-        self.assertEqual(get_pin_address(*address), addresses[0])
-        self.assertEqual(get_unpin_address(*address), addresses[1])
+        self.assertEqual(addresses[2], get_unpin_address(self.ip, 1))
 
-        # Check that no additional messages were sent.
         self.assertEqual(len(self.policy.unpinned_cpu_executors), 0)
         self.assertEqual(len(self.policy.function_locations), 0)
         self.assertEqual(len(self.policy.pending_dags), 0)
-
-        # Check that no additional metadata was created or sent.
         self.assertEqual(len(call_frequency), 0)
         self.assertEqual(len(dags), 0)
 
@@ -433,7 +466,7 @@ class TestSchedulerCreate(unittest.TestCase):
         address_set = {(self.ip, 1)}
         self.policy.unpinned_gpu_executors.update(address_set)
 
-        self.pin_socket.inbox.append(sutils.ok_resp)
+        self.pin_socket.inbox.append(True)
 
         create_dag(self.socket, self.pusher_cache, self.kvs_client, dags,
                    self.policy, call_frequency)
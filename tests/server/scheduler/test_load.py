@@ -0,0 +1,53 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from cloudburst.server.scheduler.load import SlidingWindowCounter
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    '''
+    Tests the sliding window counters the scheduler policy uses to track how
+    many requests it has recently routed to each executor.
+    '''
+
+    def test_window(self):
+        '''
+        Tests that events are counted until they fall out of the window.
+        '''
+        counter = SlidingWindowCounter(window=5, num_buckets=5)
+
+        counter.increment(now=100.0)
+        counter.increment(2, now=102.5)
+        self.assertEqual(counter.count(now=103.0), 3)
+
+        # The first event's bucket has left the window, but not the second's.
+        self.assertEqual(counter.count(now=105.0), 2)
+        self.assertEqual(counter.count(now=107.9), 0)
+
+    def test_idle(self):
+        '''
+        Tests that a counter that has been idle for longer than its window is
+        cleared entirely.
+        '''
+        counter = SlidingWindowCounter(window=5, num_buckets=5)
+
+        for second in range(5):
+            counter.increment(10, now=100.0 + second)
+        self.assertEqual(counter.count(now=104.5), 50)
+
+        counter.increment(now=200.0)
+        self.assertEqual(counter.count(now=200.0), 1)
+        self.assertEqual(sum(counter.buckets), 1)
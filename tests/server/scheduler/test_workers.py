@@ -0,0 +1,75 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import unittest
+
+from cloudburst.server.scheduler.utils import merge_histograms
+from cloudburst.server.scheduler.workers import ThreadStats
+from cloudburst.shared.proto.cloudburst_pb2 import Dag
+
+
+class TestThreadStats(unittest.TestCase):
+    '''
+    Tests the statistics that the scheduler's DAG call workers gather, which
+    the main thread collects and merges across workers when it reports.
+    '''
+
+    def setUp(self):
+        self.dag = Dag()
+        self.dag.name = 'dag'
+        for fname in ['source', 'sink']:
+            self.dag.functions.add().name = fname
+
+    def test_collect(self):
+        '''
+        Tests that calls are counted per function and that collecting the
+        statistics starts a new period.
+        '''
+        stats = ThreadStats()
+        stats.record_call(self.dag, None, 0.01)
+        stats.record_call(self.dag, 0.5, 0.02)
+        stats.add_occupancy('dag_create', 1.0)
+
+        occupancy, counts, interarrivals, process_times = stats.collect()
+
+        self.assertEqual(counts, {'source': 2, 'sink': 2})
+        self.assertAlmostEqual(occupancy['dag_call'], 0.03)
+        self.assertEqual(occupancy['dag_create'], 1.0)
+
+        # The first call has no interarrival time.
+        self.assertEqual(len(interarrivals['dag']), 1)
+        self.assertEqual(len(process_times['dag']), 2)
+
+        occupancy, counts, interarrivals, process_times = stats.collect()
+        self.assertEqual(occupancy, {})
+        self.assertEqual(counts, {})
+        self.assertEqual(interarrivals, {})
+        self.assertEqual(process_times, {})
+
+    def test_merge(self):
+        '''
+        Tests that the interarrival times gathered by several workers are
+        merged into one histogram per DAG.
+        '''
+        first = ThreadStats()
+        second = ThreadStats()
+        first.record_call(self.dag, 0.1, 0.01)
+        second.record_call(self.dag, 0.2, 0.01)
+
+        merged = {}
+        for stats in [first, second]:
+            merge_histograms(merged, stats.collect()[2])
+
+        self.assertEqual(len(merged['dag']), 2)
+        self.assertAlmostEqual(merged['dag'].mean(), 0.15, places=2)
@@ -0,0 +1,77 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+import unittest
+
+from cloudburst.shared.backoff import all_present, jittered_delays, wait_for
+
+
+class TestBackoff(unittest.TestCase):
+    '''
+    This test suite tests the shared wait primitive used to poll the KVS,
+    ensuring that it retries until a result is ready, backs off between
+    retries, and respects its deadline.
+    '''
+
+    def test_returns_when_ready(self):
+        '''
+        Tests that a result that is ready immediately is returned after a
+        single fetch.
+        '''
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return 'value'
+
+        self.assertEqual(wait_for(fetch), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_backs_off_until_ready(self):
+        '''
+        Tests that we keep retrying until every key is present, and that the
+        retries are spaced out rather than issued back to back.
+        '''
+        results = [{'a': None}, {'a': None}, {'a': None}, {'a': 1}]
+        start = time.time()
+
+        result = wait_for(lambda: results.pop(0), all_present,
+                          initial_delay=0.01)
+
+        self.assertEqual(result, {'a': 1})
+        self.assertEqual(len(results), 0)
+
+        # Three retries wait at least 5, 10, and 20 milliseconds.
+        self.assertTrue(time.time() - start >= 0.035)
+
+    def test_timeout(self):
+        '''
+        Tests that a TimeoutError is raised once the deadline passes.
+        '''
+        start = time.time()
+        self.assertRaises(TimeoutError, wait_for, lambda: None, timeout=0.05)
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_jittered_delays(self):
+        '''
+        Tests that retry delays double up to the maximum, with jitter that
+        never takes them below half of the nominal delay.
+        '''
+        delays = jittered_delays(initial_delay=0.01, max_delay=0.04)
+        nominal = [0.01, 0.02, 0.04, 0.04]
+
+        for expected in nominal:
+            delay = next(delays)
+            self.assertTrue(expected / 2 <= delay <= expected)
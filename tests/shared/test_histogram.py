@@ -0,0 +1,142 @@
+#  Copyright 2019 U.C. Berkeley RISE Lab
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import random
+import unittest
+
+from cloudburst.shared import histogram
+from cloudburst.shared.histogram import LatencyHistogram
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    '''
+    Tests for the mergeable latency histogram, ensuring that quantiles are
+    within the configured relative accuracy, that merging is equivalent to
+    recording every value in one histogram, and that memory stays bounded.
+    '''
+
+    def test_quantiles_within_accuracy(self):
+        '''
+        Records a wide range of values and compares the reported quantiles
+        against the exact ones.
+        '''
+        rand = random.Random(0)
+        values = [rand.lognormvariate(-5, 2) for _ in range(10000)]
+
+        hist = LatencyHistogram(relative_accuracy=0.01)
+        for value in values:
+            hist.add(value)
+
+        values.sort()
+        for q in [0.01, 0.25, 0.5, 0.75, 0.95, 0.99]:
+            exact = values[int(q * (len(values) - 1))]
+            self.assertTrue(abs(hist.quantile(q) - exact) <= 0.01 * exact)
+
+        self.assertEqual(len(hist), len(values))
+        self.assertEqual(hist.min, values[0])
+        self.assertEqual(hist.max, values[-1])
+        self.assertAlmostEqual(hist.mean(), sum(values) / len(values))
+
+    def test_merge(self):
+        '''
+        Ensures that merging two histograms gives the same buckets as
+        recording all of their values in one.
+        '''
+        combined = LatencyHistogram()
+        first = LatencyHistogram()
+        second = LatencyHistogram()
+
+        for i in range(1, 100):
+            combined.add(i / 1000)
+            if i % 2 == 0:
+                first.add(i / 1000)
+            else:
+                second.add(i / 1000)
+
+        first.merge(second)
+        self.assertEqual(first.buckets, combined.buckets)
+        self.assertEqual(first.count, combined.count)
+        self.assertEqual(first.quantile(0.5), combined.quantile(0.5))
+
+        self.assertRaises(ValueError, first.merge, LatencyHistogram(0.05))
+
+    def test_zero_and_empty(self):
+        '''
+        Ensures that zero values are counted and that an empty histogram
+        reports zeros.
+        '''
+        hist = LatencyHistogram()
+        self.assertEqual(hist.quantile(0.5), 0.0)
+        self.assertEqual(hist.mean(), 0.0)
+
+        hist.add(0.0)
+        hist.add(0.0)
+        hist.add(1.0)
+        self.assertEqual(hist.zero_count, 2)
+        self.assertEqual(hist.quantile(0.5), 0.0)
+        self.assertAlmostEqual(hist.quantile(1.0), 1.0)
+
+    def test_values(self):
+        '''
+        Ensures that the values reconstructed from the buckets are sorted and
+        each within the accuracy of the value it stands for.
+        '''
+        added = [0.0, 0.5, 0.003, 0.003, 12.0, 0.07]
+        hist = LatencyHistogram()
+        for value in added:
+            hist.add(value)
+
+        values = hist.values()
+        self.assertEqual(len(values), len(added))
+        for expected, value in zip(sorted(added), values):
+            self.assertTrue(abs(value - expected) <= 0.01 * expected)
+
+        self.assertEqual(LatencyHistogram().values(), [])
+
+    def test_values_limit(self):
+        '''
+        Ensures that a limited list of values spans the distribution, from
+        the smallest value to the largest.
+        '''
+        hist = LatencyHistogram()
+        for i in range(1, 1001):
+            hist.add(i / 1000)
+
+        values = hist.values(limit=5)
+        self.assertEqual(len(values), 5)
+        for expected, value in zip([0.001, 0.25, 0.5, 0.75, 1.0], values):
+            self.assertTrue(abs(value - expected) <= 0.01 * expected + 0.001)
+
+        self.assertEqual(len(hist.values(limit=1)), 1)
+        self.assertEqual(hist.values(limit=0), [])
+        self.assertEqual(len(hist.values(limit=2000)), 1000)
+
+    def test_bucket_limit(self):
+        '''
+        Ensures that the number of buckets never exceeds MAX_BUCKETS, and that
+        the largest values are unaffected when the lowest buckets are merged.
+        '''
+        old_max = histogram.MAX_BUCKETS
+        histogram.MAX_BUCKETS = 10
+        try:
+            hist = LatencyHistogram(relative_accuracy=0.01)
+            for i in range(100):
+                hist.add(1.1 ** i)
+
+            self.assertEqual(len(hist.buckets), 10)
+            self.assertEqual(hist.count, 100)
+            self.assertTrue(abs(hist.quantile(1.0) - 1.1 ** 99) <=
+                            0.01 * 1.1 ** 99)
+        finally:
+            histogram.MAX_BUCKETS = old_max